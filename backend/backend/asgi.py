@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
 application = get_asgi_application()
+
+# Load the in-memory patient autocomplete index before the first request
+from clinic.autocomplete import warm  # noqa: E402
+
+warm()
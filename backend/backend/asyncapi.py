@@ -0,0 +1,77 @@
+"""
+Plain ``async def`` JSON views for hot read paths.
+
+DRF views are synchronous, so under ASGI Django runs each one on a worker
+thread and a request waiting on the database holds that thread. Views wrapped
+with ``async_api_view`` run on the event loop instead and reach the database
+through the async ORM (``aget``, ``aaggregate``, ``async for``), so one ASGI
+worker can keep many such requests in flight.
+
+The wrapper applies the project's DRF authentication classes and the default
+``IsAuthenticated`` rule, and responses use DRF's JSON encoder, so the async
+views accept the same credentials and return the same bodies as their
+viewset counterparts.
+
+Every middleware must be async-capable for a request to stay on the event
+loop. ``MetricsMiddleware`` is sync-only: with ``METRICS['ENABLED']`` on,
+Django adapts the whole chain onto a thread and the async views lose their
+advantage.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from rest_framework import exceptions, status
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+
+def json_response(data, status=status.HTTP_200_OK, headers=None):
+    return JsonResponse(data, encoder=JSONEncoder, safe=False, status=status, headers=headers)
+
+
+def _authenticate(request):
+    """Return ``(user, error)`` using the DRF authentication classes."""
+    drf_request = Request(request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+    try:
+        user = drf_request.user
+    except exceptions.AuthenticationFailed as exc:
+        return None, exc
+    if not user or not user.is_authenticated:
+        return None, exceptions.NotAuthenticated()
+    return user, None
+
+
+def _challenge(request):
+    # As in DRF: 401 with the first authenticator's challenge, or 403 without one
+    authenticators = api_settings.DEFAULT_AUTHENTICATION_CLASSES
+    return authenticators[0]().authenticate_header(request) if authenticators else None
+
+
+def async_api_view(view):
+    """Serve an async GET-only view behind the project's authentication."""
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return json_response(
+                {"detail": f'Method "{request.method}" not allowed.'},
+                status=status.HTTP_405_METHOD_NOT_ALLOWED,
+                headers={'Allow': 'GET, HEAD'},
+            )
+        # Authenticators can hit the database (token and user lookups), so run them in a thread
+        user, error = await sync_to_async(_authenticate)(request)
+        if error is not None:
+            challenge = _challenge(request)
+            if challenge:
+                return json_response(
+                    {"detail": error.detail},
+                    status=status.HTTP_401_UNAUTHORIZED,
+                    headers={'WWW-Authenticate': challenge},
+                )
+            return json_response({"detail": error.detail}, status=status.HTTP_403_FORBIDDEN)
+        request.user = user
+        return await view(request, *args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,162 @@
+"""
+Versioned response cache with ETags for rarely-changing reference data.
+
+``CachedReadMixin`` caches the serialized ``list`` and ``retrieve`` data of a
+ViewSet, keyed on the request URL and a per-model version number. Signal
+handlers call ``invalidate_model`` when an instance is saved or deleted. That
+bumps the version, so every cached response for the model is dropped at once.
+
+Entries live in an in-process LRU. With ``REFERENCE_CACHE['SHARED']`` they are
+also stored in the Django cache, so processes can fill each other's LRU.
+Version numbers are always kept in the Django cache. When that cache is shared
+(Redis, Memcached, the database), every process sees invalidations. A
+per-process cache such as LocMemCache only tells the process that made the
+change. Other workers would keep their entries, so each entry then expires
+after ``PROCESS_LOCAL_CACHE_TIMEOUT`` seconds (see ``local_timeout``), which
+bounds how stale they get. Each entry has a strong ETag over its data. A request whose
+``If-None-Match`` matches gets an empty ``304 Not Modified``, and responses are
+sent with ``Cache-Control: private, no-cache`` so browsers revalidate instead
+of refetching.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+DEFAULTS = {
+    # Django cache alias for version numbers and, with SHARED, the entries
+    'ALIAS': 'default',
+    'SHARED': False,
+    'TIMEOUT': 24 * 60 * 60,
+    'LRU_SIZE': 256,
+}
+
+# Backends that keep entries inside each worker process
+PROCESS_LOCAL_BACKENDS = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+DEFAULT_PROCESS_LOCAL_TIMEOUT = 60
+
+_lru = OrderedDict()
+_lru_lock = threading.Lock()
+
+
+def cache_settings():
+    return {**DEFAULTS, **getattr(settings, 'REFERENCE_CACHE', {})}
+
+
+def is_process_local(alias='default'):
+    """True if cache ``alias`` isn't shared, so other processes never see its version bumps."""
+    return settings.CACHES[alias]['BACKEND'] in PROCESS_LOCAL_BACKENDS
+
+
+def local_timeout(timeout, alias='default'):
+    """
+    Lifetime for data invalidated through version numbers in cache ``alias``:
+    ``timeout`` (None for no expiry), capped at ``PROCESS_LOCAL_CACHE_TIMEOUT``
+    when the cache is per-process and only expiry reaches other workers.
+    """
+    if not is_process_local(alias):
+        return timeout
+    cap = getattr(settings, 'PROCESS_LOCAL_CACHE_TIMEOUT', DEFAULT_PROCESS_LOCAL_TIMEOUT)
+    return cap if timeout is None else min(timeout, cap)
+
+
+def _version_key(label):
+    return f'refcache:{label}:version'
+
+
+def get_version(label):
+    config = cache_settings()
+    # A fresh, unique version if the key was evicted, so old entries can't come back
+    return caches[config['ALIAS']].get_or_set(_version_key(label), time.time_ns, None)
+
+
+def invalidate_model(model):
+    """Drop every cached response for ``model`` once the current transaction commits."""
+    config = cache_settings()
+    # Bumping before the commit would let a concurrent request cache the old rows under the new version
+    transaction.on_commit(
+        lambda: caches[config['ALIAS']].set(_version_key(model._meta.label), time.time_ns(), None)
+    )
+
+
+def _lru_get(key):
+    with _lru_lock:
+        entry = _lru.get(key)
+        if entry is not None:
+            _lru.move_to_end(key)
+        return entry
+
+
+def _lru_set(key, entry, size):
+    with _lru_lock:
+        _lru[key] = entry
+        _lru.move_to_end(key)
+        while len(_lru) > size:
+            _lru.popitem(last=False)
+
+
+def make_etag(data):
+    body = json.dumps(data, cls=DjangoJSONEncoder, separators=(',', ':')).encode()
+    return '"%s"' % hashlib.sha1(body).hexdigest()
+
+
+class CachedReadMixin:
+    """Serve ``list`` and ``retrieve`` from the versioned cache, with ETag revalidation."""
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        # Only JSON is cached; the browsable API renders per user
+        if request.accepted_renderer.format != 'json':
+            return handler(request, *args, **kwargs)
+
+        config = cache_settings()
+        label = self.queryset.model._meta.label
+        url_hash = hashlib.sha1(request.build_absolute_uri().encode()).hexdigest()
+        key = f'refcache:{label}:{get_version(label)}:{url_hash}'
+
+        now = time.monotonic()
+        lifetime = local_timeout(config['TIMEOUT'], config['ALIAS'])
+        expires = now + lifetime if lifetime is not None else float('inf')
+        entry = _lru_get(key)
+        if entry is not None and entry[0] <= now:
+            entry = None
+        if entry is None and config['SHARED']:
+            shared = caches[config['ALIAS']].get(key)
+            if shared is not None:
+                entry = (expires, *shared)
+                _lru_set(key, entry, config['LRU_SIZE'])
+        if entry is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            entry = (expires, make_etag(response.data), response.data)
+            _lru_set(key, entry, config['LRU_SIZE'])
+            if config['SHARED']:
+                caches[config['ALIAS']].set(key, entry[1:], config['TIMEOUT'])
+
+        _, etag, data = entry
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match and (etag in parse_etags(if_none_match) or if_none_match.strip() == '*'):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(data)
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
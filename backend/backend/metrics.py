@@ -0,0 +1,248 @@
+"""
+Opt-in request instrumentation.
+
+``MetricsMiddleware`` times a sample of requests and records, per view and
+action (``AppointmentViewSet.list``, ``InvoiceViewSet.stats``...):
+
+* wall time, SQL query count and time spent in SQL,
+* repeated queries: the same SQL statement run ``DUPLICATE_THRESHOLD`` or
+  more times in one request, the usual N+1 signature,
+* response size.
+
+Sampled responses carry a ``Server-Timing`` header. Aggregates, including
+p50/p95/p99 over the last ``MAX_SAMPLES`` requests of each view, are served to
+staff users by ``MetricsView`` at ``/api/_metrics``. The endpoint returns JSON,
+or Prometheus text with ``?format=prometheus``.
+
+Configure with ``METRICS`` in settings; when ``ENABLED`` is false the
+middleware removes itself at startup. Figures are per process.
+"""
+import math
+import random
+import threading
+import time
+from collections import Counter, deque
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from rest_framework.permissions import IsAdminUser
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+DEFAULTS = {
+    'ENABLED': False,
+    # Fraction of requests to measure
+    'SAMPLE_RATE': 1.0,
+    'SERVER_TIMING': True,
+    # Latency samples kept per view for the percentiles
+    'MAX_SAMPLES': 1000,
+    # Runs of one SQL statement in a request that count as a repeated query
+    'DUPLICATE_THRESHOLD': 5,
+}
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def metrics_settings():
+    return {**DEFAULTS, **getattr(settings, 'METRICS', {})}
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return 0.0
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+class ViewStats:
+    def __init__(self, max_samples):
+        self.durations = deque(maxlen=max_samples)
+        self.requests = 0
+        self.errors = 0
+        self.duration_sum = 0.0
+        self.queries = 0
+        self.db_sum = 0.0
+        self.response_bytes = 0
+        self.duplicate_requests = 0
+        self.duplicate_example = None
+
+    def as_dict(self):
+        ordered = sorted(self.durations)
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'duration_ms': {
+                'mean': round(self.duration_sum / self.requests * 1000, 3) if self.requests else 0.0,
+                **{f'p{int(q * 100)}': round(percentile(ordered, q) * 1000, 3) for q in QUANTILES},
+            },
+            'queries_per_request': round(self.queries / self.requests, 2) if self.requests else 0.0,
+            'db_ms_per_request': round(self.db_sum / self.requests * 1000, 3) if self.requests else 0.0,
+            'response_bytes_per_request': round(self.response_bytes / self.requests) if self.requests else 0,
+            'requests_with_repeated_queries': self.duplicate_requests,
+            'repeated_query_example': self.duplicate_example,
+            'totals': {
+                'duration_seconds': self.duration_sum,
+                'queries': self.queries,
+                'db_seconds': self.db_sum,
+                'response_bytes': self.response_bytes,
+            },
+        }
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = {}
+
+    def record(self, view, duration, queries, db_time, size, status_code, duplicate, max_samples):
+        with self.lock:
+            stats = self.views.get(view)
+            if stats is None:
+                stats = self.views[view] = ViewStats(max_samples)
+            stats.requests += 1
+            stats.errors += status_code >= 500
+            stats.durations.append(duration)
+            stats.duration_sum += duration
+            stats.queries += queries
+            stats.db_sum += db_time
+            stats.response_bytes += size
+            if duplicate:
+                stats.duplicate_requests += 1
+                stats.duplicate_example = duplicate
+
+    def snapshot(self):
+        with self.lock:
+            return {view: stats.as_dict() for view, stats in sorted(self.views.items())}
+
+    def reset(self):
+        with self.lock:
+            self.views.clear()
+
+
+registry = MetricsRegistry()
+
+
+class QueryRecorder:
+    """``execute_wrapper`` hook counting queries, their time and repeats."""
+
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.time += time.perf_counter() - started
+            self.count += 1
+            # Parameters are separate, so one statement text is one query shape
+            self.statements[sql] += 1
+
+    def most_repeated(self, threshold):
+        if not self.statements:
+            return None
+        sql, runs = self.statements.most_common(1)[0]
+        if runs < threshold:
+            return None
+        return {'runs': runs, 'sql': sql[:300]}
+
+
+def view_name(request, view_func):
+    """``ViewSet.action`` for DRF viewsets, otherwise the view's dotted name."""
+    cls = getattr(view_func, 'cls', None)
+    if cls is None:
+        return f'{view_func.__module__}.{view_func.__name__}'
+    actions = getattr(view_func, 'actions', None) or {}
+    action = actions.get(request.method.lower())
+    return f'{cls.__name__}.{action}' if action else cls.__name__
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.config = metrics_settings()
+        if not self.config['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= self.config['SAMPLE_RATE']:
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+
+        view = getattr(request, '_metrics_view', None)
+        if view is None:
+            return response
+        size = 0 if response.streaming else len(response.content)
+        registry.record(
+            view, duration, recorder.count, recorder.time, size, response.status_code,
+            recorder.most_repeated(self.config['DUPLICATE_THRESHOLD']), self.config['MAX_SAMPLES'],
+        )
+        if self.config['SERVER_TIMING']:
+            response['Server-Timing'] = (
+                f'app;dur={duration * 1000:.1f}, '
+                f'db;dur={recorder.time * 1000:.1f};desc="{recorder.count} queries"'
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if getattr(view_func, 'cls', None) is not MetricsView:
+            request._metrics_view = view_name(request, view_func)
+
+
+class PrometheusRenderer(BaseRenderer):
+    """Render ``MetricsView`` data in the Prometheus text exposition format."""
+    media_type = 'text/plain'
+    format = 'prometheus'
+    charset = 'utf-8'
+
+    COUNTERS = [
+        ('dentiflow_requests_total', lambda stats: stats['requests']),
+        ('dentiflow_request_errors_total', lambda stats: stats['errors']),
+        ('dentiflow_db_queries_total', lambda stats: stats['totals']['queries']),
+        ('dentiflow_db_duration_seconds_total', lambda stats: stats['totals']['db_seconds']),
+        ('dentiflow_response_bytes_total', lambda stats: stats['totals']['response_bytes']),
+        ('dentiflow_repeated_query_requests_total', lambda stats: stats['requests_with_repeated_queries']),
+    ]
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        views = data.get('views') if isinstance(data, dict) else None
+        if views is None:
+            # Errors such as a 403 detail
+            return str(data)
+        lines = ['# TYPE dentiflow_request_duration_seconds summary']
+        for view, stats in views.items():
+            for q in QUANTILES:
+                value = stats['duration_ms'][f'p{int(q * 100)}'] / 1000
+                lines.append(f'dentiflow_request_duration_seconds{{view="{view}",quantile="{q}"}} {value}')
+            lines.append(f'dentiflow_request_duration_seconds_sum{{view="{view}"}} {stats["totals"]["duration_seconds"]}')
+            lines.append(f'dentiflow_request_duration_seconds_count{{view="{view}"}} {stats["requests"]}')
+        for name, value in self.COUNTERS:
+            lines.append(f'# TYPE {name} counter')
+            lines.extend(f'{name}{{view="{view}"}} {value(stats)}' for view, stats in views.items())
+        return '\n'.join(lines) + '\n'
+
+
+class MetricsView(APIView):
+    """Aggregated request metrics for this process (staff only)."""
+    permission_classes = [IsAdminUser]
+    renderer_classes = [JSONRenderer, PrometheusRenderer]
+
+    def get(self, request):
+        config = metrics_settings()
+        return Response({
+            'enabled': config['ENABLED'],
+            'sample_rate': config['SAMPLE_RATE'],
+            'views': registry.snapshot(),
+        })
@@ -0,0 +1,120 @@
+"""
+Keyset pagination for the long, append-mostly lists.
+
+DRF's ``CursorPagination`` positions its cursor on the first ordering field
+only and falls back to an OFFSET among rows that share that value, which is
+most of a busy day for appointments. ``KeysetPagination`` stores the values of
+every ordering field in the cursor instead, with the primary key appended as a
+tie-breaker, and turns them into a row comparison:
+
+    (a > x) OR (a = x AND b > y) OR (a = x AND b = y AND id > z)
+
+So every page, however deep, is an index range scan of ``page_size + 1`` rows
+with no COUNT(*).
+"""
+import json
+import operator
+from functools import reduce
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, Cursor
+
+
+class KeysetPagination(CursorPagination):
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        # Rows must be totally ordered for a cursor to point between two of them
+        if not {'pk', '-pk', 'id', '-id'} & set(ordering):
+            ordering = ordering + ('id',)
+        return ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+
+        ordering = [_flip(field) for field in self.ordering] if reverse else list(self.ordering)
+        queryset = queryset.order_by(*ordering)
+        if self.cursor is not None and self.cursor.position is not None:
+            try:
+                queryset = queryset.filter(self._after(ordering, self._decode_position(self.cursor.position)))
+            except (ValidationError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.cursor is not None
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=self._encode_position(self.page[-1])))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            # Ran off the end; step back to the last real page
+            return self.encode_cursor(Cursor(offset=0, reverse=True, position=None))
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=self._encode_position(self.page[0])))
+
+    def get_html_context(self):
+        return {'previous_url': self.get_previous_link(), 'next_url': self.get_next_link()}
+
+    def _encode_position(self, instance):
+        values = []
+        for field in self.ordering:
+            value = getattr(instance, field.lstrip('-'))
+            values.append(value.isoformat() if hasattr(value, 'isoformat') else str(value))
+        return json.dumps(values)
+
+    def _decode_position(self, position):
+        try:
+            values = json.loads(position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return values
+
+    def _after(self, ordering, values):
+        """Build the filter for rows strictly after ``values`` in ``ordering``."""
+        clauses = []
+        for index, field in enumerate(ordering):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            clause = Q(**{f'{name}__{lookup}': values[index]})
+            for previous, value in zip(ordering[:index], values):
+                clause &= Q(**{previous.lstrip('-'): value})
+            clauses.append(clause)
+        return reduce(operator.or_, clauses)
+
+
+def _flip(field):
+    return field[1:] if field.startswith('-') else '-' + field
+
+
+class AppointmentPagination(KeysetPagination):
+    ordering = ('date', 'start_time', 'id')
+
+
+class CreatedDescPagination(KeysetPagination):
+    """Newest first, for invoices and payments."""
+    ordering = ('-created_at', 'id')
@@ -45,6 +45,8 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
+    # Inactive unless METRICS['ENABLED'] is set (see backend/metrics.py)
+    'backend.metrics.MetricsMiddleware',
 ]
 
 ROOT_URLCONF = 'backend.urls'
@@ -79,6 +81,43 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Per-process by default; point this at Redis or Memcached when running several workers
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# With a per-process cache, version bumps only reach the worker that made the
+# change, so version-invalidated data (reference responses, the autocomplete
+# index, occupancy bitmaps) expires after this many seconds instead
+PROCESS_LOCAL_CACHE_TIMEOUT = 60
+
+# Cached reference data responses (see backend/caching.py). Set SHARED to also
+# store entries in the cache above once it is shared between processes
+REFERENCE_CACHE = {
+    'ALIAS': 'default',
+    'SHARED': False,
+    'LRU_SIZE': 256,
+}
+
+
+# Request instrumentation (see backend/metrics.py); served at /api/_metrics
+METRICS = {
+    'ENABLED': False,
+    'SAMPLE_RATE': 0.1,
+}
+
+
+# Patient search backend (see clinic/search.py); use
+# 'clinic.search.TokenSearchBackend' on databases other than SQLite
+
+PATIENT_SEARCH_BACKEND = 'clinic.search.SQLiteFTSBackend'
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -0,0 +1,51 @@
+from datetime import date
+from decimal import Decimal
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from backend.metrics import registry
+from billing.models import Patient, Invoice, InsuranceClaim, InsuranceProvider
+
+
+@override_settings(METRICS={'ENABLED': True, 'SAMPLE_RATE': 1.0, 'DUPLICATE_THRESHOLD': 3})
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='frontdesk', email='desk@example.com', password='x')
+        cls.admin = User.objects.create_user(username='admin', email='admin@example.com', password='x', is_staff=True)
+        patient = Patient.objects.create(
+            first_name='Jane', last_name='Doe', date_of_birth=date(1990, 1, 1), phone='5550000000'
+        )
+        invoice = Invoice.objects.create(invoice_number='INV-00001', patient=patient, due_date=date(2025, 2, 1))
+        for i in range(4):
+            provider = InsuranceProvider.objects.create(name=f'Provider {i}')
+            InsuranceClaim.objects.create(invoice=invoice, insurance_provider=provider, amount_claimed=Decimal('40.00'))
+    
+    def setUp(self):
+        registry.reset()
+        self.client = APIClient()
+    
+    def test_records_views_and_repeated_queries(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.get(reverse('insuranceclaim-list'))
+        self.assertRegex(response['Server-Timing'], r'^app;dur=[\d.]+, db;dur=[\d.]+;desc="\d+ queries"$')
+        self.client.get(reverse('invoice-list'))
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        
+        self.client.force_authenticate(self.admin)
+        views = self.client.get(reverse('metrics')).json()['views']
+        self.assertEqual(set(views), {'InsuranceClaimViewSet.list', 'InvoiceViewSet.list'})
+        # The claim list loads each provider on its own: an N+1
+        claims = views['InsuranceClaimViewSet.list']
+        self.assertEqual(claims['requests'], 1)
+        self.assertEqual(claims['requests_with_repeated_queries'], 1)
+        self.assertEqual(claims['repeated_query_example']['runs'], 4)
+        self.assertEqual(views['InvoiceViewSet.list']['requests_with_repeated_queries'], 0)
+        self.assertGreater(claims['response_bytes_per_request'], 0)
+        
+        text = self.client.get(reverse('metrics'), {'format': 'prometheus'}).content.decode()
+        self.assertIn('dentiflow_request_duration_seconds{view="InvoiceViewSet.list",quantile="0.99"}', text)
+        self.assertIn('dentiflow_repeated_query_requests_total{view="InsuranceClaimViewSet.list"} 1', text)
@@ -1,10 +1,16 @@
 from django.contrib import admin
 from django.urls import path, include
 
+from billing.urls import async_urlpatterns as billing_async_urlpatterns
+
+from .metrics import MetricsView
+
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('api/_metrics', MetricsView.as_view(), name='metrics'),
     path('api/auth/', include('accounts.urls')),
     path('api/billing', include('billing.urls')), 
+    path('api/async/billing/', include(billing_async_urlpatterns)),
     path("api/", include("patients.urls")),
     path('', include('clinic.urls')),
 ]
\ No newline at end of file
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
 application = get_wsgi_application()
+
+# Load the in-memory patient autocomplete index before the first request
+from clinic.autocomplete import warm  # noqa: E402
+
+warm()
@@ -0,0 +1,7 @@
+"""
+Benchmarks for the DentiFlow backend.
+
+Run them from the ``backend`` directory, e.g. ``python -m benchmarks.query_plans``.
+Every benchmark seeds and queries a throwaway test database; ``db.sqlite3``
+is never touched.
+"""
@@ -0,0 +1,379 @@
+"""
+Load-test the hot clinic and billing endpoints and report the results as JSON.
+
+    python -m benchmarks.api_load --appointments 200000 --invoices 50000 --json api.json
+    python -m benchmarks.api_load --server wsgi --concurrency 4 --baseline api.json
+
+A throwaway database is seeded with ``benchmarks.seed`` at the given scale. A
+fixed, seeded sequence of requests is then sent to each endpoint, either
+through Django's test client (the default) or over HTTP to a local server
+running in this process:
+
+* ``--server wsgi`` uses the standard library's threaded ``wsgiref`` server;
+* ``--server asgi`` uses uvicorn, if it is installed.
+
+For every endpoint the report gives throughput, client-side latency
+percentiles, the server's own time and the number of SQL queries per request.
+The last two come from the ``Server-Timing`` header of
+``backend.metrics.MetricsMiddleware``, which this harness switches on. Keys are
+sorted so reports from two releases can be diffed directly, or compared with
+``--baseline``.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from datetime import date, timedelta
+from urllib import request as urllib_request
+from urllib.error import HTTPError
+
+from .utils import setup_django, test_database, summarize_ms
+from .seed import FIRST_NAMES
+
+SERVER_TIMING_RE = re.compile(r'app;dur=([\d.]+), db;dur=([\d.]+);desc="(\d+) queries"')
+
+
+def endpoints(context):
+    """
+    Return ``{name: build}`` for the endpoints under test.
+    
+    ``build(rng)`` returns the ``(method, path, json_body)`` of one request.
+    """
+    from django.urls import reverse
+    
+    def random_day(rng):
+        return context['start'] + timedelta(days=rng.randrange(context['days']))
+    
+    def available_slots(rng):
+        return 'GET', f"{reverse('appointment-available-slots')}?date={random_day(rng)}", None
+    
+    def counts(rng):
+        day = random_day(rng)
+        return 'GET', f"{reverse('appointment-counts')}?year={day.year}&month={day.month}", None
+    
+    def by_date(rng):
+        return 'GET', reverse('appointment-by-date', kwargs={'date': random_day(rng).isoformat()}), None
+    
+    def create_appointment(rng):
+        # Book after the seeded range, where most slots are still free
+        day = context['start'] + timedelta(days=context['days'] + rng.randrange(365))
+        return 'POST', reverse('appointment-list'), {
+            'patient': rng.choice(context['patient_ids']),
+            'appointment_type': rng.choice(context['appointment_type_ids']),
+            'date': day.isoformat(),
+            'start_time': f"{rng.choice([9, 10, 11, 12, 14, 15, 16]):02d}:{rng.choice([0, 30]):02d}",
+            'duration': 30,
+        }
+    
+    def invoice_list(rng):
+        return 'GET', reverse('invoice-list'), None
+    
+    def stats(rng):
+        day = random_day(rng)
+        return 'GET', f"{reverse('invoice-stats')}?period={day:%Y-%m}", None
+    
+    def search(rng):
+        return 'GET', f"{reverse('patient-search')}?q={rng.choice(FIRST_NAMES)[:rng.randint(2, 4)].lower()}", None
+    
+    return {
+        'appointments.available_slots': available_slots,
+        'appointments.counts': counts,
+        'appointments.by_date': by_date,
+        'appointments.create': create_appointment,
+        'invoices.list': invoice_list,
+        'invoices.stats': stats,
+        'patients.search': search,
+    }
+
+
+class TestClientTransport:
+    name = 'test-client'
+    
+    def __init__(self, user):
+        from rest_framework.test import APIClient
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+        # One client isn't safe to share between threads
+        self.concurrency_safe = False
+    
+    def send(self, method, path, body):
+        if method == 'GET':
+            response = self.client.get(path)
+        else:
+            response = self.client.post(path, body, format='json')
+        return response.status_code, response.get('Server-Timing', '')
+
+
+class HTTPTransport:
+    def __init__(self, name, base_url, token):
+        self.name = name
+        self.base_url = base_url
+        self.token = token
+        self.concurrency_safe = True
+    
+    def send(self, method, path, body):
+        data = json.dumps(body).encode() if body is not None else None
+        req = urllib_request.Request(self.base_url + path, data=data, method=method, headers={
+            'Authorization': f'Bearer {self.token}',
+            'Content-Type': 'application/json',
+            'Accept': 'application/json',
+        })
+        try:
+            with urllib_request.urlopen(req) as response:
+                response.read()
+                return response.status, response.headers.get('Server-Timing', '')
+        except HTTPError as error:
+            error.read()
+            return error.code, error.headers.get('Server-Timing', '')
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def local_server(kind, workers=None):
+    """
+    Serve the project on 127.0.0.1 from a background thread and yield its base URL.
+    
+    ``workers`` caps the WSGI server at that many request threads, like a
+    worker-per-request deployment; by default every request gets a thread.
+    """
+    if kind == 'wsgi':
+        from socketserver import ThreadingMixIn
+        from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+        from django.core.wsgi import get_wsgi_application
+        
+        pool = ThreadPoolExecutor(max_workers=workers) if workers else None
+        
+        class Server(ThreadingMixIn, WSGIServer):
+            daemon_threads = True
+            # The default backlog of 5 drops bursts of connections into TCP retry backoff
+            request_queue_size = 1024
+            
+            def process_request(self, request, client_address):
+                if pool is None:
+                    return super().process_request(request, client_address)
+                # Connections queue for a free worker
+                pool.submit(self.process_request_thread, request, client_address)
+        
+        class QuietHandler(WSGIRequestHandler):
+            def log_message(self, *args):
+                pass
+        
+        httpd = make_server('127.0.0.1', 0, get_wsgi_application(), server_class=Server, handler_class=QuietHandler)
+        thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+        thread.start()
+        try:
+            yield f'http://127.0.0.1:{httpd.server_port}'
+        finally:
+            httpd.shutdown()
+            thread.join()
+            if pool is not None:
+                pool.shutdown()
+        return
+    
+    try:
+        import uvicorn
+    except ImportError:
+        raise SystemExit("--server asgi needs uvicorn: pip install uvicorn")
+    from django.core.asgi import get_asgi_application
+    
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(
+        get_asgi_application(), host='127.0.0.1', port=port, log_level='warning', lifespan='off'
+    ))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    try:
+        yield f'http://127.0.0.1:{port}'
+    finally:
+        server.should_exit = True
+        thread.join()
+
+
+def run_endpoint(transport, build, requests, concurrency, rng, warmup):
+    """Send ``requests`` requests built by ``build`` and summarize them."""
+    planned = [build(rng) for _ in range(warmup + requests)]
+    for method, path, body in planned[:warmup]:
+        transport.send(method, path, body)
+    
+    def timed(planned_request):
+        started = time.perf_counter()
+        status, server_timing = transport.send(*planned_request)
+        return time.perf_counter() - started, status, server_timing
+    
+    started = time.perf_counter()
+    if concurrency > 1 and transport.concurrency_safe:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(timed, planned[warmup:]))
+    else:
+        results = [timed(planned_request) for planned_request in planned[warmup:]]
+    elapsed = time.perf_counter() - started
+    
+    server_times = []
+    queries = []
+    for _, _, server_timing in results:
+        match = SERVER_TIMING_RE.search(server_timing)
+        if match:
+            server_times.append(float(match.group(1)) / 1000)
+            queries.append(int(match.group(3)))
+    return {
+        'requests': len(results),
+        'statuses': dict(sorted(Counter(str(status) for _, status, _ in results).items())),
+        'throughput_rps': round(len(results) / elapsed, 1),
+        'latency_ms': summarize_ms([duration for duration, _, _ in results]),
+        'server_ms': summarize_ms(server_times),
+        'queries': {
+            'mean': round(sum(queries) / len(queries), 2),
+            'max': max(queries),
+        } if queries else {},
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_comparison(report, baseline):
+    print(f"\n{'endpoint':<32}{'rps':>10}{'Δ':>8}{'p95 ms':>10}{'Δ':>8}{'queries':>9}{'Δ':>7}")
+    for name, result in report['endpoints'].items():
+        before = baseline.get('endpoints', {}).get(name)
+        
+        def change(section, key):
+            if not before or not before.get(section) or not result.get(section):
+                return ''
+            old, new = before[section][key], result[section][key]
+            return f"{(new - old) / old * 100:+.0f}%" if old else ''
+        
+        rps_change = ''
+        if before:
+            rps_change = f"{(result['throughput_rps'] - before['throughput_rps']) / before['throughput_rps'] * 100:+.0f}%"
+        print(
+            f"{name:<32}{result['throughput_rps']:>10}{rps_change:>8}"
+            f"{result['latency_ms'].get('p95', ''):>10}{change('latency_ms', 'p95'):>8}"
+            f"{result['queries'].get('mean', ''):>9}{change('queries', 'mean'):>7}"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--patients', type=int, default=5_000)
+    parser.add_argument('--appointments', type=int, default=100_000)
+    parser.add_argument('--invoices', type=int, default=20_000)
+    parser.add_argument('--years', type=int, default=3)
+    parser.add_argument('--requests', type=int, default=200, help='Requests per endpoint')
+    parser.add_argument('--warmup', type=int, default=10, help='Unmeasured requests per endpoint')
+    parser.add_argument('--concurrency', type=int, default=1, help='Parallel requests (HTTP servers only)')
+    parser.add_argument('--server', choices=['wsgi', 'asgi'], help='Send requests over HTTP to a local server')
+    parser.add_argument('--only', help='Comma-separated endpoint names to run')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', help='Write the report to this file')
+    parser.add_argument('--baseline', help='Compare with a report written earlier')
+    args = parser.parse_args(argv)
+    
+    setup_django()
+    import django
+    from django.conf import settings
+    from rest_framework_simplejwt.tokens import RefreshToken
+    from accounts.models import User
+    from clinic.models import Patient, AppointmentType
+    from .seed import seed_clinic, seed_billing
+    
+    # Server-Timing on every response carries the server time and query count
+    settings.METRICS = {'ENABLED': True, 'SAMPLE_RATE': 1.0, 'SERVER_TIMING': True}
+    database = settings.DATABASES['default']
+    if args.server and database['ENGINE'].endswith('sqlite3'):
+        # Server threads share the in-memory test database through SQLite's shared
+        # cache, where concurrent writers fail with "table is locked" instead of
+        # waiting; a file database waits for the lock like a real deployment
+        database.setdefault('TEST', {})['NAME'] = os.path.join(tempfile.gettempdir(), 'dentiflow_api_load.sqlite3')
+    
+    rng = random.Random(args.seed)
+    start = date(2020, 1, 1)
+    days = 365 * args.years
+    report = {
+        'meta': {
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'transport': args.server or 'test-client',
+            'concurrency': args.concurrency if args.server else 1,
+            'seed': args.seed,
+            'scale': {
+                'patients': args.patients, 'appointments': args.appointments,
+                'invoices': args.invoices, 'years': args.years,
+            },
+            'requests_per_endpoint': args.requests,
+        },
+        'endpoints': {},
+    }
+    
+    with test_database() as connection:
+        report['meta']['vendor'] = connection.vendor
+        print(f"Seeding {args.appointments} appointments and {args.invoices} invoices...", file=sys.stderr)
+        seed_clinic(rng, patients=args.patients, appointments=args.appointments, start=start, days=days)
+        seed_billing(rng, patients=args.patients, invoices=args.invoices, start=start, days=days)
+        user = User.objects.create_user(username='benchmark', email='benchmark@example.com', password='x')
+        context = {
+            'start': start,
+            'days': days,
+            'patient_ids': list(Patient.objects.values_list('id', flat=True)),
+            'appointment_type_ids': list(AppointmentType.objects.values_list('id', flat=True)),
+        }
+        
+        selected = endpoints(context)
+        if args.only:
+            selected = {name: selected[name] for name in args.only.split(',')}
+        
+        with local_server(args.server) if args.server else nullcontext() as base_url:
+            if base_url:
+                transport = HTTPTransport(args.server, base_url, str(RefreshToken.for_user(user).access_token))
+            else:
+                transport = TestClientTransport(user)
+            for name, build in selected.items():
+                print(f"{name}...", file=sys.stderr)
+                report['endpoints'][name] = run_endpoint(
+                    transport, build, args.requests, args.concurrency, random.Random(f'{args.seed}:{name}'),
+                    args.warmup,
+                )
+    
+    print(f"{'endpoint':<32}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>9}  statuses")
+    for name, result in report['endpoints'].items():
+        latency = result['latency_ms']
+        print(
+            f"{name:<32}{result['throughput_rps']:>10}{latency['p50']:>10}{latency['p95']:>10}"
+            f"{latency['p99']:>10}{result['queries'].get('mean', ''):>9}  {result['statuses']}"
+        )
+    
+    if args.baseline:
+        with open(args.baseline) as f:
+            print_comparison(report, json.load(f))
+    
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,233 @@
+"""
+Compare the sync and async dashboard reads under concurrent clients.
+
+    python -m benchmarks.async_reads --clients 32 --loads 20 --workers 4
+    python -m benchmarks.async_reads --modes wsgi-sync,asgi-async --json async.json
+
+Each simulated client opens the dashboard ``--loads`` times. One dashboard
+load fires four requests at once and waits for all of them: ``by_date``,
+``counts`` and ``available_slots`` for a random day, and the billing
+``stats`` for that month. The same seeded sequence of loads is replayed
+against each mode:
+
+* ``wsgi-sync``: the DRF viewset actions on a WSGI server with ``--workers``
+  request threads, like a worker-per-request deployment;
+* ``asgi-sync``: the same actions under uvicorn, where Django runs every sync
+  view on a thread;
+* ``asgi-async``: the ``api/async/`` views under uvicorn.
+
+Each server runs in its own process on a file copy of the seeded database,
+so the clients don't compete with it for the GIL. SQLite answers these
+queries in well under a millisecond, which hides what a deployment with a
+database across the network waits for; ``--db-latency`` adds that round trip
+to every query on the server side.
+
+The ASGI modes need uvicorn. For each mode the report gives dashboard loads
+per second and the latency of whole loads and of single requests.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from .api_load import HTTPTransport, git_revision, local_server
+from .utils import setup_django, test_database, summarize_ms
+
+MODES = ['wsgi-sync', 'asgi-sync', 'asgi-async']
+FAN_OUT = 4
+
+
+def dashboard_paths(day, use_async):
+    """The four requests of one dashboard load for ``day``."""
+    from django.urls import reverse
+    
+    prefix = 'async-' if use_async else ''
+    return [
+        reverse(f'{prefix}appointment-by-date', kwargs={'date': day.isoformat()}),
+        f"{reverse(f'{prefix}appointment-counts')}?year={day.year}&month={day.month}",
+        f"{reverse(f'{prefix}appointment-available-slots')}?date={day}",
+        f"{reverse(f'{prefix}invoice-stats')}?period={day:%Y-%m}",
+    ]
+
+
+def run_mode(transport, days, clients, use_async):
+    """Replay the dashboard loads in ``days`` (one list per client) and summarize them."""
+    # Every request of every client in flight at once, as browsers would send them
+    pool = ThreadPoolExecutor(max_workers=clients * FAN_OUT)
+    
+    def timed(path):
+        started = time.perf_counter()
+        status, _ = transport.send('GET', path, None)
+        return time.perf_counter() - started, status
+    
+    def client(client_days):
+        results = []
+        for day in client_days:
+            started = time.perf_counter()
+            requests = list(pool.map(timed, dashboard_paths(day, use_async)))
+            results.append((time.perf_counter() - started, requests))
+        return results
+    
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as client_pool:
+        loads = [load for results in client_pool.map(client, days) for load in results]
+    elapsed = time.perf_counter() - started
+    pool.shutdown()
+    
+    requests = [request for _, load_requests in loads for request in load_requests]
+    return {
+        'loads': len(loads),
+        'statuses': dict(sorted(Counter(str(status) for _, status in requests).items())),
+        'loads_per_second': round(len(loads) / elapsed, 1),
+        'load_latency_ms': summarize_ms([duration for duration, _ in loads]),
+        'request_latency_ms': summarize_ms([duration for duration, _ in requests]),
+    }
+
+
+def serve(mode, database, workers, db_latency):
+    """Run one mode's server on ``database`` until stdin closes, printing its URL first."""
+    setup_django()
+    from django.conf import settings
+    from django.db.backends.signals import connection_created
+    
+    # The sync-only metrics middleware would push async views back onto threads
+    settings.METRICS = {'ENABLED': False}
+    settings.DATABASES['default']['NAME'] = database
+    
+    if db_latency:
+        def delay(execute, sql, params, many, context):
+            time.sleep(db_latency / 1000)
+            return execute(sql, params, many, context)
+        
+        def add_delay(sender, connection, **kwargs):
+            # Fires on every reconnect of a thread's connection wrapper
+            if delay not in connection.execute_wrappers:
+                connection.execute_wrappers.append(delay)
+        
+        connection_created.connect(add_delay, weak=False)
+    
+    server = mode.split('-')[0]
+    with local_server(server, workers=workers if server == 'wsgi' else None) as base_url:
+        print(base_url, flush=True)
+        sys.stdin.read()
+
+
+def start_server(mode, database, workers, db_latency):
+    process = subprocess.Popen(
+        [
+            sys.executable, '-m', 'benchmarks.async_reads', '--serve', mode, '--database', database,
+            '--workers', str(workers), '--db-latency', str(db_latency),
+        ],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    base_url = process.stdout.readline().strip()
+    if not base_url:
+        process.wait()
+        raise SystemExit(f"The {mode} server did not start")
+    return process, base_url
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--patients', type=int, default=2_000)
+    parser.add_argument('--appointments', type=int, default=50_000)
+    parser.add_argument('--invoices', type=int, default=10_000)
+    parser.add_argument('--years', type=int, default=2)
+    parser.add_argument('--clients', type=int, default=16, help='Concurrent dashboard users')
+    parser.add_argument('--loads', type=int, default=10, help='Dashboard loads per client')
+    parser.add_argument('--workers', type=int, default=4, help='Request threads of the WSGI server')
+    parser.add_argument('--modes', default=','.join(MODES), help='Comma-separated modes to run')
+    parser.add_argument('--db-latency', type=float, default=0, help='Milliseconds added to every server query')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', help='Write the report to this file')
+    # Internal: run one server for the parent process
+    parser.add_argument('--serve', choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument('--database', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.serve:
+        return serve(args.serve, args.database, args.workers, args.db_latency)
+    
+    modes = args.modes.split(',')
+    for mode in modes:
+        if mode not in MODES:
+            parser.error(f"unknown mode {mode!r}; choose from {', '.join(MODES)}")
+    
+    setup_django()
+    import django
+    from django.conf import settings
+    from rest_framework_simplejwt.tokens import RefreshToken
+    from accounts.models import User
+    from .seed import seed_clinic, seed_billing
+    
+    database = settings.DATABASES['default']
+    if not database['ENGINE'].endswith('sqlite3'):
+        raise SystemExit("async_reads shares its database with the server processes as a SQLite file")
+    database_path = os.path.join(tempfile.gettempdir(), 'dentiflow_async_reads.sqlite3')
+    database.setdefault('TEST', {})['NAME'] = database_path
+    
+    rng = random.Random(args.seed)
+    start = date(2020, 1, 1)
+    total_days = 365 * args.years
+    days = [
+        [start + timedelta(days=rng.randrange(total_days)) for _ in range(args.loads)]
+        for _ in range(args.clients)
+    ]
+    report = {
+        'meta': {
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'clients': args.clients,
+            'loads_per_client': args.loads,
+            'wsgi_workers': args.workers,
+            'db_latency_ms': args.db_latency,
+            'seed': args.seed,
+            'scale': {
+                'patients': args.patients, 'appointments': args.appointments,
+                'invoices': args.invoices, 'years': args.years,
+            },
+        },
+        'modes': {},
+    }
+    
+    with test_database() as connection:
+        report['meta']['vendor'] = connection.vendor
+        print(f"Seeding {args.appointments} appointments and {args.invoices} invoices...", file=sys.stderr)
+        seed_clinic(rng, patients=args.patients, appointments=args.appointments, start=start, days=total_days)
+        seed_billing(rng, patients=args.patients, invoices=args.invoices, start=start, days=total_days)
+        user = User.objects.create_user(username='benchmark', email='benchmark@example.com', password='x')
+        token = str(RefreshToken.for_user(user).access_token)
+        
+        for mode in modes:
+            print(f"{mode}...", file=sys.stderr)
+            process, base_url = start_server(mode, database_path, args.workers, args.db_latency)
+            try:
+                transport = HTTPTransport(mode, base_url, token)
+                report['modes'][mode] = run_mode(transport, days, args.clients, mode.endswith('-async'))
+            finally:
+                process.stdin.close()
+                process.wait()
+    
+    print(f"{'mode':<14}{'loads/s':>10}{'load p50':>10}{'load p95':>10}{'req p95':>10}  statuses")
+    for mode, result in report['modes'].items():
+        print(
+            f"{mode:<14}{result['loads_per_second']:>10}{result['load_latency_ms']['p50']:>10}"
+            f"{result['load_latency_ms']['p95']:>10}{result['request_latency_ms']['p95']:>10}  {result['statuses']}"
+        )
+    
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Microbenchmark for the availability and conflict checks behind the calendar.
+
+    python -m benchmarks.occupancy --appointments 10000 --checks 2000
+
+For a sample of seeded days, compares rebuilding free slots from the day's
+rows with the reference sweep in ``clinic.scheduling`` and running the conflict query (the
+previous ``validate``) with the cached occupancy bitmaps from
+``clinic.occupancy``. Timings are per call.
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+from .utils import setup_django, test_database, count_queries
+
+
+def per_call_us(func, calls):
+    started = time.perf_counter()
+    for args in calls:
+        func(*args)
+    return round((time.perf_counter() - started) / len(calls) * 1_000_000, 1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--appointments', type=int, default=10_000)
+    parser.add_argument('--patients', type=int, default=1_000)
+    parser.add_argument('--years', type=int, default=3)
+    parser.add_argument('--checks', type=int, default=2_000, help='Calls per variant')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', help='Write the results to this file')
+    args = parser.parse_args(argv)
+    
+    setup_django()
+    from clinic import availability, occupancy
+    from clinic.models import Appointment
+    from clinic.scheduling import find_conflicting_appointment, free_slots
+    from .seed import seed_clinic
+    
+    rng = random.Random(args.seed)
+    start = date(2020, 1, 1)
+    days = 365 * args.years
+    report = {'appointments': args.appointments, 'checks': args.checks}
+    with test_database():
+        print(f"Seeding {args.appointments} appointments...", file=sys.stderr)
+        seed_clinic(rng, patients=args.patients, appointments=args.appointments, start=start, days=days)
+        
+        # A few hundred distinct days, each asked about repeatedly as the calendar does
+        sample_days = [start + timedelta(days=rng.randrange(days)) for _ in range(200)]
+        slot_calls = [(rng.choice(sample_days),) for _ in range(args.checks)]
+        check_calls = [
+            (rng.choice(sample_days), rng.choice(occupancy.free_starts(0, availability.clinic_hours(start))), 30) for _ in range(args.checks)
+        ]
+        
+        def rows_slots(day):
+            return free_slots(Appointment.objects.filter(
+                date=day, status=Appointment.STATUS_SCHEDULED
+            ).values_list('start_time', 'duration'))
+        
+        def bitmap_slots(day):
+            return occupancy.free_starts(occupancy.get_bits(day), availability.clinic_hours(day))
+        
+        def bitmap_check(day, start_time, duration):
+            return occupancy.is_free(day, start_time, duration) or find_conflicting_appointment(
+                day, start_time, duration
+            ) is None
+        
+        def query_check(day, start_time, duration):
+            return find_conflicting_appointment(day, start_time, duration) is None
+        
+        for (day,) in slot_calls[:50]:
+            assert rows_slots(day) == bitmap_slots(day)
+        for call in check_calls[:50]:
+            assert query_check(*call) == bitmap_check(*call)
+        
+        report['available_slots_us'] = {
+            'rows': per_call_us(rows_slots, slot_calls),
+            'bitmap': per_call_us(bitmap_slots, slot_calls),
+        }
+        report['conflict_check_us'] = {
+            'query': per_call_us(query_check, check_calls),
+            'bitmap': per_call_us(bitmap_check, check_calls),
+        }
+        report['bitmap_free_fraction'] = round(
+            sum(occupancy.is_free(*call) for call in check_calls) / len(check_calls), 3
+        )
+        report['bitmap_queries_per_check'] = round(
+            count_queries(lambda: [bitmap_check(*call) for call in check_calls]) / len(check_calls), 3
+        )
+    
+    print(f"available_slots: {report['available_slots_us']['rows']:>8} µs from rows, "
+          f"{report['available_slots_us']['bitmap']:>8} µs from the bitmap")
+    print(f"conflict check:  {report['conflict_check_us']['query']:>8} µs by query, "
+          f"{report['conflict_check_us']['bitmap']:>8} µs bitmap first "
+          f"({report['bitmap_queries_per_check']} queries per check)")
+    
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+Measure bulk patient import throughput against one POST per patient.
+
+    python -m benchmarks.patient_import --rows 50000 --json import.json
+
+A CSV of synthetic patients, with a share of duplicate and invalid rows, is
+imported through ``clinic.importer.import_patients`` at a few batch sizes. A
+sample of the same rows is then created one at a time through the clinic
+``PatientSerializer`` to show the per-request path it replaces.
+"""
+import argparse
+import csv
+import io
+import json
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+from .utils import setup_django, test_database
+from .seed import random_name
+
+
+def patient_csv(rng, rows, duplicate_ratio=0.02, invalid_ratio=0.02):
+    """Return CSV text for ``rows`` patients, some of them duplicates or invalid."""
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(['name', 'email', 'phone', 'date_of_birth', 'preferred_time'])
+    for i in range(rows):
+        email, phone = f"import{i}@example.com", f"(555) {i // 10000:03d}-{i % 10000:04d}"
+        roll = rng.random()
+        if roll < duplicate_ratio and i:
+            email = f"import{rng.randrange(i)}@example.com"
+        elif roll < duplicate_ratio + invalid_ratio:
+            phone = '12-34'
+        writer.writerow([
+            random_name(rng), email, phone,
+            (date(1950, 1, 1) + timedelta(days=rng.randint(0, 25000))).isoformat(),
+            rng.choice(['Morning', 'Afternoon', 'Evening', '']),
+        ])
+    return output.getvalue()
+
+
+def run_import(content, batch_size):
+    from clinic.importer import import_patients, read_rows
+    from clinic.models import Patient
+    
+    Patient.objects.all().delete()
+    return import_patients(read_rows(io.StringIO(content), 'csv'), batch_size=batch_size)
+
+
+def run_serializer(content, rows):
+    from clinic.models import Patient
+    from clinic.serializers import PatientSerializer
+    
+    Patient.objects.all().delete()
+    reader = csv.DictReader(io.StringIO(content))
+    started = time.perf_counter()
+    count = 0
+    for row in reader:
+        if count == rows:
+            break
+        serializer = PatientSerializer(data={key: value or None for key, value in row.items()})
+        if serializer.is_valid():
+            serializer.save()
+        count += 1
+    elapsed = time.perf_counter() - started
+    return {'rows': count, 'seconds': round(elapsed, 3), 'rows_per_second': round(count / elapsed)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=50_000)
+    parser.add_argument('--batch-sizes', default='250,1000,5000')
+    parser.add_argument('--serializer-rows', type=int, default=2_000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', help='Write the results to this file')
+    args = parser.parse_args(argv)
+    
+    setup_django()
+    content = patient_csv(random.Random(args.seed), args.rows)
+    
+    report = {'rows': args.rows, 'import': {}}
+    with test_database() as connection:
+        report['vendor'] = connection.vendor
+        for batch_size in map(int, args.batch_sizes.split(',')):
+            print(f"Importing {args.rows} rows in batches of {batch_size}...", file=sys.stderr)
+            result = run_import(content, batch_size)
+            report['import'][batch_size] = {
+                'created': result['created'],
+                'rejected': len(result['errors']),
+                'seconds': result['seconds'],
+                'rows_per_second': result['rows_per_second'],
+            }
+        print(f"Creating {args.serializer_rows} rows one at a time...", file=sys.stderr)
+        report['one_by_one'] = run_serializer(content, args.serializer_rows)
+    
+    for batch_size, result in report['import'].items():
+        print(f"batch {batch_size:>5}: {result['rows_per_second']:>8} rows/s "
+              f"({result['created']} created, {result['rejected']} rejected in {result['seconds']} s)")
+    print(f"one by one:  {report['one_by_one']['rows_per_second']:>8} rows/s")
+    
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""
+Show the query plans of the hot clinic and billing queries with and without
+the ``Meta.indexes`` declared on Appointment, Invoice and Payment.
+
+    python -m benchmarks.query_plans --appointments 1000000 --json plans.json
+
+The dataset is seeded once and measured with the indexes in place, then the
+indexes are dropped and the same queries are measured again.
+"""
+import argparse
+import json
+import random
+import sys
+from datetime import date, time
+
+from .utils import setup_django, test_database, median_ms
+
+
+def hot_queries(day):
+    """Return ``{name: queryset}`` mirroring the ORM calls in clinic/views.py and billing/views.py."""
+    from django.db.models import Count, Sum
+    from clinic.models import Appointment
+    from billing.models import Invoice, Payment
+    
+    month_start = day.replace(day=1)
+    month_end = day.replace(day=28)
+    scheduled = Appointment.objects.filter(status=Appointment.STATUS_SCHEDULED)
+    return {
+        'appointments.list': Appointment.objects.all()[:10],
+        'appointments.by_date': scheduled.filter(date=day),
+        'appointments.counts': scheduled.filter(
+            date__gte=month_start, date__lte=month_end
+        ).values('date').annotate(count=Count('id')),
+        'appointments.conflict': scheduled.filter(
+            date=day, start_time__lt=time(10, 0)
+        ).order_by('start_time')[:1],
+        'invoices.list': Invoice.objects.order_by('-created_at')[:10],
+        'invoices.by_status': Invoice.objects.filter(status='SENT').order_by('-created_at')[:10],
+        'invoices.issued_this_month': Invoice.objects.filter(issue_date__gte=month_start).values('id'),
+        'payments.list': Payment.objects.order_by('-created_at')[:10],
+        'payments.revenue_this_month': Payment.objects.filter(
+            status='COMPLETED', payment_date__gte=month_start
+        ).values('status').annotate(total=Sum('amount')),
+    }
+
+
+def indexed_models():
+    from clinic.models import Appointment
+    from billing.models import Invoice, Payment
+    return [Appointment, Invoice, Payment]
+
+
+def measure(day, repeat):
+    results = {}
+    for name, queryset in hot_queries(day).items():
+        results[name] = {
+            'plan': queryset.explain(),
+            'ms': round(median_ms(lambda: list(queryset.all()), repeat), 3),
+        }
+    return results
+
+
+def analyze(connection):
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--appointments', type=int, default=1_000_000)
+    parser.add_argument('--invoices', type=int, default=100_000)
+    parser.add_argument('--patients', type=int, default=20_000)
+    parser.add_argument('--years', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', help='Write the results to this file')
+    args = parser.parse_args(argv)
+    
+    setup_django()
+    from .seed import seed_clinic, seed_billing
+    
+    rng = random.Random(args.seed)
+    start = date(2020, 1, 1)
+    days = 365 * args.years
+    day = date(2022, 6, 15)
+    
+    with test_database() as connection:
+        print(f"Seeding {args.appointments} appointments and {args.invoices} invoices...", file=sys.stderr)
+        seed_clinic(rng, patients=args.patients, appointments=args.appointments, start=start, days=days)
+        seed_billing(rng, patients=args.patients, invoices=args.invoices, start=start, days=days)
+        analyze(connection)
+        
+        indexed = measure(day, args.repeat)
+        
+        with connection.schema_editor() as editor:
+            for model in indexed_models():
+                for index in model._meta.indexes:
+                    editor.remove_index(model, index)
+        analyze(connection)
+        unindexed = measure(day, args.repeat)
+    
+    report = {
+        'vendor': connection.vendor,
+        'appointments': args.appointments,
+        'invoices': args.invoices,
+        'queries': {
+            name: {'without_indexes': unindexed[name], 'with_indexes': indexed[name]}
+            for name in indexed
+        },
+    }
+    
+    for name, result in report['queries'].items():
+        print(f"\n== {name}")
+        for label in ('without_indexes', 'with_indexes'):
+            print(f"  {label}: {result[label]['ms']} ms")
+            for line in result[label]['plan'].splitlines():
+                print(f"    {line}")
+    
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
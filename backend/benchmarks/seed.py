@@ -0,0 +1,172 @@
+"""
+Synthetic data for benchmarks, inserted with ``bulk_create`` in batches.
+
+All generators take a ``random.Random`` so runs with the same seed produce the
+same dataset.
+"""
+from datetime import date, time, timedelta
+from decimal import Decimal
+
+BATCH_SIZE = 5000
+
+FIRST_NAMES = ['John', 'Sarah', 'Mike', 'Emily', 'Robert', 'Lisa', 'David', 'Anna', 'James', 'Maria']
+LAST_NAMES = ['Doe', 'Smith', 'Johnson', 'Brown', 'Wilson', 'Martinez', 'Lee', 'Clark', 'Lewis', 'Young']
+
+
+def batched(objects, size=BATCH_SIZE):
+    """Yield lists of at most ``size`` items from an iterable."""
+    batch = []
+    for obj in objects:
+        batch.append(obj)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def bulk_insert(model, objects):
+    """Insert objects in BATCH_SIZE chunks and return how many were created."""
+    created = 0
+    for batch in batched(objects):
+        model.objects.bulk_create(batch)
+        created += len(batch)
+    return created
+
+
+def random_name(rng):
+    return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {rng.randint(1, 99999)}"
+
+
+def seed_clinic(rng, patients=1000, appointments=10000, start=date(2020, 1, 1), days=365 * 5):
+    """Seed clinic patients, appointment types and appointments spread over ``days`` days."""
+    from clinic.models import Patient, AppointmentType, Appointment
+    
+    appointment_types = AppointmentType.objects.bulk_create([
+        AppointmentType(name='Check-up', default_duration=30),
+        AppointmentType(name='Cleaning', default_duration=60),
+        AppointmentType(name='Filling', default_duration=45),
+    ])
+    bulk_insert(Patient, (
+        Patient(
+            name=random_name(rng),
+            email=f"patient{i}@example.com",
+            phone=f"555{i:07d}",
+            date_of_birth=date(1950, 1, 1) + timedelta(days=rng.randint(0, 25000)),
+            preferred_time=rng.choice(['Morning', 'Afternoon', 'Evening']),
+        )
+        for i in range(patients)
+    ))
+    patient_ids = list(Patient.objects.values_list('id', flat=True))
+    
+    statuses = [Appointment.STATUS_SCHEDULED] * 7 + [
+        Appointment.STATUS_COMPLETED, Appointment.STATUS_CANCELLED, Appointment.STATUS_NO_SHOW
+    ]
+    slots = [time(hour, minute) for hour in range(9, 17) if hour != 13 for minute in (0, 30)]
+    
+    def appointment(i):
+        appointment_type = rng.choice(appointment_types)
+        return Appointment(
+            patient_id=rng.choice(patient_ids),
+            appointment_type=appointment_type,
+            date=start + timedelta(days=rng.randrange(days)),
+            start_time=rng.choice(slots),
+            duration=appointment_type.default_duration,
+            status=rng.choice(statuses),
+        )
+    
+    created = bulk_insert(Appointment, (appointment(i) for i in range(appointments)))
+    rebuild_day_counts()
+    return created
+
+
+def rebuild_day_counts():
+    """Recount AppointmentDayCount, which bulk_create doesn't maintain."""
+    from django.db.models import Count
+    from clinic.models import Appointment, AppointmentDayCount
+    
+    AppointmentDayCount.objects.all().delete()
+    counts = Appointment.objects.order_by().values('date', 'status').annotate(total=Count('id'))
+    bulk_insert(AppointmentDayCount, (
+        AppointmentDayCount(date=row['date'], status=row['status'], count=row['total']) for row in list(counts)
+    ))
+
+
+def seed_billing(rng, patients=1000, invoices=10000, start=date(2020, 1, 1), days=365 * 5):
+    """
+    Seed billing patients and invoices with one to three items each, and one
+    payment for roughly every other invoice.
+    """
+    from django.db.models import OuterRef, Subquery, Sum
+    from django.db.models.functions import Coalesce
+    from billing.models import Patient, Invoice, InvoiceItem, Payment, DentalService
+    
+    services = DentalService.objects.bulk_create([
+        DentalService(name=name, code=code, description=name, default_price=Decimal(price))
+        for name, code, price in [
+            ('Exam', 'D0120', '60.00'), ('Cleaning', 'D1110', '110.00'), ('X-rays', 'D0210', '150.00'),
+            ('Filling', 'D2391', '220.00'), ('Crown', 'D2740', '1200.00'),
+        ]
+    ])
+    
+    bulk_insert(Patient, (
+        Patient(
+            first_name=rng.choice(FIRST_NAMES),
+            last_name=rng.choice(LAST_NAMES),
+            date_of_birth=date(1950, 1, 1) + timedelta(days=rng.randint(0, 25000)),
+            phone=f"555{i:07d}",
+        )
+        for i in range(patients)
+    ))
+    patient_ids = list(Patient.objects.values_list('id', flat=True))
+    statuses = [status for status, _ in Invoice.INVOICE_STATUS]
+    
+    def invoice(i):
+        issue_date = start + timedelta(days=rng.randrange(days))
+        subtotal = Decimal(rng.randint(50, 2000))
+        return Invoice(
+            invoice_number=f"INV-{i:08d}",
+            patient_id=rng.choice(patient_ids),
+            issue_date=issue_date,
+            due_date=issue_date + timedelta(days=30),
+            status=rng.choice(statuses),
+            subtotal=subtotal,
+            total=subtotal,
+        )
+    
+    bulk_insert(Invoice, (invoice(i) for i in range(invoices)))
+    
+    def items():
+        # Split each subtotal over its items so the ledger adds up
+        for invoice_id, subtotal in list(Invoice.objects.values_list('id', 'subtotal')):
+            count = rng.randint(1, 3)
+            share = (subtotal / count).quantize(Decimal('0.01'))
+            for n in range(count):
+                price = share if n < count - 1 else subtotal - share * (count - 1)
+                service = rng.choice(services)
+                yield InvoiceItem(
+                    invoice_id=invoice_id, service=service, description=service.name,
+                    quantity=1, unit_price=price, total_price=price,
+                )
+    
+    bulk_insert(InvoiceItem, items())
+    
+    def payments():
+        for invoice_id, issue_date, total in list(Invoice.objects.values_list('id', 'issue_date', 'total')):
+            if rng.random() < 0.5:
+                yield Payment(
+                    invoice_id=invoice_id,
+                    payment_date=issue_date + timedelta(days=rng.randint(0, 45)),
+                    amount=total,
+                    payment_method=rng.choice(['CASH', 'CARD', 'TRANSFER']),
+                    status=rng.choice(['COMPLETED', 'COMPLETED', 'COMPLETED', 'PENDING', 'FAILED']),
+                )
+    
+    created = bulk_insert(Payment, payments())
+    
+    # Invoice.amount_paid is kept by Payment.save, which bulk_create skips
+    completed = Payment.objects.filter(invoice=OuterRef('pk'), status='COMPLETED').order_by().values(
+        'invoice'
+    ).annotate(paid=Sum('amount')).values('paid')
+    Invoice.objects.update(amount_paid=Coalesce(Subquery(completed), Decimal('0')))
+    return created
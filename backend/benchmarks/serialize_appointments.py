@@ -0,0 +1,103 @@
+"""
+Microbenchmark for serializing appointments the way the list endpoints do.
+
+    python -m benchmarks.serialize_appointments --appointments 10000
+
+Compares the previous ``AppointmentSerializer`` (field-by-field rendering,
+strptime/strftime round trips, ``Appointment.end_time`` per row, lazy related
+names) with the current one on its optimized queryset. Both the whole read
+(query plus serialization) and serialization alone are timed.
+"""
+import argparse
+import json
+import random
+import sys
+
+from .utils import setup_django, test_database, median_ms, count_queries
+
+
+def legacy_serializer_class():
+    """
+    The AppointmentSerializer this benchmark replaced, kept here for comparison,
+    with the resource and series fields added since so the output still matches.
+    """
+    from datetime import datetime
+    from rest_framework import serializers
+    from clinic.models import Appointment
+    
+    class LegacyAppointmentSerializer(serializers.ModelSerializer):
+        patient_name = serializers.CharField(source='patient.name', read_only=True)
+        appointment_type_name = serializers.CharField(source='appointment_type.name', read_only=True)
+        end_time = serializers.TimeField(read_only=True)
+        
+        class Meta:
+            model = Appointment
+            fields = [
+                'id', 'patient', 'patient_name', 'appointment_type', 'appointment_type_name',
+                'chair', 'provider', 'series', 'date', 'start_time', 'end_time', 'duration', 'notes', 'status',
+                'created_at', 'updated_at'
+            ]
+        
+        def to_representation(self, instance):
+            representation = super().to_representation(instance)
+            if 'start_time' in representation:
+                time_obj = datetime.strptime(representation['start_time'], '%H:%M:%S').time()
+                representation['time'] = time_obj.strftime('%I:%M %p')
+            if 'end_time' in representation:
+                time_obj = datetime.strptime(representation['end_time'], '%H:%M:%S').time()
+                representation['endTime'] = time_obj.strftime('%I:%M %p')
+            return representation
+    
+    return LegacyAppointmentSerializer
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--appointments', type=int, default=10_000)
+    parser.add_argument('--patients', type=int, default=1_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', help='Write the results to this file')
+    args = parser.parse_args(argv)
+    
+    setup_django()
+    from clinic.models import Appointment
+    from clinic.serializers import AppointmentSerializer
+    from .seed import seed_clinic
+    
+    legacy = legacy_serializer_class()
+    report = {'appointments': args.appointments}
+    with test_database():
+        print(f"Seeding {args.appointments} appointments...", file=sys.stderr)
+        seed_clinic(random.Random(args.seed), patients=args.patients, appointments=args.appointments)
+        
+        def legacy_read():
+            return legacy(Appointment.objects.all(), many=True).data
+        
+        def current_read():
+            return AppointmentSerializer(AppointmentSerializer.optimize_queryset(Appointment.objects.all()), many=True).data
+        
+        assert [dict(row) for row in legacy_read()] == current_read()
+        
+        for name, read in (('legacy', legacy_read), ('current', current_read)):
+            report[name] = {'read_ms': round(median_ms(read, args.repeat), 1), 'queries': count_queries(read)}
+        
+        # Serialization alone, on instances that are already loaded
+        joined = list(AppointmentSerializer.optimize_queryset(Appointment.objects.all()))
+        report['legacy']['serialize_ms'] = round(median_ms(lambda: legacy(joined, many=True).data, args.repeat), 1)
+        report['current']['serialize_ms'] = round(
+            median_ms(lambda: AppointmentSerializer(joined, many=True).data, args.repeat), 1
+        )
+    
+    for name in ('legacy', 'current'):
+        result = report[name]
+        print(f"{name:>8}: read {result['read_ms']:>8} ms in {result['queries']:>5} queries, "
+              f"serialize only {result['serialize_ms']:>8} ms")
+    
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
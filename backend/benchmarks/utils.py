@@ -0,0 +1,71 @@
+import math
+import os
+import statistics
+import time
+from contextlib import contextmanager
+
+
+def setup_django():
+    """Configure Django with the project settings."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+    import django
+    django.setup()
+
+
+@contextmanager
+def test_database(verbosity=0):
+    """Create a throwaway test database for the duration of the block."""
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+    
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=verbosity, keepdb=False)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+        teardown_test_environment()
+
+
+def median_ms(func, repeat=5):
+    """Run ``func`` ``repeat`` times and return the median wall time in milliseconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def count_queries(func):
+    """Run ``func`` and return how many SQL statements it executed."""
+    from django.db import connection
+    
+    count = 0
+    
+    def counter(execute, sql, params, many, context):
+        nonlocal count
+        count += 1
+        return execute(sql, params, many, context)
+    
+    with connection.execute_wrapper(counter):
+        func()
+    return count
+
+
+def summarize_ms(samples):
+    """Mean, nearest-rank p50/p95/p99 and max of durations in seconds, as milliseconds."""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    
+    def rank(fraction):
+        return round(ordered[max(0, math.ceil(fraction * len(ordered)) - 1)] * 1000, 3)
+    
+    return {
+        'mean': round(statistics.fmean(ordered) * 1000, 3),
+        'p50': rank(0.5),
+        'p95': rank(0.95),
+        'p99': rank(0.99),
+        'max': round(ordered[-1] * 1000, 3),
+    }
@@ -0,0 +1,24 @@
+"""
+Async version of the billing dashboard endpoint, for ASGI deployments.
+"""
+from datetime import datetime
+
+from django.utils import timezone
+from rest_framework import status
+
+from backend.asyncapi import async_api_view, json_response
+from .stats import aget_stats
+
+
+@async_api_view
+async def invoice_stats(request):
+    """Dashboard figures for ``?period=YYYY-MM``, like ``InvoiceViewSet.stats``."""
+    period = request.GET.get('period')
+    try:
+        period = datetime.strptime(period, '%Y-%m').date() if period else timezone.localdate()
+    except ValueError:
+        return json_response(
+            {"error": "Invalid period. Use YYYY-MM"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    return json_response(await aget_stats(period))
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:02
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_amount_paid(apps, schema_editor):
+    Invoice = apps.get_model('billing', 'Invoice')
+    Payment = apps.get_model('billing', 'Payment')
+    completed = Payment.objects.filter(
+        invoice=OuterRef('pk'), status='COMPLETED'
+    ).values('invoice').annotate(total=Sum('amount')).values('total')
+    money = models.DecimalField(max_digits=10, decimal_places=2)
+    Invoice.objects.update(
+        amount_paid=Coalesce(Subquery(completed, output_field=money), Value(0, output_field=money))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0002_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='amount_paid',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.RunPython(backfill_amount_paid, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:04
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0003_invoice_amount_paid'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='invoice',
+            name='issue_date',
+            field=models.DateField(default=django.utils.timezone.localdate),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:06
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0004_invoice_issue_date_default'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(condition=models.Q(('status__in', ['PAID', 'CANCELLED', 'OVERDUE']), _negated=True), fields=['due_date'], name='billing_inv_overdue_due_idx'),
+        ),
+    ]
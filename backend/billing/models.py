@@ -1,7 +1,15 @@
-from django.db import models
+from decimal import Decimal
+from django.db import models, transaction
+from django.db.models import F
+from django.db.models.functions import Round
 from django.utils import timezone
 from django.conf import settings
 
+def total_expression(subtotal):
+    """SQL for an invoice's total given a ``subtotal`` expression, as calculate_total computes it."""
+    return Round(subtotal * (F('tax_rate') * Decimal('0.01') + 1) - F('discount'), 2)
+
+
 class Invoice(models.Model):
     INVOICE_STATUS = (
         ('DRAFT', 'Draft'),
@@ -14,7 +22,7 @@ class Invoice(models.Model):
     invoice_number = models.CharField(max_length=20, unique=True)
     patient = models.ForeignKey('Patient', on_delete=models.CASCADE, related_name='invoices')
     created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, related_name='created_invoices')
-    issue_date = models.DateField(default=timezone.now)
+    issue_date = models.DateField(default=timezone.localdate)
     due_date = models.DateField()
     notes = models.TextField(blank=True, null=True)
     status = models.CharField(max_length=10, choices=INVOICE_STATUS, default='DRAFT')
@@ -22,26 +30,124 @@ class Invoice(models.Model):
     tax_rate = models.DecimalField(max_digits=5, decimal_places=2, default=0)
     discount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     total = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    # Sum of completed payments, maintained by Payment.save/delete
+    amount_paid = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    # Invoices in these states never become overdue
+    OVERDUE_EXEMPT_STATUSES = ['PAID', 'CANCELLED']
+    
+    # Fields apply_ledger_deltas may change behind an in-memory instance
+    LEDGER_FIELDS = ['subtotal', 'total', 'amount_paid', 'status', 'updated_at']
+    # Derived from items and payments; once an invoice exists only SQL updates write them
+    DERIVED_FIELDS = ['subtotal', 'total', 'amount_paid']
+    
+    class Meta:
+        indexes = [
+            # InvoiceViewSet list ordering, optionally filtered by status
+            models.Index(fields=['-created_at'], name='billing_inv_created_idx'),
+            models.Index(fields=['status', '-created_at'], name='billing_inv_status_created_idx'),
+            # stats: invoices issued this month
+            models.Index(fields=['issue_date'], name='billing_inv_issue_date_idx'),
+            # sweep_overdue: only invoices that can still become overdue
+            models.Index(
+                fields=['due_date'],
+                condition=~models.Q(status__in=['PAID', 'CANCELLED', 'OVERDUE']),
+                name='billing_inv_overdue_due_idx',
+            ),
+        ]
+    
     def __str__(self):
         return f"Invoice {self.invoice_number} - {self.patient.full_name}"
     
     def save(self, *args, **kwargs):
-        # Calculate total
-        tax_amount = self.subtotal * (self.tax_rate / 100)
+        if self._state.adding:
+            self.calculate_total()
+            super().save(*args, **kwargs)
+            return
+        
+        # Writing the derived values read earlier would undo item and payment
+        # changes made since, so every other field is saved and total is
+        # recomputed from the stored subtotal
+        update_fields = kwargs.pop('update_fields', None)
+        if update_fields is None:
+            update_fields = [field.name for field in self._meta.concrete_fields if not field.primary_key]
+        update_fields = [name for name in update_fields if name not in self.DERIVED_FIELDS]
+        with transaction.atomic(savepoint=False):
+            super().save(*args, update_fields=update_fields, **kwargs)
+            if 'tax_rate' in update_fields or 'discount' in update_fields:
+                Invoice.objects.filter(pk=self.pk).update(total=total_expression(F('subtotal')))
+        self.refresh_from_db(fields=self.DERIVED_FIELDS)
+    
+    def calculate_total(self):
+        tax_amount = self.subtotal * (Decimal(self.tax_rate) / 100)
         self.total = self.subtotal + tax_amount - self.discount
-        super().save(*args, **kwargs)
     
     def mark_as_paid(self):
         self.status = 'PAID'
-        self.save()
+        self.save(update_fields=['status', 'updated_at'])
     
     def mark_as_overdue(self):
-        if self.status != 'PAID' and timezone.now().date() > self.due_date:
+        if self.status not in self.OVERDUE_EXEMPT_STATUSES and timezone.now().date() > self.due_date:
             self.status = 'OVERDUE'
-            self.save()
+            self.save(update_fields=['status', 'updated_at'])
+    
+    @classmethod
+    def overdue_candidates(cls, today=None):
+        """Invoices past their due date that aren't settled or already overdue."""
+        today = today or timezone.localdate()
+        return cls.objects.exclude(
+            status__in=cls.OVERDUE_EXEMPT_STATUSES + ['OVERDUE']
+        ).filter(due_date__lt=today)
+    
+    @classmethod
+    def sweep_overdue(cls, today=None):
+        """Mark every eligible invoice as overdue with a single UPDATE and return how many changed."""
+        return cls.overdue_candidates(today).update(status='OVERDUE', updated_at=timezone.now())
+    
+    @classmethod
+    def apply_ledger_deltas(cls, invoice_id, subtotal=0, amount_paid=None):
+        """
+        Shift an invoice's subtotal and amount paid with atomic UPDATEs.
+        
+        Concurrent item and payment writes each add their own delta, so none of
+        them can overwrite another's. Passing ``amount_paid`` (a payment changed)
+        also marks the invoice as paid once the amount paid covers the total.
+        """
+        now = timezone.now()
+        with transaction.atomic(savepoint=False):
+            if subtotal:
+                cls.objects.filter(pk=invoice_id).update(
+                    # total comes first so it's computed from the old subtotal even on
+                    # backends that apply SET clauses left to right
+                    total=total_expression(F('subtotal') + subtotal),
+                    subtotal=F('subtotal') + subtotal,
+                    updated_at=now,
+                )
+            if amount_paid is not None:
+                if amount_paid:
+                    cls.objects.filter(pk=invoice_id).update(
+                        amount_paid=F('amount_paid') + amount_paid, updated_at=now
+                    )
+                cls.objects.filter(
+                    pk=invoice_id, amount_paid__gte=F('total')
+                ).exclude(status='PAID').update(status='PAID', updated_at=now)
+    
+    def add_items(self, items):
+        """
+        Create unsaved InvoiceItems for this invoice with one INSERT and update
+        the subtotal and total once.
+        """
+        for item in items:
+            item.invoice = self
+            item.total_price = item.quantity * item.unit_price
+        
+        with transaction.atomic(savepoint=False):
+            created = InvoiceItem.objects.bulk_create(items)
+            self.apply_ledger_deltas(self.pk, subtotal=sum(item.total_price for item in items))
+        self.refresh_from_db(fields=self.LEDGER_FIELDS)
+        return created
 
 
 class InvoiceItem(models.Model):
@@ -54,13 +160,32 @@ class InvoiceItem(models.Model):
     
     def save(self, *args, **kwargs):
         self.total_price = self.quantity * self.unit_price
-        super().save(*args, **kwargs)
         
-        # Update invoice subtotal
-        invoice_items = self.invoice.items.all()
-        subtotal = sum(item.total_price for item in invoice_items)
-        self.invoice.subtotal = subtotal
-        self.invoice.save()
+        with transaction.atomic(savepoint=False):
+            previous = InvoiceItem.objects.select_for_update().filter(
+                pk=self.pk
+            ).values_list('invoice_id', 'total_price').first() if self.pk else None
+            super().save(*args, **kwargs)
+            
+            # Move the invoice subtotal by this item's change instead of re-summing every item
+            if previous and previous[0] != self.invoice_id:
+                Invoice.apply_ledger_deltas(previous[0], subtotal=-previous[1])
+                previous = None
+            delta = self.total_price - (previous[1] if previous else 0)
+            Invoice.apply_ledger_deltas(self.invoice_id, subtotal=delta)
+        refresh_cached_invoice(self)
+    
+    def delete(self, *args, **kwargs):
+        with transaction.atomic(savepoint=False):
+            # Reverse the stored row, which a concurrent save may have changed since this one was read
+            stored = InvoiceItem.objects.select_for_update().filter(
+                pk=self.pk
+            ).values_list('invoice_id', 'total_price').first()
+            result = super().delete(*args, **kwargs)
+            if stored:
+                Invoice.apply_ledger_deltas(stored[0], subtotal=-stored[1])
+        refresh_cached_invoice(self)
+        return result
     
     def __str__(self):
         return f"{self.description} - {self.invoice.invoice_number}"
@@ -91,18 +216,58 @@ class Payment(models.Model):
     notes = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    class Meta:
+        indexes = [
+            # PaymentViewSet list ordering
+            models.Index(fields=['-created_at'], name='billing_pay_created_idx'),
+            # stats: completed payments this month
+            models.Index(fields=['status', 'payment_date'], name='billing_pay_status_date_idx'),
+        ]
+    
     def __str__(self):
         return f"Payment of {self.amount} for {self.invoice.invoice_number}"
     
+    def paid_amount(self):
+        """Amount this payment contributes to its invoice's amount paid."""
+        return self.amount if self.status == 'COMPLETED' else 0
+    
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        
-        # Check if invoice is fully paid
-        invoice = self.invoice
-        total_paid = sum(payment.amount for payment in invoice.payments.filter(status='COMPLETED'))
-        
-        if total_paid >= invoice.total:
-            invoice.mark_as_paid()
+        with transaction.atomic(savepoint=False):
+            previous = Payment.objects.select_for_update().filter(
+                pk=self.pk
+            ).values_list('invoice_id', 'amount', 'status').first() if self.pk else None
+            super().save(*args, **kwargs)
+            
+            # Move the invoice's amount paid by this payment's change; this also
+            # marks the invoice as paid once it is fully covered
+            previous_paid = 0
+            if previous:
+                invoice_id, amount, status = previous
+                previous_paid = amount if status == 'COMPLETED' else 0
+                if invoice_id != self.invoice_id:
+                    Invoice.apply_ledger_deltas(invoice_id, amount_paid=-previous_paid)
+                    previous_paid = 0
+            Invoice.apply_ledger_deltas(self.invoice_id, amount_paid=self.paid_amount() - previous_paid)
+        refresh_cached_invoice(self)
+    
+    def delete(self, *args, **kwargs):
+        with transaction.atomic(savepoint=False):
+            # Reverse the stored row, which a concurrent save may have changed since this one was read
+            stored = Payment.objects.select_for_update().filter(
+                pk=self.pk
+            ).values_list('invoice_id', 'amount', 'status').first()
+            result = super().delete(*args, **kwargs)
+            if stored:
+                invoice_id, amount, status = stored
+                Invoice.apply_ledger_deltas(invoice_id, amount_paid=-(amount if status == 'COMPLETED' else 0))
+        refresh_cached_invoice(self)
+        return result
+
+
+def refresh_cached_invoice(obj):
+    """Reload the ledger fields of ``obj.invoice`` if it was already loaded, so it isn't left stale."""
+    if obj._meta.get_field('invoice').is_cached(obj):
+        obj.invoice.refresh_from_db(fields=Invoice.LEDGER_FIELDS)
 
 
 class InsuranceClaim(models.Model):
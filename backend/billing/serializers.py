@@ -1,6 +1,10 @@
 from rest_framework import serializers
+from django.db import transaction
 from .models import Invoice, InvoiceItem, Payment, InsuranceClaim, InsuranceProvider, DentalService
 
+# Most invoices accepted by one bulk create request
+MAX_BULK_INVOICES = 500
+
 
 class DentalServiceSerializer(serializers.ModelSerializer):
     class Meta:
@@ -18,6 +22,12 @@ class InvoiceItemSerializer(serializers.ModelSerializer):
         read_only_fields = ['total_price']
 
 
+class InvoiceLineSerializer(InvoiceItemSerializer):
+    """Invoice item nested in an invoice; the invoice comes from the parent."""
+    class Meta(InvoiceItemSerializer.Meta):
+        read_only_fields = ['invoice', 'total_price']
+
+
 class PaymentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Payment
@@ -42,13 +52,46 @@ class InsuranceClaimSerializer(serializers.ModelSerializer):
         read_only_fields = ['created_at', 'updated_at']
 
 
+class InvoiceListSerializer(serializers.ListSerializer):
+    """Creates a batch of invoices and all their items with one INSERT each."""
+    
+    def validate(self, attrs):
+        if len(attrs) > MAX_BULK_INVOICES:
+            raise serializers.ValidationError(f"At most {MAX_BULK_INVOICES} invoices can be created at once.")
+        numbers = [invoice['invoice_number'] for invoice in attrs]
+        if len(set(numbers)) != len(numbers):
+            raise serializers.ValidationError("Invoice numbers must be unique within the batch.")
+        return attrs
+    
+    def create(self, validated_data):
+        invoices = []
+        items = []
+        for data in validated_data:
+            lines = [InvoiceItem(**line) for line in data.pop('items', [])]
+            invoice = Invoice(**data)
+            for line in lines:
+                line.total_price = line.quantity * line.unit_price
+            # bulk_create skips save(), so compute the totals here, once per invoice
+            invoice.subtotal = sum(line.total_price for line in lines)
+            invoice.calculate_total()
+            invoices.append(invoice)
+            items.append(lines)
+        
+        with transaction.atomic():
+            Invoice.objects.bulk_create(invoices)
+            for invoice, lines in zip(invoices, items):
+                for line in lines:
+                    line.invoice = invoice
+            InvoiceItem.objects.bulk_create([line for lines in items for line in lines])
+        return invoices
+
+
 class InvoiceSerializer(serializers.ModelSerializer):
-    items = InvoiceItemSerializer(many=True, read_only=True)
+    items = InvoiceLineSerializer(many=True, required=False)
     payments = PaymentSerializer(many=True, read_only=True)
     insurance_claims = InsuranceClaimSerializer(many=True, read_only=True)
     patient_name = serializers.CharField(source='patient.full_name', read_only=True)
     created_by_name = serializers.CharField(source='created_by.get_full_name', read_only=True)
-    amount_paid = serializers.SerializerMethodField()
     balance_due = serializers.SerializerMethodField()
     
     class Meta:
@@ -57,11 +100,26 @@ class InvoiceSerializer(serializers.ModelSerializer):
                   'created_by_name', 'issue_date', 'due_date', 'notes', 'status', 
                   'subtotal', 'tax_rate', 'discount', 'total', 'items', 'payments',
                   'insurance_claims', 'amount_paid', 'balance_due', 'created_at', 'updated_at']
-        read_only_fields = ['subtotal', 'total', 'created_at', 'updated_at']
+        read_only_fields = ['subtotal', 'total', 'amount_paid', 'created_at', 'updated_at']
+        list_serializer_class = InvoiceListSerializer
+    
+    def create(self, validated_data):
+        items = validated_data.pop('items', [])
+        with transaction.atomic():
+            invoice = super().create(validated_data)
+            invoice.add_items([InvoiceItem(**item) for item in items])
+        return invoice
     
-    def get_amount_paid(self, obj):
-        return sum(payment.amount for payment in obj.payments.filter(status='COMPLETED'))
+    def update(self, instance, validated_data):
+        if 'items' in validated_data:
+            raise serializers.ValidationError(
+                {'items': "Items of an existing invoice are changed through /invoice-items/."}
+            )
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        # Only the fields sent are written, so concurrent item and payment changes are kept
+        instance.save(update_fields=[*validated_data, 'updated_at'])
+        return instance
     
     def get_balance_due(self, obj):
-        amount_paid = self.get_amount_paid(obj)
-        return obj.total - amount_paid
\ No newline at end of file
+        return obj.total - obj.amount_paid
@@ -0,0 +1,20 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from backend.caching import invalidate_model
+from .models import Invoice, InvoiceItem, Payment, InsuranceProvider, DentalService
+from .stats import invalidate_stats
+
+
+@receiver([post_save, post_delete], sender=Invoice)
+@receiver([post_save, post_delete], sender=InvoiceItem)
+@receiver([post_save, post_delete], sender=Payment)
+def invalidate_billing_stats(sender, **kwargs):
+    # After commit, so a concurrent read can't cache figures from before the change
+    transaction.on_commit(invalidate_stats)
+
+
+@receiver([post_save, post_delete], sender=InsuranceProvider)
+@receiver([post_save, post_delete], sender=DentalService)
+def invalidate_reference_cache(sender, **kwargs):
+    invalidate_model(sender)
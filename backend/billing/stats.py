@@ -0,0 +1,119 @@
+"""
+Billing dashboard figures, computed with two conditional-aggregate queries and
+cached per period. ``aget_stats`` is the async variant for the ASGI views.
+
+Cached entries are keyed on a version number that ``invalidate_stats`` bumps,
+so one call drops every cached period at once. Signal handlers in
+``billing.signals`` call it once an invoice, item or payment change commits.
+"""
+import asyncio
+from datetime import date
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+from .models import Invoice, Payment
+
+STATS_CACHE_TIMEOUT = 300
+STATS_VERSION_KEY = 'billing:stats:version'
+OUTSTANDING_STATUSES = ['SENT', 'OVERDUE']
+
+
+def month_bounds(period):
+    """Return the first day of the ``YYYY-MM`` period and the first day of the next month."""
+    start = date(period.year, period.month, 1)
+    if start.month == 12:
+        return start, date(start.year + 1, 1, 1)
+    return start, date(start.year, start.month + 1, 1)
+
+
+def stats_aggregates(start, end):
+    """
+    Return the two independent aggregates behind the stats as ``(queryset, aggregates)`` pairs.
+    
+    Payments are totalled for the month; invoices are counted for the month and
+    summed over everything still outstanding.
+    """
+    payments = Payment.objects.filter(
+        status='COMPLETED',
+        payment_date__gte=start,
+        payment_date__lt=end
+    )
+    
+    issued = Q(issue_date__gte=start, issue_date__lt=end)
+    outstanding = Q(status__in=OUTSTANDING_STATUSES)
+    invoices = Invoice.objects.filter(issued | outstanding)
+    
+    return [
+        (payments, {'total': Sum('amount'), 'count': Count('id')}),
+        (invoices, {
+            'monthly': Count('id', filter=issued),
+            'outstanding_amount': Sum('total', filter=outstanding),
+            'outstanding_count': Count('id', filter=outstanding),
+        }),
+    ]
+
+
+def build_stats(start, payments, invoices):
+    return {
+        'period': start.strftime('%Y-%m'),
+        'total_revenue': payments['total'] or 0,
+        'monthly_invoices': invoices['monthly'],
+        'monthly_payments': payments['count'],
+        'outstanding_amount': invoices['outstanding_amount'] or 0,
+        'outstanding_count': invoices['outstanding_count'],
+    }
+
+
+def compute_stats(period):
+    """Compute the dashboard figures for the month containing ``period``."""
+    start, end = month_bounds(period)
+    payments, invoices = [
+        queryset.aggregate(**aggregates) for queryset, aggregates in stats_aggregates(start, end)
+    ]
+    return build_stats(start, payments, invoices)
+
+
+async def acompute_stats(period):
+    """
+    Async ``compute_stats``, awaiting the two aggregates together.
+    
+    Django still runs a request's sync ORM calls on one thread, so today the
+    queries go out back to back; gathering them lets them overlap as soon as
+    the database layer can.
+    """
+    start, end = month_bounds(period)
+    payments, invoices = await asyncio.gather(*(
+        queryset.aaggregate(**aggregates) for queryset, aggregates in stats_aggregates(start, end)
+    ))
+    return build_stats(start, payments, invoices)
+
+
+def stats_key(version, period):
+    return f"billing:stats:{version}:{period.strftime('%Y-%m')}"
+
+
+def get_stats(period):
+    """Return the cached stats for the month containing ``period``, computing them on a miss."""
+    key = stats_key(cache.get_or_set(STATS_VERSION_KEY, 1, None), period)
+    stats = cache.get(key)
+    if stats is None:
+        stats = compute_stats(period)
+        cache.set(key, stats, STATS_CACHE_TIMEOUT)
+    return stats
+
+
+async def aget_stats(period):
+    """Async ``get_stats``, sharing its cache entries."""
+    key = stats_key(await cache.aget_or_set(STATS_VERSION_KEY, 1, None), period)
+    stats = await cache.aget(key)
+    if stats is None:
+        stats = await acompute_stats(period)
+        await cache.aset(key, stats, STATS_CACHE_TIMEOUT)
+    return stats
+
+
+def invalidate_stats():
+    """Drop every cached period."""
+    try:
+        cache.incr(STATS_VERSION_KEY)
+    except ValueError:
+        cache.set(STATS_VERSION_KEY, 1, None)
@@ -1,3 +1,423 @@
+from datetime import date, timedelta
+import csv
+import json
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.core.management import call_command
+from django.db import OperationalError, connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from accounts.models import User
+from .models import (
+    Patient, Invoice, InvoiceItem, Payment, InsuranceClaim, InsuranceProvider, DentalService
+)
+from .serializers import InvoiceSerializer
+from .stats import invalidate_stats
+from .views import PaymentViewSet
+
+
+class InvoiceListQueryCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='frontdesk', email='desk@example.com', password='x')
+        cls.patient = Patient.objects.create(
+            first_name='Jane', last_name='Doe', date_of_birth=date(1990, 1, 1), phone='5550000000'
+        )
+        cls.service = DentalService.objects.create(
+            name='Cleaning', code='D1110', description='Prophylaxis', default_price=Decimal('80.00')
+        )
+        cls.provider = InsuranceProvider.objects.create(name='Acme Dental')
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+    
+    def create_invoices(self, count):
+        for i in range(count):
+            invoice = Invoice.objects.create(
+                invoice_number=f"INV-{Invoice.objects.count():05d}",
+                patient=self.patient,
+                created_by=self.user,
+                due_date=date.today() + timedelta(days=30),
+                tax_rate=Decimal('0.00'),
+            )
+            for _ in range(3):
+                InvoiceItem.objects.create(
+                    invoice=invoice, service=self.service, description='Cleaning',
+                    quantity=1, unit_price=Decimal('80.00')
+                )
+            Payment.objects.create(invoice=invoice, amount=Decimal('100.00'), status='COMPLETED')
+            Payment.objects.create(invoice=invoice, amount=Decimal('50.00'), status='PENDING')
+            InsuranceClaim.objects.create(
+                invoice=invoice, insurance_provider=self.provider, amount_claimed=Decimal('40.00')
+            )
+    
+    def list_query_count(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('invoice-list'))
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response.json()
+    
+    def test_query_count_is_constant_per_page(self):
+        self.create_invoices(2)
+        small_page_queries, small_page = self.list_query_count()
+        self.assertEqual(len(small_page['results']), 2)
+        
+        self.create_invoices(8)
+        full_page_queries, full_page = self.list_query_count()
+        self.assertEqual(len(full_page['results']), 10)
+        
+        self.assertEqual(small_page_queries, full_page_queries)
+    
+    def test_cursor_pages_follow_requested_ordering(self):
+        self.create_invoices(5)
+        seen = []
+        url = reverse('invoice-list') + '?page_size=2&ordering=-total'
+        while url:
+            page = self.client.get(url).json()
+            seen.extend(invoice['id'] for invoice in page['results'])
+            url = page['next']
+        # Every invoice has the same total, so the id tie-breaker decides
+        self.assertEqual(seen, sorted(Invoice.objects.values_list('id', flat=True)))
+    
+    def test_amount_paid_and_balance_due(self):
+        self.create_invoices(1)
+        _, page = self.list_query_count()
+        invoice = page['results'][0]
+        self.assertEqual(Decimal(str(invoice['amount_paid'])), Decimal('100.00'))
+        self.assertEqual(Decimal(str(invoice['balance_due'])), Decimal(invoice['total']) - Decimal('100.00'))
+
+
+class InvoiceLedgerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient = Patient.objects.create(
+            first_name='Jane', last_name='Doe', date_of_birth=date(1990, 1, 1), phone='5550000000'
+        )
+    
+    def setUp(self):
+        self.invoice = Invoice.objects.create(
+            invoice_number='INV-1', patient=self.patient,
+            due_date=date.today() + timedelta(days=30), tax_rate=Decimal('10.00'),
+        )
+    
+    def assertLedger(self, subtotal, total, amount_paid):
+        self.invoice.refresh_from_db()
+        self.assertEqual(self.invoice.subtotal, Decimal(subtotal))
+        self.assertEqual(self.invoice.total, Decimal(total))
+        self.assertEqual(self.invoice.amount_paid, Decimal(amount_paid))
+    
+    def test_item_save_and_delete_adjust_subtotal(self):
+        item = InvoiceItem.objects.create(invoice=self.invoice, description='Exam', quantity=2, unit_price=Decimal('50.00'))
+        InvoiceItem.objects.create(invoice=self.invoice, description='X-ray', quantity=1, unit_price=Decimal('30.00'))
+        self.assertLedger('130.00', '143.00', '0.00')
+        
+        item.quantity = 1
+        item.save()
+        self.assertLedger('80.00', '88.00', '0.00')
+        
+        item.delete()
+        self.assertLedger('30.00', '33.00', '0.00')
+    
+    def test_add_items_updates_totals_once(self):
+        with self.assertNumQueries(3):
+            self.invoice.add_items([
+                InvoiceItem(description=f'Line {i}', quantity=1, unit_price=Decimal('10.00'))
+                for i in range(30)
+            ])
+        self.assertEqual(self.invoice.items.count(), 30)
+        self.assertLedger('300.00', '330.00', '0.00')
+    
+    def test_payment_status_changes_adjust_amount_paid(self):
+        InvoiceItem.objects.create(invoice=self.invoice, description='Exam', quantity=1, unit_price=Decimal('100.00'))
+        payment = Payment.objects.create(invoice=self.invoice, amount=Decimal('60.00'))
+        self.assertLedger('100.00', '110.00', '0.00')
+        
+        payment.status = 'COMPLETED'
+        payment.save()
+        self.assertLedger('100.00', '110.00', '60.00')
+        self.assertEqual(self.invoice.status, 'DRAFT')
+        
+        Payment.objects.create(invoice=self.invoice, amount=Decimal('50.00'), status='COMPLETED')
+        self.assertLedger('100.00', '110.00', '110.00')
+        self.assertEqual(self.invoice.status, 'PAID')
+        
+        payment.delete()
+        self.assertLedger('100.00', '110.00', '50.00')
+    
+    def test_invoice_updates_keep_concurrent_ledger_changes(self):
+        InvoiceItem.objects.create(invoice=self.invoice, description='Exam', quantity=1, unit_price=Decimal('100.00'))
+        stale = Invoice.objects.get(pk=self.invoice.pk)
+        # A payment and an item land between reading the invoice and saving it
+        Payment.objects.create(invoice=self.invoice, amount=Decimal('40.00'), status='COMPLETED')
+        InvoiceItem.objects.create(invoice=self.invoice, description='X-ray', quantity=1, unit_price=Decimal('50.00'))
+        
+        serializer = InvoiceSerializer(stale, data={'notes': 'Call first', 'discount': '5.00'}, partial=True)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        serializer.save()
+        self.assertLedger('150.00', '160.00', '40.00')
+        self.assertEqual(self.invoice.notes, 'Call first')
+        self.assertEqual(serializer.data['total'], '160.00')
+        
+        stale.notes = 'Saved in full'
+        Payment.objects.create(invoice=self.invoice, amount=Decimal('20.00'), status='COMPLETED')
+        stale.save()
+        self.assertLedger('150.00', '160.00', '60.00')
+        self.assertEqual(self.invoice.notes, 'Saved in full')
+    
+    def test_plain_save_persists_status(self):
+        self.invoice.status = 'CANCELLED'
+        self.invoice.save()
+        self.assertEqual(self.invoice.status, 'CANCELLED')
+        self.assertEqual(Invoice.objects.get(pk=self.invoice.pk).status, 'CANCELLED')
+    
+    def test_deletes_reverse_the_stored_rows(self):
+        item = InvoiceItem.objects.create(invoice=self.invoice, description='Exam', quantity=1, unit_price=Decimal('100.00'))
+        payment = Payment.objects.create(invoice=self.invoice, amount=Decimal('30.00'))
+        stale_item = InvoiceItem.objects.get(pk=item.pk)
+        stale_payment = Payment.objects.get(pk=payment.pk)
+        # Both rows change after the copies being deleted were read
+        item.quantity = 2
+        item.save()
+        payment.status = 'COMPLETED'
+        payment.save()
+        self.assertLedger('200.00', '220.00', '30.00')
+        
+        stale_item.delete()
+        stale_payment.delete()
+        self.assertLedger('0.00', '0.00', '0.00')
+
+
+class InvoiceCreateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='frontdesk', email='desk@example.com', password='x')
+        cls.patient = Patient.objects.create(
+            first_name='Jane', last_name='Doe', date_of_birth=date(1990, 1, 1), phone='5550000000'
+        )
+        cls.service = DentalService.objects.create(
+            name='Cleaning', code='D1110', description='Prophylaxis', default_price=Decimal('80.00')
+        )
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+    
+    def invoice_payload(self, number, lines=2):
+        return {
+            'invoice_number': number,
+            'patient': self.patient.id,
+            'due_date': (date.today() + timedelta(days=30)).isoformat(),
+            'tax_rate': '10.00',
+            'items': [
+                {'service': self.service.id, 'description': 'Cleaning', 'quantity': 2, 'unit_price': '80.00'}
+                for _ in range(lines)
+            ],
+        }
+    
+    def test_create_with_nested_items(self):
+        response = self.client.post(reverse('invoice-list'), self.invoice_payload('INV-1'), format='json')
+        self.assertEqual(response.status_code, 201)
+        invoice = Invoice.objects.get(invoice_number='INV-1')
+        self.assertEqual(invoice.items.count(), 2)
+        self.assertEqual(invoice.subtotal, Decimal('320.00'))
+        self.assertEqual(invoice.total, Decimal('352.00'))
+    
+    def test_bulk_create(self):
+        payload = [self.invoice_payload(f'INV-{i}', lines=3) for i in range(5)]
+        response = self.client.post(reverse('invoice-bulk'), payload, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.json()), 5)
+        self.assertEqual(InvoiceItem.objects.count(), 15)
+        for invoice in Invoice.objects.all():
+            self.assertEqual(invoice.subtotal, Decimal('480.00'))
+            self.assertEqual(invoice.total, Decimal('528.00'))
+    
+    def test_bulk_create_is_atomic(self):
+        payload = [self.invoice_payload('INV-1'), self.invoice_payload('INV-1')]
+        response = self.client.post(reverse('invoice-bulk'), payload, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Invoice.objects.exists())
+
+
+class InvoiceStatsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='frontdesk', email='desk@example.com', password='x')
+        cls.patient = Patient.objects.create(
+            first_name='Jane', last_name='Doe', date_of_birth=date(1990, 1, 1), phone='5550000000'
+        )
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        # Writes in a test never commit, so start from an empty cache
+        invalidate_stats()
+    
+    def create_invoice(self, number, issue_date, status, total):
+        invoice = Invoice.objects.create(
+            invoice_number=number, patient=self.patient, issue_date=issue_date,
+            due_date=issue_date + timedelta(days=30), status=status, tax_rate=Decimal('0.00'),
+        )
+        InvoiceItem.objects.create(invoice=invoice, description='Exam', quantity=1, unit_price=Decimal(total))
+        return invoice
+    
+    def test_stats_for_period_are_cached_and_invalidated(self):
+        march = self.create_invoice('INV-1', date(2025, 3, 5), 'SENT', '100.00')
+        self.create_invoice('INV-2', date(2025, 4, 5), 'OVERDUE', '50.00')
+        Payment.objects.create(invoice=march, amount=Decimal('40.00'), status='COMPLETED', payment_date=date(2025, 3, 20))
+        
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('invoice-stats'), {'period': '2025-03'})
+        stats = response.json()
+        self.assertEqual(stats['period'], '2025-03')
+        self.assertEqual(stats['monthly_invoices'], 1)
+        self.assertEqual(stats['monthly_payments'], 1)
+        self.assertEqual(Decimal(str(stats['total_revenue'])), Decimal('40.00'))
+        self.assertEqual(stats['outstanding_count'], 2)
+        self.assertEqual(Decimal(str(stats['outstanding_amount'])), Decimal('150.00'))
+        
+        with self.assertNumQueries(0):
+            self.client.get(reverse('invoice-stats'), {'period': '2025-03'})
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            Payment.objects.create(invoice=march, amount=Decimal('10.00'), status='COMPLETED', payment_date=date(2025, 3, 21))
+            # Still cached until the transaction commits
+            stats = self.client.get(reverse('invoice-stats'), {'period': '2025-03'}).json()
+            self.assertEqual(stats['monthly_payments'], 1)
+        stats = self.client.get(reverse('invoice-stats'), {'period': '2025-03'}).json()
+        self.assertEqual(stats['monthly_payments'], 2)
+    
+    def test_invalid_period(self):
+        response = self.client.get(reverse('invoice-stats'), {'period': '2025-13'})
+        self.assertEqual(response.status_code, 400)
+    
+    async def test_async_stats_match_and_share_the_cache(self):
+        march = await sync_to_async(self.create_invoice)('INV-1', date(2025, 3, 5), 'SENT', '100.00')
+        await Payment.objects.acreate(
+            invoice=march, amount=Decimal('40.00'), status='COMPLETED', payment_date=date(2025, 3, 20)
+        )
+        headers = {'Authorization': f'Bearer {RefreshToken.for_user(self.user).access_token}'}
+        
+        response = await self.async_client.get(reverse('async-invoice-stats'), {'period': '2025-03'}, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        expected = await sync_to_async(self.client.get)(reverse('invoice-stats'), {'period': '2025-03'})
+        self.assertEqual(response.json(), expected.json())
+        
+        bad = await self.async_client.get(reverse('async-invoice-stats'), {'period': '2025-13'}, headers=headers)
+        self.assertEqual(bad.status_code, 400)
+
+
+class MarkOverdueInvoicesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient = Patient.objects.create(
+            first_name='Jane', last_name='Doe', date_of_birth=date(1990, 1, 1), phone='5550000000'
+        )
+        for number, status, due_date in [
+            ('INV-1', 'SENT', date(2025, 3, 1)),
+            ('INV-2', 'DRAFT', date(2025, 3, 1)),
+            ('INV-3', 'PAID', date(2025, 3, 1)),
+            ('INV-4', 'CANCELLED', date(2025, 3, 1)),
+            ('INV-5', 'SENT', date(2025, 4, 1)),
+        ]:
+            Invoice.objects.create(invoice_number=number, patient=cls.patient, status=status, due_date=due_date)
+    
+    def overdue_numbers(self):
+        return set(Invoice.objects.filter(status='OVERDUE').values_list('invoice_number', flat=True))
+    
+    def test_dry_run_changes_nothing(self):
+        out = StringIO()
+        call_command('mark_overdue_invoices', '--dry-run', '--date', '2025-03-15', stdout=out)
+        self.assertIn('Would mark 2 invoice(s)', out.getvalue())
+        self.assertEqual(self.overdue_numbers(), set())
+    
+    def test_sweep_marks_eligible_invoices(self):
+        out = StringIO()
+        call_command('mark_overdue_invoices', '--date', '2025-03-15', stdout=out)
+        self.assertIn('Marked 2 invoice(s)', out.getvalue())
+        self.assertEqual(self.overdue_numbers(), {'INV-1', 'INV-2'})
+        
+        call_command('mark_overdue_invoices', '--date', '2025-03-15', stdout=out)
+        self.assertIn('Marked 0 invoice(s)', out.getvalue())
+    
+    def test_interval_loop_survives_database_errors(self):
+        command = 'billing.management.commands.mark_overdue_invoices'
+        out, err = StringIO(), StringIO()
+        with mock.patch(f'{command}.close_old_connections') as close_old_connections, \
+                mock.patch(f'{command}.time.sleep', side_effect=[None, None, KeyboardInterrupt]), \
+                mock.patch.object(Invoice, 'sweep_overdue', side_effect=[OperationalError('database is locked'), 2, 0]):
+            with self.assertRaises(KeyboardInterrupt):
+                call_command('mark_overdue_invoices', '--interval', '60', stdout=out, stderr=err)
+        self.assertEqual(close_old_connections.call_count, 3)
+        self.assertIn('Sweep failed, retrying in 60 s: database is locked', err.getvalue())
+        self.assertIn('Marked 2 invoice(s)', out.getvalue())
+        self.assertIn('Marked 0 invoice(s)', out.getvalue())
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='frontdesk', email='desk@example.com', password='x')
+        patient = Patient.objects.create(
+            first_name='Jane', last_name='Doe', date_of_birth=date(1990, 1, 1), phone='5550000000'
+        )
+        cls.invoice = Invoice.objects.create(
+            invoice_number='INV-00001', patient=patient, due_date=date(2025, 2, 1), subtotal=Decimal('200.00')
+        )
+        for amount, payment_status in [('50.00', 'COMPLETED'), ('25.00', 'PENDING'), ('10.00', 'COMPLETED')]:
+            Payment.objects.create(invoice=cls.invoice, amount=Decimal(amount), status=payment_status)
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+    
+    def export(self, name, export_format, **filters):
+        response = self.client.get(reverse(name, kwargs={'export_format': export_format}), filters)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+    
+    def test_csv_honours_filters(self):
+        rows = list(csv.DictReader(StringIO(self.export('payment-export', 'csv', status='COMPLETED'))))
+        self.assertEqual(sorted(row['amount'] for row in rows), ['10.00', '50.00'])
+        self.assertEqual({row['invoice__invoice_number'] for row in rows}, {'INV-00001'})
+    
+    def test_ndjson(self):
+        rows = [json.loads(line) for line in self.export('invoice-export', 'ndjson').splitlines()]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['patient__last_name'], 'Doe')
+        self.assertEqual(rows[0]['amount_paid'], '60.00')
+    
+    def test_empty_csv_has_header(self):
+        content = self.export('payment-export', 'csv', status='REFUNDED')
+        self.assertEqual(content.splitlines(), [','.join(PaymentViewSet.export_fields)])
+
 
-# Create your tests here.
+class ReferenceCacheTests(TestCase):
+    def test_service_list_revalidates(self):
+        user = User.objects.create_user(username='frontdesk', email='desk@example.com', password='x')
+        client = APIClient()
+        client.force_authenticate(user)
+        with self.captureOnCommitCallbacks(execute=True):
+            service = DentalService.objects.create(
+                name='Cleaning', code='D1110', description='Prophylaxis', default_price=Decimal('80.00')
+            )
+        
+        etag = client.get(reverse('dentalservice-list'))['ETag']
+        self.assertEqual(client.get(reverse('dentalservice-list'), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        
+        # Retiring a service changes the list, so the old ETag no longer matches
+        with self.captureOnCommitCallbacks(execute=True):
+            service.is_active = False
+            service.save()
+        response = client.get(reverse('dentalservice-list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'], [])
@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from . import views
+from . import views, async_views
 
 router = DefaultRouter()
 router.register(r'invoices', views.InvoiceViewSet)
@@ -12,4 +12,9 @@ router.register(r'dental-services', views.DentalServiceViewSet)
 
 urlpatterns = [
     path('', include(router.urls)),
-]
\ No newline at end of file
+]
+
+# Mounted at api/async/billing/ by backend/urls.py
+async_urlpatterns = [
+    path('invoices/stats/', async_views.invoice_stats, name='async-invoice-stats'),
+]
@@ -1,23 +1,61 @@
 from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from datetime import datetime
 from django.utils import timezone
-from django.db.models import Sum, Count
+from django.db import transaction
+from django.db.models import Prefetch
 from django_filters.rest_framework import DjangoFilterBackend
+from backend.caching import CachedReadMixin
+from backend.export import stream_export
+from backend.pagination import CreatedDescPagination
 from .models import Invoice, InvoiceItem, Payment, InsuranceClaim, InsuranceProvider, DentalService
 from .serializers import (
     InvoiceSerializer, InvoiceItemSerializer, PaymentSerializer,
     InsuranceClaimSerializer, InsuranceProviderSerializer, DentalServiceSerializer
 )
+from .stats import get_stats, invalidate_stats
 
 
 class InvoiceViewSet(viewsets.ModelViewSet):
-    queryset = Invoice.objects.all().order_by('-created_at')
+    # Everything InvoiceSerializer reads is joined or prefetched up front,
+    # so a page costs the same number of queries whatever its size
+    queryset = Invoice.objects.select_related(
+        'patient', 'created_by'
+    ).prefetch_related(
+        Prefetch('items', queryset=InvoiceItem.objects.select_related('service')),
+        'payments',
+        Prefetch('insurance_claims', queryset=InsuranceClaim.objects.select_related('insurance_provider')),
+    ).order_by('-created_at')
     serializer_class = InvoiceSerializer
+    pagination_class = CreatedDescPagination
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['status', 'patient', 'issue_date']
     search_fields = ['invoice_number', 'patient__first_name', 'patient__last_name']
     ordering_fields = ['issue_date', 'due_date', 'total', 'status']
+    export_fields = [
+        'id', 'invoice_number', 'patient_id', 'patient__first_name', 'patient__last_name',
+        'issue_date', 'due_date', 'status', 'subtotal', 'tax_rate', 'discount', 'total',
+        'amount_paid', 'created_at',
+    ]
+    
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """Create a list of invoices, each with its nested items, in one transaction."""
+        serializer = self.get_serializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        invoices = serializer.save()
+        # bulk_create sends no signals
+        transaction.on_commit(invalidate_stats)
+        
+        # Re-read through the prefetching queryset so the response costs a fixed number of queries
+        created = self.get_queryset().filter(pk__in=[invoice.pk for invoice in invoices])
+        return Response(self.get_serializer(created, many=True).data, status=status.HTTP_201_CREATED)
+    
+    @action(detail=False, methods=['get'], url_path=r'export\.(?P<export_format>csv|ndjson)')
+    def export(self, request, export_format):
+        """Stream every invoice matching the list filters as CSV or NDJSON."""
+        return stream_export(self.filter_queryset(self.get_queryset()), self.export_fields, export_format, 'invoices')
     
     @action(detail=True, methods=['post'])
     def mark_as_paid(self, request, pk=None):
@@ -27,30 +65,16 @@ class InvoiceViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'])
     def stats(self, request):
-        today = timezone.now().date()
-        month_start = today.replace(day=1)
-        
-        total_revenue = Payment.objects.filter(
-            status='COMPLETED', 
-            payment_date__gte=month_start
-        ).aggregate(total=Sum('amount'))['total'] or 0
-        
-        monthly_invoices = Invoice.objects.filter(issue_date__gte=month_start).count()
-        monthly_payments = Payment.objects.filter(payment_date__gte=month_start, status='COMPLETED').count()
-        
-        outstanding_amount = Invoice.objects.filter(
-            status__in=['SENT', 'OVERDUE']
-        ).aggregate(total=Sum('total'))['total'] or 0
-        
-        outstanding_count = Invoice.objects.filter(status__in=['SENT', 'OVERDUE']).count()
-        
-        return Response({
-            'total_revenue': total_revenue,
-            'monthly_invoices': monthly_invoices,
-            'monthly_payments': monthly_payments,
-            'outstanding_amount': outstanding_amount,
-            'outstanding_count': outstanding_count
-        })
+        """Dashboard figures for ``?period=YYYY-MM`` (default: the current month)."""
+        period = request.query_params.get('period')
+        try:
+            period = datetime.strptime(period, '%Y-%m').date() if period else timezone.localdate()
+        except ValueError:
+            return Response(
+                {"error": "Invalid period. Use YYYY-MM"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(get_stats(period))
 
 
 class InvoiceItemViewSet(viewsets.ModelViewSet):
@@ -63,10 +87,20 @@ class InvoiceItemViewSet(viewsets.ModelViewSet):
 class PaymentViewSet(viewsets.ModelViewSet):
     queryset = Payment.objects.all().order_by('-created_at')
     serializer_class = PaymentSerializer
+    pagination_class = CreatedDescPagination
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['invoice', 'payment_method', 'status', 'payment_date']
     search_fields = ['invoice__invoice_number', 'transaction_id']
     ordering_fields = ['payment_date', 'amount']
+    export_fields = [
+        'id', 'invoice_id', 'invoice__invoice_number', 'payment_date', 'amount',
+        'payment_method', 'transaction_id', 'status', 'created_at',
+    ]
+    
+    @action(detail=False, methods=['get'], url_path=r'export\.(?P<export_format>csv|ndjson)')
+    def export(self, request, export_format):
+        """Stream every payment matching the list filters as CSV or NDJSON."""
+        return stream_export(self.filter_queryset(self.get_queryset()), self.export_fields, export_format, 'payments')
     
     @action(detail=True, methods=['post'])
     def mark_as_completed(self, request, pk=None):
@@ -115,15 +149,15 @@ class InsuranceClaimViewSet(viewsets.ModelViewSet):
         return Response(InsuranceClaimSerializer(claim).data)
 
 
-class InsuranceProviderViewSet(viewsets.ModelViewSet):
-    queryset = InsuranceProvider.objects.all()
+class InsuranceProviderViewSet(CachedReadMixin, viewsets.ModelViewSet):
+    queryset = InsuranceProvider.objects.order_by('id')
     serializer_class = InsuranceProviderSerializer
     filter_backends = [filters.SearchFilter]
     search_fields = ['name', 'contact_person']
 
 
-class DentalServiceViewSet(viewsets.ModelViewSet):
-    queryset = DentalService.objects.filter(is_active=True)
+class DentalServiceViewSet(CachedReadMixin, viewsets.ModelViewSet):
+    queryset = DentalService.objects.filter(is_active=True).order_by('id')
     serializer_class = DentalServiceSerializer
     filter_backends = [filters.SearchFilter]
     search_fields = ['name', 'code']
\ No newline at end of file
@@ -0,0 +1,86 @@
+"""
+Async versions of the calendar's hot read endpoints, for ASGI deployments.
+
+Each view takes the same parameters and returns the same JSON as the
+``AppointmentViewSet`` action it mirrors (see ``backend.asyncapi``).
+"""
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+from rest_framework import status
+
+from backend.asyncapi import async_api_view, json_response
+from . import availability, occupancy
+from .models import Appointment, AppointmentDayCount
+from .serializers import AppointmentSerializer
+from .views import MAX_COUNT_MONTHS, parse_month_range, parse_slot_minutes
+
+
+@async_api_view
+async def by_date(request, date):
+    """Scheduled appointments on ``date``, like ``AppointmentViewSet.by_date``."""
+    try:
+        date_obj = datetime.strptime(date, '%Y-%m-%d').date()
+    except ValueError:
+        return json_response(
+            {"error": "Invalid date format. Use YYYY-MM-DD"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    appointments = AppointmentSerializer.optimize_queryset(Appointment.objects.filter(
+        date=date_obj,
+        status=Appointment.STATUS_SCHEDULED
+    ))
+    # Everything the serializer reads is joined in, so serializing needs no further queries
+    appointments = [appointment async for appointment in appointments]
+    return json_response(AppointmentSerializer(appointments, many=True).data)
+
+
+@async_api_view
+async def counts(request):
+    """Scheduled appointments per day over a range of months, like ``AppointmentViewSet.counts``."""
+    try:
+        first_day, last_day = parse_month_range(request.GET)
+    except ValueError:
+        return json_response(
+            {"error": f"Invalid year/month, or a start_month/end_month range longer than {MAX_COUNT_MONTHS} months"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    day_counts = AppointmentDayCount.objects.filter(
+        date__gte=first_day,
+        date__lte=last_day,
+        status=Appointment.STATUS_SCHEDULED,
+        count__gt=0
+    ).order_by('date').values_list('date', 'count')
+    return json_response([
+        {'date': day.strftime('%Y-%m-%d'), 'count': count}
+        async for day, count in day_counts
+    ])
+
+
+@async_api_view
+async def available_slots(request):
+    """Free slots on ``?date=``, like ``AppointmentViewSet.available_slots``."""
+    date_str = request.GET.get('date')
+    if not date_str:
+        return json_response(
+            {"error": "Date parameter is required"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    try:
+        date_obj = datetime.strptime(date_str, '%Y-%m-%d').date()
+    except ValueError:
+        return json_response(
+            {"error": "Invalid date format. Use YYYY-MM-DD"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    try:
+        slot_minutes = await sync_to_async(parse_slot_minutes)(request.GET)
+    except ValueError:
+        return json_response(
+            {"error": "Invalid duration or appointment_type"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    # The bitmaps come from the cache, or from queries on a miss
+    bits = await sync_to_async(occupancy.get_bits)(date_obj)
+    open_bits = await sync_to_async(availability.clinic_hours)(date_obj)
+    return json_response([t.strftime('%I:%M %p') for t in occupancy.free_starts(bits, open_bits, slot_minutes)])
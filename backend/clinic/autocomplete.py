@@ -0,0 +1,231 @@
+"""
+In-process prefix index for patient type-ahead.
+
+Every name token of every patient is kept in one sorted list of
+``(token, patient_id)`` pairs, so finding the patients with a token starting
+with a prefix is two bisects. The first keystrokes, or a common first name,
+can match a large share of all patients. So the index also keeps, for every
+prefix of up to ``SHORT_PREFIX`` characters, the matching patients in name
+order. When ranking every candidate would cost more, a lookup walks that
+list in result order and stops after ``limit`` matches. The index is loaded with one
+query on first use (``backend/wsgi.py`` and ``backend/asgi.py`` warm it at
+startup) and kept current by Patient signals.
+
+Lookups don't lock. Writers copy the lists they change and swap the whole
+contents in at once, so a lookup always reads one consistent version.
+
+Signals only reach the process that made the change, so each change also
+bumps a version number in the cache. With a shared cache backend, other
+processes see the new version on their next lookup and reload. A per-process
+cache never shows them the bump, so each process then reloads an index older
+than ``PROCESS_LOCAL_CACHE_TIMEOUT`` seconds instead.
+"""
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import namedtuple
+
+from django.core.cache import cache
+from django.db import DatabaseError
+
+from backend.caching import local_timeout
+
+from .models import Patient
+from .search import normalize, tokenize
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+SHORT_PREFIX = 2
+VERSION_KEY = 'clinic:autocomplete:version'
+
+# keys: sorted (token, id); names: sorted (normalized name, id); prefixes:
+# short prefix -> sorted (normalized name, id); patients: id -> entry
+Contents = namedtuple('Contents', ['keys', 'names', 'prefixes', 'patients'])
+
+
+def _entry(name, phone):
+    """``(name, phone, normalized name, tokens)`` as the index stores a patient."""
+    return name, phone, normalize(name), tuple(sorted(set(tokenize(name))))
+
+
+def _short_prefixes(tokens):
+    return {token[:length] for token in tokens for length in range(1, SHORT_PREFIX + 1)}
+
+
+class PrefixIndex:
+    def __init__(self):
+        self._contents = Contents([], [], {}, {})
+        self._lock = threading.Lock()
+        self.version = None
+        self.loaded_at = None
+
+    def load(self, rows, version=None):
+        """Replace the contents with ``(id, name, phone)`` rows."""
+        keys = []
+        names = []
+        prefixes = {}
+        patients = {}
+        for patient_id, name, phone in rows:
+            entry = patients[patient_id] = _entry(name, phone)
+            keys.extend((token, patient_id) for token in entry[3])
+            names.append((entry[2], patient_id))
+            for prefix in _short_prefixes(entry[3]):
+                prefixes.setdefault(prefix, []).append((entry[2], patient_id))
+        keys.sort()
+        names.sort()
+        for ordered in prefixes.values():
+            ordered.sort()
+        with self._lock:
+            self._contents = Contents(keys, names, prefixes, patients)
+            self.version = version
+            self.loaded_at = time.monotonic()
+
+    def add(self, patient_id, name, phone):
+        self._change(patient_id, _entry(name, phone))
+
+    def remove(self, patient_id):
+        self._change(patient_id, None)
+
+    def _change(self, patient_id, entry):
+        """Swap in contents where ``patient_id`` has ``entry`` (None to remove it)."""
+        with self._lock:
+            old = self._contents
+            keys, names, patients = list(old.keys), list(old.names), dict(old.patients)
+            prefixes = dict(old.prefixes)
+            copied = set()
+
+            def prefix_list(prefix):
+                # Each changed list is copied once; the others are shared with the old contents
+                if prefix not in copied:
+                    prefixes[prefix] = list(prefixes.get(prefix, ()))
+                    copied.add(prefix)
+                return prefixes[prefix]
+
+            previous = patients.pop(patient_id, None)
+            if previous is not None:
+                for token in previous[3]:
+                    _discard(keys, (token, patient_id))
+                _discard(names, (previous[2], patient_id))
+                for prefix in _short_prefixes(previous[3]):
+                    _discard(prefix_list(prefix), (previous[2], patient_id))
+            if entry is not None:
+                patients[patient_id] = entry
+                for token in entry[3]:
+                    insort(keys, (token, patient_id))
+                insort(names, (entry[2], patient_id))
+                for prefix in _short_prefixes(entry[3]):
+                    insort(prefix_list(prefix), (entry[2], patient_id))
+            self._contents = Contents(keys, names, prefixes, patients)
+
+    def lookup(self, query, limit=DEFAULT_LIMIT):
+        """
+        Return up to ``limit`` ``(id, name, phone)`` tuples whose name tokens
+        prefix-match every term of ``query``. Names that start with the whole
+        query come first, then names in alphabetical order.
+        """
+        terms = tokenize(query)
+        if not terms:
+            return []
+        keys, names, prefixes, patients = self._contents
+        phrase = normalize(query).strip()
+
+        def matches(patient_id):
+            tokens = patients[patient_id][3]
+            return all(any(token.startswith(term) for token in tokens) for term in terms)
+
+        # Candidates come from the longest term, the most selective one
+        anchor = max(terms, key=len)
+        first = bisect_left(keys, (anchor,))
+        last = bisect_left(keys, (anchor + '\uffff',))
+        ordered = prefixes.get(anchor[:SHORT_PREFIX], ())
+        # Ranking reads every candidate; a walk in name order reads about
+        # ``limit`` times one in (candidates / list length) entries
+        if (last - first) ** 2 > limit * len(ordered):
+            # Names starting with the query are one run of the name list; the
+            # rest come from the anchor's prefix list. Both are in result order
+            ids = []
+            index = bisect_left(names, (phrase,))
+            while len(ids) < limit and index < len(names) and names[index][0].startswith(phrase):
+                if matches(names[index][1]):
+                    ids.append(names[index][1])
+                index += 1
+            for normalized_name, patient_id in ordered:
+                if len(ids) >= limit:
+                    break
+                if not normalized_name.startswith(phrase) and matches(patient_id):
+                    ids.append(patient_id)
+        else:
+            ranked = sorted(
+                (not patients[patient_id][2].startswith(phrase), patients[patient_id][2], patient_id)
+                for patient_id in {patient_id for _, patient_id in keys[first:last]} if matches(patient_id)
+            )
+            ids = [patient_id for _, _, patient_id in ranked[:limit]]
+        return [(patient_id, patients[patient_id][0], patients[patient_id][1]) for patient_id in ids]
+
+    def __len__(self):
+        return len(self._contents.patients)
+
+
+def _discard(ordered, item):
+    index = bisect_left(ordered, item)
+    if index < len(ordered) and ordered[index] == item:
+        del ordered[index]
+
+
+_index = PrefixIndex()
+_load_lock = threading.Lock()
+
+
+def _expired():
+    # Only a per-process cache sets a lifetime; a shared one delivers every bump
+    lifetime = local_timeout(None)
+    return lifetime is not None and _index.loaded_at is not None and time.monotonic() - _index.loaded_at >= lifetime
+
+
+def get_index():
+    """Return the process-wide index, (re)loading it if it's missing or another process changed patients."""
+    version = cache.get_or_set(VERSION_KEY, 1, None)
+    if _index.version != version or _expired():
+        with _load_lock:
+            if _index.version != version or _expired():
+                _index.load(Patient.objects.values_list('id', 'name', 'phone').iterator(chunk_size=5000), version)
+    return _index
+
+
+def bump_version():
+    try:
+        version = cache.incr(VERSION_KEY)
+    except ValueError:
+        version = cache.get_or_set(VERSION_KEY, 1, None)
+    # This process applies its own change and doesn't need to reload, unless
+    # another process changed something in between
+    if _index.version is not None and version == _index.version + 1:
+        _index.version = version
+    return version
+
+
+def patient_saved(patient_id, name, phone):
+    if _index.version is not None:
+        _index.add(patient_id, name, phone)
+    bump_version()
+
+
+def patient_deleted(patient_id):
+    if _index.version is not None:
+        _index.remove(patient_id)
+    bump_version()
+
+
+def invalidate():
+    """Force every process to reload, e.g. after writes that bypass signals like ``bulk_create``."""
+    _index.version = None
+    bump_version()
+
+
+def warm():
+    """Load the index now instead of on the first lookup."""
+    try:
+        get_index()
+    except DatabaseError:
+        # Not migrated yet; the first lookup will load it
+        pass
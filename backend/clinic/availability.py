@@ -0,0 +1,207 @@
+"""
+Availability across chairs and providers.
+
+``find_openings`` answers "when can this appointment type be booked?" for a
+practice with several chairs and providers. A booking needs a chair and a
+provider, both free for the type's whole duration, within the clinic's and
+the provider's working hours.
+
+Everything is read up front with a fixed number of queries, whatever the
+number of resources or days. Those are the active chairs, the qualified
+providers, the working hours, breaks and holidays, and one range query for
+the booked intervals. Each resource-day becomes an occupancy bitmap (see
+``clinic.occupancy``). The search is then one sweep over days and start
+times, testing each chair and provider with a mask.
+
+A clinic that hasn't configured any ``WorkingHours`` keeps the defaults from
+``clinic.scheduling``: 9 to 5 every day with a lunch break.
+
+``clinic_hours`` serves the clinic's opening for the single-lane slot
+endpoints from one cache entry, keyed on a version that saving or deleting
+working hours, breaks or holidays bumps (see ``clinic.signals``).
+"""
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+from itertools import islice
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Q
+
+from backend.caching import local_timeout
+
+from .models import Appointment, Break, Chair, Holiday, Provider, WorkingHours
+from .occupancy import CACHE_TIMEOUT, UNIT_MINUTES, interval_mask
+from .scheduling import CLINIC_CLOSE, CLINIC_OPEN, LUNCH_END, LUNCH_START, SLOT_MINUTES, from_minutes, to_minutes
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 100
+
+
+def _mask(start_time, end_time):
+    return interval_mask(to_minutes(start_time), to_minutes(end_time))
+
+
+class WorkingCalendar:
+    """Working-time bitmaps per day for the clinic and each provider."""
+
+    def __init__(self, start_date, end_date, provider_ids):
+        self.hours = defaultdict(int)
+        self.breaks = defaultdict(int)
+        hours = list(WorkingHours.objects.filter(Q(provider__isnull=True) | Q(provider__in=provider_ids)))
+        for row in hours:
+            self.hours[(row.provider_id, row.weekday)] |= _mask(row.start_time, row.end_time)
+        # Providers with hours of their own; the rest work the clinic's hours
+        self.own_hours = {row.provider_id for row in hours if row.provider_id is not None}
+
+        if not any(row.provider_id is None for row in hours):
+            for weekday in range(7):
+                self.hours[(None, weekday)] = _mask(CLINIC_OPEN, CLINIC_CLOSE)
+            self.breaks[(None, None)] = _mask(LUNCH_START, LUNCH_END)
+        for row in Break.objects.filter(Q(provider__isnull=True) | Q(provider__in=provider_ids)):
+            self.breaks[(row.provider_id, row.weekday)] |= _mask(row.start_time, row.end_time)
+
+        self.holidays = set(Holiday.objects.filter(
+            Q(provider__isnull=True) | Q(provider__in=provider_ids),
+            date__gte=start_date,
+            date__lte=end_date
+        ).values_list('provider_id', 'date'))
+
+    def _working(self, provider_id, day):
+        weekday = day.weekday()
+        owner = provider_id if provider_id in self.own_hours else None
+        bits = self.hours[(owner, weekday)]
+        return bits & ~self.breaks[(provider_id, None)] & ~self.breaks[(provider_id, weekday)]
+
+    def clinic(self, day):
+        """Units of ``day`` the clinic is open."""
+        if (None, day) in self.holidays:
+            return 0
+        return self._working(None, day)
+
+    def provider(self, provider_id, day):
+        """Units of ``day`` the provider works, within clinic opening."""
+        if (provider_id, day) in self.holidays:
+            return 0
+        return self._working(provider_id, day) & self.clinic(day)
+
+
+HOURS_VERSION_KEY = 'clinic:hours:version'
+
+
+def clinic_hours(day):
+    """Units of ``day`` the clinic is open (``WorkingCalendar.clinic``), from the cache when possible."""
+    # A fresh, unique version if the key was evicted, so old entries can't come back
+    version = cache.get_or_set(HOURS_VERSION_KEY, time.time_ns, None)
+    key = f'clinic:hours:{version}'
+    hours = cache.get(key)
+    if hours is None:
+        # One entry for every day: the bitmap per weekday and the clinic's holidays
+        calendar = WorkingCalendar(date.min, date.max, [])
+        monday = date(2001, 1, 1)
+        hours = (
+            [calendar._working(None, monday + timedelta(days=weekday)) for weekday in range(7)],
+            frozenset(holiday for provider_id, holiday in calendar.holidays if provider_id is None),
+        )
+        if not connection.in_atomic_block:
+            cache.set(key, hours, local_timeout(CACHE_TIMEOUT))
+    weekdays, holidays = hours
+    return 0 if day in holidays else weekdays[day.weekday()]
+
+
+def invalidate_hours():
+    """Drop every cached ``clinic_hours`` entry once the current transaction commits."""
+    transaction.on_commit(lambda: cache.set(HOURS_VERSION_KEY, time.time_ns(), None))
+
+
+def booked_bitmaps(start_date, end_date, chair_ids, provider_ids):
+    """
+    Return ``{('chair' | 'provider', id, date): bits}`` of scheduled appointments
+    in the range, from one query.
+    """
+    booked = defaultdict(int)
+    appointments = Appointment.objects.filter(
+        Q(chair__in=chair_ids) | Q(provider__in=provider_ids),
+        date__gte=start_date,
+        date__lte=end_date,
+        status=Appointment.STATUS_SCHEDULED
+    ).values_list('date', 'start_time', 'duration', 'chair_id', 'provider_id')
+    for day, start_time, duration, chair_id, provider_id in appointments:
+        start = to_minutes(start_time)
+        bits = interval_mask(start, start + duration)
+        if chair_id is not None:
+            booked[('chair', chair_id, day)] |= bits
+        if provider_id is not None:
+            booked[('provider', provider_id, day)] |= bits
+    return booked
+
+
+def performs(appointment_type):
+    """Filter for providers who perform ``appointment_type``, listed or by having no types listed."""
+    return Q(appointment_types=appointment_type) | Q(appointment_types__isnull=True)
+
+
+def qualified_providers(appointment_type):
+    """Active providers who perform ``appointment_type`` (or any type), in a stable order."""
+    return list(Provider.objects.filter(is_active=True).filter(performs(appointment_type)).distinct().order_by('id'))
+
+
+def iter_openings(appointment_type, start_date, end_date, chairs=None, providers=None, step=SLOT_MINUTES):
+    """
+    Yield ``(date, start_time, chair, provider, chair_free)`` for every opening,
+    earliest first; ``chair_free`` is the chair's bitmap of free units that day.
+
+    A start time with several free providers yields one opening per provider,
+    each with a different free chair. ``chairs`` and ``providers`` narrow the
+    search; by default every active chair and every qualified provider is tried.
+    """
+    duration = appointment_type.default_duration
+    if chairs is None:
+        chairs = list(Chair.objects.filter(is_active=True).order_by('id'))
+    if providers is None:
+        providers = qualified_providers(appointment_type)
+    if not chairs or not providers or duration <= 0:
+        return
+    chair_ids = [chair.id for chair in chairs]
+    provider_ids = [provider.id for provider in providers]
+
+    calendar = WorkingCalendar(start_date, end_date, provider_ids)
+    booked = booked_bitmaps(start_date, end_date, chair_ids, provider_ids)
+
+    day = start_date
+    while day <= end_date:
+        open_bits = calendar.clinic(day)
+        if open_bits:
+            # Units each resource can still take a booking in
+            free_chairs = [(chair, open_bits & ~booked[('chair', chair.id, day)]) for chair in chairs]
+            free_providers = [
+                (provider, calendar.provider(provider.id, day) & ~booked[('provider', provider.id, day)])
+                for provider in providers
+            ]
+            # Starts every ``step`` minutes from opening until the last open unit
+            opening = ((open_bits & -open_bits).bit_length() - 1) * UNIT_MINUTES
+            closing = open_bits.bit_length() * UNIT_MINUTES
+            for start in range(opening, closing - duration + 1, step):
+                need = interval_mask(start, start + duration)
+                if open_bits & need != need:
+                    continue
+                available = ((chair, bits) for chair, bits in free_chairs if bits & need == need)
+                for provider, bits in free_providers:
+                    if bits & need != need:
+                        continue
+                    chair, chair_free = next(available, (None, 0))
+                    if chair is None:
+                        break
+                    yield day, from_minutes(start), chair, provider, chair_free
+        day += timedelta(days=1)
+
+
+def find_openings(appointment_type, start_date, end_date, limit=DEFAULT_LIMIT, chairs=None, providers=None,
+                  step=SLOT_MINUTES):
+    """
+    Return up to ``limit`` openings for ``appointment_type`` between the two dates,
+    as ``(date, start_time, chair, provider)`` tuples, earliest first (see ``iter_openings``).
+    """
+    openings = iter_openings(appointment_type, start_date, end_date, chairs=chairs, providers=providers, step=step)
+    return [opening[:4] for opening in islice(openings, limit)]
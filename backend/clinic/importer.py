@@ -0,0 +1,231 @@
+"""
+Bulk patient import from CSV or JSON.
+
+Rows are read lazily and handled ``BATCH_SIZE`` at a time. Each batch is
+checked against precompiled validators and a single query for existing
+patients with the same email or phone, then the valid rows are inserted with
+one ``bulk_create``. Memory is bounded by the batch size plus the emails and
+phones already seen, which are needed to catch duplicates within the file.
+
+Invalid and duplicate rows are skipped and reported with their row number.
+Row 1 is the first data row, not counting a CSV header. Emails are compared
+case-insensitively; phones are stored and compared without separators.
+"""
+import csv
+import io
+import json
+import re
+import time
+from datetime import date
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.db.models import F, Q, Value
+from django.db.models.functions import Lower, Replace
+from django.utils.dateparse import parse_date
+
+from . import autocomplete
+from .models import Patient
+from .search import get_backend
+
+BATCH_SIZE = 1000
+FIELDS = ['name', 'email', 'phone', 'date_of_birth', 'preferred_time', 'last_visit', 'notes']
+FORMATS = ['csv', 'json', 'ndjson']
+# Raised while reading a file that isn't valid UTF-8, CSV or JSON
+READ_ERRORS = (ValueError, csv.Error)
+
+# Same rule as patients.serializers.PatientSerializer.validate_phone, after
+# dropping spaces, dashes, dots and parentheses
+PHONE_RE = re.compile(r'^\+?\d{10,15}$')
+PHONE_SEPARATORS_RE = re.compile(r'[\s\-\.\(\)]')
+PREFERRED_TIMES = {value for value, _ in Patient._meta.get_field('preferred_time').choices}
+NAME_MAX_LENGTH = Patient._meta.get_field('name').max_length
+
+
+def detect_format(filename):
+    """Guess the format from a file name, defaulting to CSV."""
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    return extension if extension in FORMATS else 'csv'
+
+
+def read_rows(stream, file_format):
+    """
+    Yield row dicts from a text stream.
+
+    CSV and NDJSON are read a line at a time. A JSON document must be an
+    array of objects and is parsed in one go, so prefer NDJSON for big files.
+    """
+    if file_format == 'csv':
+        yield from csv.DictReader(stream)
+    elif file_format == 'ndjson':
+        for line in stream:
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # Reported as an error for this row rather than ending the import
+                    yield None
+    else:
+        rows = json.load(stream)
+        if not isinstance(rows, list):
+            raise ValueError("JSON import must be an array of objects")
+        yield from rows
+
+
+def text_stream(binary):
+    """Wrap an uploaded (binary) file for ``read_rows``, dropping a UTF-8 BOM."""
+    return io.TextIOWrapper(binary, encoding='utf-8-sig', newline='')
+
+
+def clean_phone(value):
+    return PHONE_SEPARATORS_RE.sub('', value)
+
+
+def clean_phone_expression(field='phone'):
+    """SQL for ``clean_phone`` of a stored phone, which other code may have saved with separators."""
+    expression = F(field)
+    # Whitespace other than spaces isn't expected in a stored phone
+    for separator in ' -.()':
+        expression = Replace(expression, Value(separator), Value(''))
+    return expression
+
+
+def clean_row(row):
+    """Return ``(values, errors)`` for one raw row; ``errors`` maps field to message."""
+    if not isinstance(row, dict):
+        return None, {'row': "Expected a JSON object."}
+    values = {}
+    errors = {}
+    for field in FIELDS:
+        value = row.get(field)
+        values[field] = str(value).strip() if value not in (None, '') else None
+
+    if not values['name']:
+        errors['name'] = "This field is required."
+    elif len(values['name']) > NAME_MAX_LENGTH:
+        errors['name'] = f"Ensure this field has no more than {NAME_MAX_LENGTH} characters."
+
+    if values['email']:
+        values['email'] = values['email'].lower()
+        try:
+            validate_email(values['email'])
+        except ValidationError:
+            errors['email'] = "Enter a valid email address."
+
+    if values['phone']:
+        values['phone'] = clean_phone(values['phone'])
+        if not PHONE_RE.match(values['phone']):
+            errors['phone'] = "Enter a valid phone number."
+
+    today = date.today()
+    for field in ('date_of_birth', 'last_visit'):
+        if values[field]:
+            try:
+                values[field] = parse_date(values[field])
+            except ValueError:
+                values[field] = None
+            if values[field] is None:
+                errors[field] = "Enter a valid date in YYYY-MM-DD format."
+            elif values[field] > today:
+                errors[field] = "Date cannot be in the future."
+
+    if values['preferred_time'] and values['preferred_time'] not in PREFERRED_TIMES:
+        errors['preferred_time'] = f"Must be one of {', '.join(sorted(PREFERRED_TIMES))}."
+
+    return values, errors
+
+
+def _batches(rows, size):
+    rows = iter(rows)
+    number = 0
+    while True:
+        batch = []
+        try:
+            for row in islice(rows, size):
+                number += 1
+                batch.append((number, row))
+        except READ_ERRORS:
+            # Still import the rows read before the unreadable one
+            if batch:
+                yield batch
+            raise
+        if not batch:
+            return
+        yield batch
+
+
+def import_patients(rows, batch_size=BATCH_SIZE, dry_run=False):
+    """
+    Validate and insert patients from an iterable of row dicts.
+
+    Returns a report dict with the number of rows read and created, the
+    per-row ``errors`` (``[{'row': n, 'errors': {field: message}}]``) and the
+    achieved ``rows_per_second``. If the file turns out to be unreadable
+    part-way, the import stops there and ``error`` says why; the rows before
+    it are still imported and counted.
+    """
+    started = time.perf_counter()
+    seen_emails = set()
+    seen_phones = set()
+    report = {'rows': 0, 'created': 0, 'errors': []}
+
+    try:
+        for batch in _batches(rows, batch_size):
+            report['rows'] += len(batch)
+            cleaned = []
+            for number, row in batch:
+                values, errors = clean_row(row)
+                if errors:
+                    report['errors'].append({'row': number, 'errors': errors})
+                else:
+                    cleaned.append((number, values))
+
+            # One query for the whole batch finds the rows that match a stored patient
+            emails = {values['email'] for _, values in cleaned if values['email']}
+            phones = {values['phone'] for _, values in cleaned if values['phone']}
+            existing_emails = set()
+            existing_phones = set()
+            if emails or phones:
+                for email, phone in Patient.objects.annotate(
+                    email_lower=Lower('email'), phone_clean=clean_phone_expression()
+                ).filter(
+                    Q(email_lower__in=emails) | Q(phone_clean__in=phones)
+                ).values_list('email_lower', 'phone_clean'):
+                    existing_emails.add(email)
+                    existing_phones.add(phone)
+
+            patients = []
+            for number, values in cleaned:
+                errors = {}
+                if values['email'] and (values['email'] in existing_emails or values['email'] in seen_emails):
+                    errors['email'] = "A patient with this email already exists."
+                if values['phone'] and (values['phone'] in existing_phones or values['phone'] in seen_phones):
+                    errors['phone'] = "A patient with this phone number already exists."
+                if errors:
+                    report['errors'].append({'row': number, 'errors': errors})
+                    continue
+                if values['email']:
+                    seen_emails.add(values['email'])
+                if values['phone']:
+                    seen_phones.add(values['phone'])
+                patients.append(Patient(**values))
+
+            if patients and not dry_run:
+                with transaction.atomic():
+                    created = Patient.objects.bulk_create(patients)
+                    # bulk_create sends no post_save, so index the batch here
+                    get_backend().index_many(created)
+            report['created'] += len(patients)
+    except READ_ERRORS as exc:
+        # Batches before the unreadable row are committed, so report them with the error
+        report['error'] = f"Cannot read the file after row {report['rows']}: {exc}"
+    finally:
+        if report['created'] and not dry_run:
+            autocomplete.invalidate()
+
+    elapsed = time.perf_counter() - started
+    report['seconds'] = round(elapsed, 3)
+    report['rows_per_second'] = round(report['rows'] / elapsed) if elapsed else 0
+    return report
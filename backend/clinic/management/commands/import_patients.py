@@ -0,0 +1,47 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from clinic.importer import BATCH_SIZE, FORMATS, detect_format, import_patients, read_rows
+
+
+class Command(BaseCommand):
+    help = "Import clinic patients from a CSV, JSON or NDJSON file ('-' reads stdin)."
+    
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or '-' for stdin.")
+        parser.add_argument('--format', choices=FORMATS, help="File format (default: guessed from the extension).")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help=f"Rows per insert (default: {BATCH_SIZE}).")
+        parser.add_argument('--dry-run', action='store_true', help="Validate and report without inserting.")
+        parser.add_argument('--report', help="Write the per-row error report to this JSON file.")
+    
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or detect_format(path)
+        try:
+            stream = sys.stdin if path == '-' else open(path, encoding='utf-8-sig', newline='')
+        except OSError as exc:
+            raise CommandError(f"Cannot open {path}: {exc}")
+        
+        with stream:
+            report = import_patients(
+                read_rows(stream, file_format), batch_size=options['batch_size'], dry_run=options['dry_run']
+            )
+        
+        for error in report['errors'][:20]:
+            messages = '; '.join(f"{field}: {message}" for field, message in error['errors'].items())
+            self.stderr.write(f"Row {error['row']}: {messages}")
+        if len(report['errors']) > 20:
+            self.stderr.write(f"... and {len(report['errors']) - 20} more")
+        if options['report']:
+            with open(options['report'], 'w') as output:
+                json.dump(report, output, indent=2)
+        
+        verb = "Would import" if options['dry_run'] else "Imported"
+        self.stdout.write(
+            f"{verb} {report['created']} of {report['rows']} row(s), {len(report['errors'])} rejected, "
+            f"in {report['seconds']:.2f} s ({report['rows_per_second']} rows/s)"
+        )
+        if 'error' in report:
+            raise CommandError(f"Stopped reading {path} as {file_format}: {report['error']}")
@@ -0,0 +1,53 @@
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F, Q
+from django.utils import timezone
+
+from clinic import recurrence
+from clinic.models import AppointmentSeries
+
+
+class Command(BaseCommand):
+    help = "Create the appointments of recurring series for the coming weeks, skipping conflicting occurrences."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--weeks', type=int, default=recurrence.DEFAULT_WEEKS,
+            help=f"How far ahead to materialize (default: {recurrence.DEFAULT_WEEKS})."
+        )
+        parser.add_argument('--date', help="Treat this YYYY-MM-DD as today (default: the current date).")
+
+    def handle(self, *args, **options):
+        if not 1 <= options['weeks'] <= recurrence.MAX_WEEKS:
+            raise CommandError(f"--weeks must be from 1 to {recurrence.MAX_WEEKS}")
+        today = timezone.localdate()
+        if options['date']:
+            try:
+                today = datetime.strptime(options['date'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError("Invalid --date. Use YYYY-MM-DD")
+
+        started = time.perf_counter()
+        created = skipped = 0
+        # Series whose end has already been materialized have nothing left to do
+        pending = AppointmentSeries.objects.filter(
+            Q(materialized_until__isnull=True) | Q(until__isnull=True) | Q(until__gt=F('materialized_until'))
+        ).order_by('id')
+        for series in pending:
+            through = recurrence.horizon(series, options['weeks'], today)
+            try:
+                report = recurrence.materialize(series, through, skip_conflicts=True)
+            except ValueError as exc:
+                self.stderr.write(f"Series {series.id}: {exc}")
+                continue
+            created += report['created']
+            skipped += len(report['skipped'])
+            for conflict in report['skipped']:
+                self.stderr.write(f"Series {series.id}: skipped {conflict['date']}: {conflict['reason']}")
+        elapsed = (time.perf_counter() - started) * 1000
+        self.stdout.write(
+            f"Created {created} appointment(s) and skipped {skipped} conflict(s) through "
+            f"{options['weeks']} week(s) from {today} in {elapsed:.1f} ms"
+        )
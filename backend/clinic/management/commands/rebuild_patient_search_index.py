@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from clinic.models import Patient
+from clinic.search import get_backend
+
+
+class Command(BaseCommand):
+    help = "Re-index every clinic patient with the configured PATIENT_SEARCH_BACKEND."
+    
+    def handle(self, *args, **options):
+        backend = get_backend()
+        started = time.perf_counter()
+        backend.rebuild()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"Indexed {Patient.objects.count()} patient(s) with {type(backend).__name__} in {elapsed:.2f} s"
+        )
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:05
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_day_counts(apps, schema_editor):
+    Appointment = apps.get_model('clinic', 'Appointment')
+    AppointmentDayCount = apps.get_model('clinic', 'AppointmentDayCount')
+    counts = Appointment.objects.order_by().values('date', 'status').annotate(total=Count('id'))
+    AppointmentDayCount.objects.bulk_create(
+        (AppointmentDayCount(date=row['date'], status=row['status'], count=row['total']) for row in counts.iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clinic', '0003_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AppointmentDayCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('status', models.CharField(choices=[('scheduled', 'Scheduled'), ('completed', 'Completed'), ('cancelled', 'Cancelled'), ('no_show', 'No Show')], max_length=20)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('date', 'status'), name='clinic_daycount_date_status_uniq')],
+            },
+        ),
+        migrations.RunPython(backfill_day_counts, migrations.RunPython.noop),
+    ]
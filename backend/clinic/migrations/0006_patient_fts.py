@@ -0,0 +1,51 @@
+from django.db import migrations
+
+PHONE_DIGITS = (
+    "replace(replace(replace(replace(replace(replace(coalesce({0}.phone, ''), "
+    "' ', ''), '-', ''), '(', ''), ')', ''), '+', ''), '.', '')"
+)
+ROW = "{0}.id, {0}.name, coalesce({0}.email, ''), " + PHONE_DIGITS + ", coalesce({0}.date_of_birth, '')"
+
+FORWARD_SQL = [
+    "CREATE VIRTUAL TABLE clinic_patient_fts USING fts5("
+    "name, email, phone, date_of_birth, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')",
+    "CREATE TRIGGER clinic_patient_fts_insert AFTER INSERT ON clinic_patient BEGIN "
+    "INSERT INTO clinic_patient_fts(rowid, name, email, phone, date_of_birth) VALUES ("
+    + ROW.format('new') + "); END",
+    "CREATE TRIGGER clinic_patient_fts_update AFTER UPDATE ON clinic_patient BEGIN "
+    "DELETE FROM clinic_patient_fts WHERE rowid = old.id; "
+    "INSERT INTO clinic_patient_fts(rowid, name, email, phone, date_of_birth) VALUES ("
+    + ROW.format('new') + "); END",
+    "CREATE TRIGGER clinic_patient_fts_delete AFTER DELETE ON clinic_patient BEGIN "
+    "DELETE FROM clinic_patient_fts WHERE rowid = old.id; END",
+    "INSERT INTO clinic_patient_fts(rowid, name, email, phone, date_of_birth) "
+    "SELECT " + ROW.format('clinic_patient') + " FROM clinic_patient",
+]
+
+BACKWARD_SQL = [
+    "DROP TRIGGER IF EXISTS clinic_patient_fts_insert",
+    "DROP TRIGGER IF EXISTS clinic_patient_fts_update",
+    "DROP TRIGGER IF EXISTS clinic_patient_fts_delete",
+    "DROP TABLE IF EXISTS clinic_patient_fts",
+]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        # FTS5 is SQLite only; other databases use clinic.search.TokenSearchBackend
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clinic', '0005_patient_search'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(FORWARD_SQL), run(BACKWARD_SQL)),
+    ]
@@ -1,5 +1,7 @@
 # clinic/models.py
-from django.db import models
+from collections import defaultdict
+from django.db import models, transaction
+from django.db.models import F
 from django.utils.translation import gettext_lazy as _
 from django.utils import timezone
 from accounts.models import User
@@ -28,6 +30,18 @@ class Patient(models.Model):
     def __str__(self):
         return self.name
 
+class PatientSearchToken(models.Model):
+    """One searchable token of a patient, used by clinic.search.TokenSearchBackend."""
+    TOKEN_LENGTH = 64
+    
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='search_tokens')
+    token = models.CharField(max_length=TOKEN_LENGTH)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['token', 'patient'], name='clinic_search_token_idx'),
+        ]
+
 class AppointmentType(models.Model):
     """Model representing types of dental appointments."""
     name = models.CharField(max_length=100)
@@ -38,10 +52,116 @@ class AppointmentType(models.Model):
     def __str__(self):
         return self.name
 
+class Chair(models.Model):
+    """A treatment chair (operatory); one appointment at a time."""
+    name = models.CharField(max_length=100)
+    is_active = models.BooleanField(default=True)
+    
+    def __str__(self):
+        return self.name
+
+class Provider(models.Model):
+    """A dentist or hygienist who can be booked."""
+    name = models.CharField(max_length=255)
+    user = models.OneToOneField(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='provider')
+    appointment_types = models.ManyToManyField(
+        AppointmentType, blank=True, related_name='providers',
+        help_text="Types this provider performs; leave empty for all"
+    )
+    is_active = models.BooleanField(default=True)
+    
+    def __str__(self):
+        return self.name
+
+class WorkingHours(models.Model):
+    """
+    Opening hours for one weekday (0 = Monday). Rows without a provider are the
+    clinic's hours; a provider with no rows of their own works the clinic's hours.
+    """
+    provider = models.ForeignKey(Provider, on_delete=models.CASCADE, null=True, blank=True, related_name='working_hours')
+    weekday = models.PositiveSmallIntegerField(choices=[(day, day) for day in range(7)])
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    
+    class Meta:
+        ordering = ['weekday', 'start_time']
+    
+    def __str__(self):
+        return f"{self.provider or 'Clinic'} {self.weekday} {self.start_time}-{self.end_time}"
+
+class Break(models.Model):
+    """A recurring break, e.g. lunch, on one weekday or (without ``weekday``) every day."""
+    provider = models.ForeignKey(Provider, on_delete=models.CASCADE, null=True, blank=True, related_name='breaks')
+    weekday = models.PositiveSmallIntegerField(choices=[(day, day) for day in range(7)], null=True, blank=True)
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    
+    def __str__(self):
+        return f"{self.provider or 'Clinic'} break {self.start_time}-{self.end_time}"
+
+class Holiday(models.Model):
+    """A date the clinic is closed or, with ``provider``, one provider is away."""
+    date = models.DateField()
+    provider = models.ForeignKey(Provider, on_delete=models.CASCADE, null=True, blank=True, related_name='holidays')
+    name = models.CharField(max_length=100, blank=True)
+    
+    class Meta:
+        indexes = [models.Index(fields=['date'], name='clinic_holiday_date_idx')]
+    
+    def __str__(self):
+        return f"{self.date} {self.name}"
+
+class AppointmentSeries(models.Model):
+    """
+    A recurring booking, like an RRULE: every ``interval`` days, weeks or months
+    from ``start_date``, until ``until`` or for ``count`` occurrences, or with
+    neither indefinitely. Occurrences become ``Appointment`` rows as they are
+    materialized (see ``clinic.recurrence``), up to ``materialized_until``.
+    """
+    FREQ_DAILY = 'daily'
+    FREQ_WEEKLY = 'weekly'
+    FREQ_MONTHLY = 'monthly'
+    
+    FREQ_CHOICES = [
+        (FREQ_DAILY, _('Daily')),
+        (FREQ_WEEKLY, _('Weekly')),
+        (FREQ_MONTHLY, _('Monthly')),
+    ]
+    
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='appointment_series')
+    appointment_type = models.ForeignKey(AppointmentType, on_delete=models.SET_NULL, null=True)
+    chair = models.ForeignKey(
+        Chair, on_delete=models.SET_NULL, null=True, blank=True, related_name='appointment_series'
+    )
+    provider = models.ForeignKey(
+        Provider, on_delete=models.SET_NULL, null=True, blank=True, related_name='appointment_series'
+    )
+    frequency = models.CharField(max_length=10, choices=FREQ_CHOICES, default=FREQ_WEEKLY)
+    interval = models.PositiveIntegerField(default=1)
+    start_date = models.DateField()
+    start_time = models.TimeField()
+    duration = models.IntegerField(help_text="Duration in minutes")
+    until = models.DateField(blank=True, null=True, help_text="Last possible date; leave empty with count")
+    count = models.PositiveIntegerField(blank=True, null=True, help_text="Number of occurrences")
+    notes = models.TextField(blank=True, null=True)
+    # Occurrences up to this date have been created, or skipped as conflicts
+    materialized_until = models.DateField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.patient.name} every {self.interval} {self.frequency} from {self.start_date}"
+
 class Appointment(models.Model):
     """Model representing a patient appointment."""
     patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='appointments')
     appointment_type = models.ForeignKey(AppointmentType, on_delete=models.SET_NULL, null=True)
+    # Optional; appointments without resources share a single clinic-wide lane
+    chair = models.ForeignKey(Chair, on_delete=models.SET_NULL, null=True, blank=True, related_name='appointments')
+    provider = models.ForeignKey(Provider, on_delete=models.SET_NULL, null=True, blank=True, related_name='appointments')
+    series = models.ForeignKey(
+        AppointmentSeries, on_delete=models.SET_NULL, null=True, blank=True, related_name='appointments'
+    )
     date = models.DateField()
     start_time = models.TimeField()
     duration = models.IntegerField(help_text="Duration in minutes")
@@ -71,6 +191,16 @@ class Appointment(models.Model):
     
     class Meta:
         ordering = ['date', 'start_time']
+        indexes = [
+            # Default list ordering
+            models.Index(fields=['date', 'start_time'], name='clinic_appt_date_start_idx'),
+            # by_date, counts, available_slots and conflict checks only read scheduled rows
+            models.Index(
+                fields=['date', 'start_time'],
+                condition=models.Q(status='scheduled'),
+                name='clinic_appt_scheduled_idx',
+            ),
+        ]
     
     @property
     def end_time(self):
@@ -79,6 +209,73 @@ class Appointment(models.Model):
         start_datetime = datetime.combine(datetime.today(), self.start_time)
         end_datetime = start_datetime + timedelta(minutes=self.duration)
         return end_datetime.time()
+    
+    def save(self, *args, **kwargs):
+        with transaction.atomic(savepoint=False):
+            previous = Appointment.objects.select_for_update().filter(
+                pk=self.pk
+            ).values_list('date', 'status').first() if self.pk else None
+            # Lets the post_save handlers refresh the day an appointment moved away from
+            self._previous_date = previous[0] if previous else None
+            super().save(*args, **kwargs)
+            
+            # Keep the per-day summary in step; deletes are handled by a post_delete signal
+            current = (self.date, self.status)
+            if previous != current:
+                if previous:
+                    AppointmentDayCount.adjust(*previous, -1)
+                AppointmentDayCount.adjust(*current, 1)
        
     def __str__(self):
-        return f"{self.patient.name} - {self.date} {self.start_time}"
\ No newline at end of file
+        return f"{self.patient.name} - {self.date} {self.start_time}"
+
+class AppointmentDayCount(models.Model):
+    """Number of appointments per date and status, maintained on every appointment write."""
+    date = models.DateField()
+    status = models.CharField(max_length=20, choices=Appointment.STATUS_CHOICES)
+    count = models.IntegerField(default=0)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'status'], name='clinic_daycount_date_status_uniq'),
+        ]
+    
+    @classmethod
+    def adjust(cls, date, status, delta):
+        """Add ``delta`` to the count for (date, status) with an atomic UPDATE."""
+        if not cls.objects.filter(date=date, status=status).update(count=F('count') + delta):
+            cls.objects.get_or_create(date=date, status=status)
+            cls.objects.filter(date=date, status=status).update(count=F('count') + delta)
+    
+    @classmethod
+    def adjust_many(cls, deltas):
+        """
+        Apply a ``{(date, status): delta}`` mapping, e.g. after bulk_create or bulk_update.
+        
+        Takes one query to add missing rows and one UPDATE per distinct
+        (delta, status), however many dates there are.
+        """
+        groups = defaultdict(list)
+        for (date, status), delta in deltas.items():
+            if delta:
+                groups[(delta, status)].append(date)
+        if not groups:
+            return
+        with transaction.atomic(savepoint=False):
+            cls.objects.bulk_create(
+                [cls(date=date, status=status) for (_, status), dates in groups.items() for date in dates],
+                ignore_conflicts=True
+            )
+            for (delta, status), dates in groups.items():
+                cls.objects.filter(date__in=dates, status=status).update(count=F('count') + delta)
+    
+    def __str__(self):
+        return f"{self.date} {self.status}: {self.count}"
+
+class ScheduleDay(models.Model):
+    """Per-date lock row; bookings update it first so writes on the same day run one at a time."""
+    date = models.DateField(unique=True)
+    version = models.PositiveIntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.date} (v{self.version})"
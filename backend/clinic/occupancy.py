@@ -0,0 +1,122 @@
+"""
+Per-day occupancy bitmaps for availability and conflict checks.
+
+A day's scheduled appointments are summarized as an int with one bit per
+``UNIT_MINUTES`` unit from midnight (288 bits for the whole day). Bit ``i``
+is set when an appointment overlaps minutes ``[5i, 5i + 5)``. Finding free
+slots or checking whether an interval is free is then a couple of masks
+and ANDs instead of a pass over the day's rows.
+
+``get_bits`` covers the clinic-wide lane, the appointments without a chair
+or provider, which is what the single-lane slot endpoints report on and
+what those bookings conflict with. Opening hours come from the caller as
+another bitmap (see ``availability.clinic_hours``).
+
+Units are only ever marked busy too eagerly, never too little. For
+intervals on the 5-minute grid the bitmap is exact. For others, "free" is
+still certain, while "busy" may be a partial unit that has to be confirmed
+in the database.
+
+Bitmaps are kept in the Django cache under a per-date version that
+appointment writes bump (see ``clinic.signals``): once when the row is
+written and again on commit. A miss rebuilds the day with one query. Reads
+inside a transaction don't fill the cache, because they may see changes
+that are later rolled back. With a per-process cache other workers never
+see the bumps, so bitmaps then expire after ``PROCESS_LOCAL_CACHE_TIMEOUT``
+seconds (see ``backend.caching.local_timeout``).
+"""
+import time
+
+from django.core.cache import cache
+from django.db import connection, transaction
+
+from backend.caching import local_timeout
+
+from .models import Appointment
+from .scheduling import SLOT_MINUTES, from_minutes, to_minutes
+
+UNIT_MINUTES = 5
+UNITS_PER_DAY = 24 * 60 // UNIT_MINUTES
+CACHE_TIMEOUT = 24 * 60 * 60
+
+
+def interval_mask(start, end):
+    """Bits of the units overlapping minutes ``[start, end)``, clipped to the day."""
+    first = max(start, 0) // UNIT_MINUTES
+    last = min(-(-end // UNIT_MINUTES), UNITS_PER_DAY)
+    if last <= first:
+        return 0
+    return ((1 << (last - first)) - 1) << first
+
+
+def build(appointments):
+    """Build a day's bitmap from ``(start_time, duration)`` pairs."""
+    bits = 0
+    for start_time, duration in appointments:
+        start = to_minutes(start_time)
+        bits |= interval_mask(start, start + duration)
+    return bits
+
+
+def free_starts(bits, open_bits, duration=SLOT_MINUTES, step=SLOT_MINUTES):
+    """
+    Return the start times, every ``step`` minutes from opening, at which a
+    ``duration``-minute slot lies within ``open_bits`` and clear of ``bits``.
+    """
+    if not open_bits:
+        return []
+    opening = ((open_bits & -open_bits).bit_length() - 1) * UNIT_MINUTES
+    closing = open_bits.bit_length() * UNIT_MINUTES
+    free = open_bits & ~bits
+    starts = []
+    for start in range(opening, closing - duration + 1, step):
+        need = interval_mask(start, start + duration)
+        if free & need == need:
+            starts.append(from_minutes(start))
+    return starts
+
+
+def _version_key(day):
+    return f'clinic:occupancy:{day.isoformat()}:version'
+
+
+def get_bits(day):
+    """Return the bitmap of ``day``'s scheduled clinic-wide appointments, from the cache when possible."""
+    # A fresh, unique version if the key was evicted, so old bitmaps can't come back
+    version = cache.get_or_set(_version_key(day), time.time_ns, None)
+    key = f'clinic:occupancy:{day.isoformat()}:{version}'
+    bits = cache.get(key)
+    if bits is None:
+        bits = build(Appointment.objects.filter(
+            date=day,
+            status=Appointment.STATUS_SCHEDULED,
+            chair__isnull=True,
+            provider__isnull=True
+        ).values_list('start_time', 'duration'))
+        if not connection.in_atomic_block:
+            cache.set(key, bits, local_timeout(CACHE_TIMEOUT))
+    return bits
+
+
+def is_free(day, start_time, duration):
+    """
+    True if no scheduled clinic-wide appointment on ``day`` can overlap the interval.
+
+    False means the interval touches a busy unit; callers that need
+    certainty, or the conflicting appointment, then ask the database.
+    """
+    start = to_minutes(start_time)
+    return not get_bits(day) & interval_mask(start, start + duration)
+
+
+def invalidate(days):
+    """Drop the cached bitmaps of ``days`` now and again when the transaction commits."""
+    days = set(days)
+
+    def bump():
+        cache.set_many({_version_key(day): time.time_ns() for day in days}, None)
+
+    # Now, so readers stop using the old bitmap; on commit, to drop any
+    # bitmap rebuilt from the database before the change was visible
+    bump()
+    transaction.on_commit(bump)
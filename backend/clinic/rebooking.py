@@ -0,0 +1,178 @@
+"""
+Batch rebooking, e.g. of every appointment on a day the clinic had to close.
+
+``plan_rebooking`` packs a set of scheduled appointments into the free time
+of a target date window, in memory. The window's bookings are read with one
+query and its opening hours come from ``availability.WorkingCalendar``, so
+holidays and breaks are respected. Each lane's free time per day is an
+occupancy bitmap (see ``clinic.occupancy``).
+
+Packing is first-fit decreasing. The longest appointments are placed first,
+each on the earliest day with room, at the free start closest to its
+original time of day. Each placement marks its units busy before the next
+appointment is tried. Appointments keep their chair and provider; those
+without either go on the clinic-wide lane.
+
+``rebook`` returns the plan as a preview, or applies it. To apply it, the
+window's days are locked, the plan is recomputed under the locks so it
+can't clash with bookings made since the preview, and the moves are
+written with one ``bulk_update``.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import occupancy
+from .availability import WorkingCalendar
+from .models import Appointment, AppointmentDayCount
+from .occupancy import interval_mask
+from .scheduling import SLOT_MINUTES, from_minutes, lock_days, to_minutes
+
+MAX_APPOINTMENTS = 500
+
+
+def _lanes(chair_id, provider_id):
+    """Bitmap keys an appointment occupies."""
+    if chair_id is None and provider_id is None:
+        return [('lane', None)]
+    lanes = []
+    if chair_id is not None:
+        lanes.append(('chair', chair_id))
+    if provider_id is not None:
+        lanes.append(('provider', provider_id))
+    return lanes
+
+
+def plan_rebooking(appointments, start_date, end_date, step=SLOT_MINUTES):
+    """
+    Return ``(moves, unplaced)`` for fitting ``appointments`` between the two dates.
+
+    ``moves`` is a list of ``(appointment, date, start_time)``, in the order
+    the appointments were placed; ``unplaced`` lists the appointments that
+    didn't fit anywhere in the window.
+    """
+    appointments = list(appointments)
+    moving_ids = [appointment.id for appointment in appointments]
+    provider_ids = {appointment.provider_id for appointment in appointments} - {None}
+    calendar = WorkingCalendar(start_date, end_date, provider_ids)
+
+    booked = defaultdict(int)
+    rows = Appointment.objects.filter(
+        date__gte=start_date,
+        date__lte=end_date,
+        status=Appointment.STATUS_SCHEDULED
+    ).exclude(id__in=moving_ids).values_list('date', 'start_time', 'duration', 'chair_id', 'provider_id')
+    for day, start_time, duration, chair_id, provider_id in rows:
+        start = to_minutes(start_time)
+        bits = interval_mask(start, start + duration)
+        for lane in _lanes(chair_id, provider_id):
+            booked[(lane, day)] |= bits
+
+    free = {}
+
+    def free_bits(lane, day):
+        if (lane, day) not in free:
+            kind, resource_id = lane
+            open_bits = calendar.provider(resource_id, day) if kind == 'provider' else calendar.clinic(day)
+            free[(lane, day)] = open_bits & ~booked[(lane, day)]
+        return free[(lane, day)]
+
+    days = [start_date + timedelta(days=offset) for offset in range((end_date - start_date).days + 1)]
+    moves = []
+    unplaced = []
+    for appointment in sorted(appointments, key=lambda a: (-a.duration, a.date, a.start_time, a.id)):
+        lanes = _lanes(appointment.chair_id, appointment.provider_id)
+        original = to_minutes(appointment.start_time)
+        starts = sorted(
+            range(0, 24 * 60 - appointment.duration + 1, step),
+            key=lambda start: (abs(start - original), start)
+        )
+        placement = None
+        for day in days:
+            available = -1
+            for lane in lanes:
+                available &= free_bits(lane, day)
+            if not available:
+                continue
+            for start in starts:
+                need = interval_mask(start, start + appointment.duration)
+                if available & need == need:
+                    placement = day, start, need
+                    break
+            if placement:
+                break
+
+        if placement is None:
+            unplaced.append(appointment)
+            continue
+        day, start, need = placement
+        for lane in lanes:
+            free[(lane, day)] &= ~need
+        moves.append((appointment, day, from_minutes(start)))
+    return moves, unplaced
+
+
+def _apply(moves):
+    """Write ``moves`` with one bulk_update and refresh the summaries it bypasses."""
+    deltas = defaultdict(int)
+    days = set()
+    now = timezone.now()
+    for appointment, day, start_time in moves:
+        deltas[(appointment.date, appointment.status)] -= 1
+        deltas[(day, appointment.status)] += 1
+        days.update((appointment.date, day))
+        appointment.date = day
+        appointment.start_time = start_time
+        appointment.updated_at = now
+    Appointment.objects.bulk_update([appointment for appointment, _, _ in moves], ['date', 'start_time', 'updated_at'])
+    # bulk_update sends no post_save, so update the day counts and bitmaps here
+    AppointmentDayCount.adjust_many(deltas)
+    occupancy.invalidate(days)
+
+
+def _report(moves, unplaced, committed):
+    return {
+        'committed': committed,
+        'moved': [
+            {
+                'id': appointment.id,
+                'patient': appointment.patient_id,
+                'patient_name': appointment.patient.name,
+                'from_date': appointment.date.strftime('%Y-%m-%d'),
+                'from_time': appointment.start_time.strftime('%I:%M %p'),
+                'date': day.strftime('%Y-%m-%d'),
+                'start_time': start_time.isoformat(),
+                'time': start_time.strftime('%I:%M %p'),
+                'duration': appointment.duration,
+                'chair': appointment.chair_id,
+                'provider': appointment.provider_id,
+            }
+            for appointment, day, start_time in sorted(moves, key=lambda move: (move[1], move[2], move[0].id))
+        ],
+        'unplaced': [
+            {'id': appointment.id, 'patient_name': appointment.patient.name, 'duration': appointment.duration}
+            for appointment in unplaced
+        ],
+    }
+
+
+def rebook(appointments, start_date, end_date, commit=False, step=SLOT_MINUTES):
+    """
+    Plan, and with ``commit`` apply, moving the scheduled ``appointments``
+    (a queryset) into the window. Returns a report of the moves and of the
+    appointments that didn't fit.
+    """
+    appointments = appointments.filter(status=Appointment.STATUS_SCHEDULED).select_related('patient')
+    if not commit:
+        return _report(*plan_rebooking(appointments, start_date, end_date, step=step), committed=False)
+
+    with transaction.atomic():
+        lock_days(start_date + timedelta(days=offset) for offset in range((end_date - start_date).days + 1))
+        # Read again under the locks, so the plan matches what is written
+        moves, unplaced = plan_rebooking(appointments.select_for_update(), start_date, end_date, step=step)
+        report = _report(moves, unplaced, committed=True)
+        if moves:
+            _apply(moves)
+    return report
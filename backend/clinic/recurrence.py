@@ -0,0 +1,190 @@
+"""
+Expansion of recurring appointment series into concrete appointments.
+
+``occurrences`` follows RRULE semantics for the frequencies we support. A
+monthly series on the 31st skips months without one, and skipped dates
+don't count towards ``count``.
+
+``materialize`` creates the appointments for a stretch of a series at once,
+with a fixed number of queries. It locks the days (``lock_days``), then runs
+one range query for the bookings that could clash and reads the opening
+hours (``availability.WorkingCalendar``). Every occurrence is checked in
+memory. The rows are written with one ``bulk_create``. Series without an end
+are only materialized a number of weeks ahead, and the
+``materialize_series`` command rolls them forward, so the appointment table
+doesn't fill up with far-future rows.
+"""
+import calendar
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Q
+
+from . import occupancy
+from .availability import WorkingCalendar
+from .models import Appointment, AppointmentDayCount, AppointmentSeries
+from .occupancy import interval_mask
+from .scheduling import lock_days, to_minutes
+
+DEFAULT_WEEKS = 12
+MAX_WEEKS = 104
+MAX_OCCURRENCES = 400
+
+
+class ConflictError(ValueError):
+    """Some occurrences clash with bookings or fall outside opening hours."""
+
+    def __init__(self, conflicts):
+        super().__init__(f"{len(conflicts)} occurrence(s) conflict")
+        self.conflicts = conflicts
+
+
+def _add_months(day, months):
+    month_index = day.month - 1 + months
+    year, month = day.year + month_index // 12, month_index % 12 + 1
+    if day.day > calendar.monthrange(year, month)[1]:
+        return None
+    return day.replace(year=year, month=month)
+
+
+def _last_date(series, through):
+    ends = [day for day in (through, series.until) if day is not None]
+    return min(ends) if ends else None
+
+
+def occurrences(series, through=None):
+    """
+    Yield the dates of ``series`` up to ``through`` (inclusive) and its own
+    ``until``/``count``, earliest first. Open-ended series need ``through``.
+    """
+    last = _last_date(series, through)
+    if last is None and series.count is None:
+        raise ValueError("An open-ended series needs an end date to expand to")
+    if series.interval < 1:
+        raise ValueError("The interval must be at least 1")
+    produced = 0
+    step = 0
+    while series.count is None or produced < series.count:
+        if series.frequency == AppointmentSeries.FREQ_MONTHLY:
+            day = _add_months(series.start_date, step * series.interval)
+        else:
+            days = 7 if series.frequency == AppointmentSeries.FREQ_WEEKLY else 1
+            day = series.start_date + timedelta(days=step * series.interval * days)
+        step += 1
+        if day is None:
+            continue
+        if last is not None and day > last:
+            return
+        produced += 1
+        yield day
+
+
+def horizon(series, weeks, today):
+    """
+    Date to materialize ``series`` through: the end of the next ``weeks``
+    weeks from today or its start. Without ``weeks``, a series with an end
+    is expanded in full (None) and an open-ended one DEFAULT_WEEKS ahead.
+    """
+    if weeks is None:
+        if series.until is not None or series.count is not None:
+            return None
+        weeks = DEFAULT_WEEKS
+    return max(today, series.start_date) + timedelta(weeks=weeks) - timedelta(days=1)
+
+
+def find_conflicts(series, dates):
+    """
+    Return ``[{'date', 'reason'}]`` for the ``dates`` on which the series'
+    interval is closed or overlaps a scheduled appointment on its chair,
+    provider or, without either, the clinic-wide lane.
+    """
+    start = to_minutes(series.start_time)
+    end = start + series.duration
+    need = interval_mask(start, end)
+    hours = WorkingCalendar(dates[0], dates[-1], [series.provider_id] if series.provider_id else [])
+
+    appointments = Appointment.objects.filter(
+        date__gte=dates[0],
+        date__lte=dates[-1],
+        status=Appointment.STATUS_SCHEDULED
+    )
+    if series.chair_id is None and series.provider_id is None:
+        appointments = appointments.filter(chair__isnull=True, provider__isnull=True)
+    else:
+        shared = Q()
+        if series.chair_id is not None:
+            shared |= Q(chair=series.chair_id)
+        if series.provider_id is not None:
+            shared |= Q(provider=series.provider_id)
+        appointments = appointments.filter(shared)
+    booked = defaultdict(list)
+    for day, start_time, duration, name in appointments.values_list('date', 'start_time', 'duration', 'patient__name'):
+        booked[day].append((to_minutes(start_time), duration, name))
+
+    conflicts = []
+    for day in dates:
+        open_bits = hours.provider(series.provider_id, day) if series.provider_id else hours.clinic(day)
+        if open_bits & need != need:
+            conflicts.append({'date': day, 'reason': "The clinic or provider is not working at this time"})
+            continue
+        for booked_start, duration, name in sorted(booked[day]):
+            if booked_start < end and booked_start + duration > start:
+                conflicts.append({'date': day, 'reason': f"Overlaps with an existing appointment for {name}"})
+                break
+    return conflicts
+
+
+def materialize(series, through=None, skip_conflicts=False):
+    """
+    Create the appointments of ``series`` after ``materialized_until``, up to
+    ``through`` or the series' end.
+
+    Raises ConflictError, creating nothing, if any occurrence conflicts;
+    with ``skip_conflicts`` those occurrences are left out instead. Raises
+    ValueError for more than MAX_OCCURRENCES at once. Returns a report of
+    what was created and skipped.
+    """
+    after = series.materialized_until
+    dates = []
+    for day in occurrences(series, through):
+        if after is None or day > after:
+            dates.append(day)
+            if len(dates) > MAX_OCCURRENCES:
+                raise ValueError(f"Materialize at most {MAX_OCCURRENCES} occurrences at a time")
+
+    report = {'created': 0, 'skipped': []}
+    with transaction.atomic():
+        if dates:
+            lock_days(dates)
+            conflicts = find_conflicts(series, dates)
+            if conflicts and not skip_conflicts:
+                raise ConflictError(conflicts)
+            skipped = {conflict['date'] for conflict in conflicts}
+            appointments = Appointment.objects.bulk_create([
+                Appointment(
+                    patient_id=series.patient_id,
+                    appointment_type_id=series.appointment_type_id,
+                    chair_id=series.chair_id,
+                    provider_id=series.provider_id,
+                    series=series,
+                    date=day,
+                    start_time=series.start_time,
+                    duration=series.duration,
+                    notes=series.notes
+                )
+                for day in dates if day not in skipped
+            ])
+            # bulk_create sends no post_save, so update the day counts and bitmaps here
+            AppointmentDayCount.adjust_many(Counter(
+                (appointment.date, appointment.status) for appointment in appointments
+            ))
+            occupancy.invalidate(appointment.date for appointment in appointments)
+            report = {'created': len(appointments), 'skipped': conflicts}
+
+        # Occurrences up to here are done; a count-limited series ends at its last date
+        covered = _last_date(series, through) or (dates[-1] if dates else after)
+        if covered is not None and (after is None or covered > after):
+            series.materialized_until = covered
+            series.save(update_fields=['materialized_until', 'updated_at'])
+    return {**report, 'materialized_until': series.materialized_until}
@@ -0,0 +1,157 @@
+"""
+Time helpers, default clinic hours, booking locks and the conflict query.
+
+Appointments are handled as half-open ``[start, end)`` intervals measured in
+minutes from midnight. Booking-time conflict checks run in the database (see
+``find_conflicting_appointment``) under the per-day lock taken by ``lock_day``.
+The hours below are the defaults ``availability.WorkingCalendar`` uses for a
+clinic without configured ``WorkingHours``.
+
+The slot endpoints use the bitmaps in ``clinic.occupancy`` with the calendar's
+opening hours. The interval sweep here (``merge_intervals`` through
+``free_slots``) is not used by the application. It is kept as the reference
+implementation that the occupancy tests and ``benchmarks/occupancy.py`` check
+``occupancy.free_starts`` against, for the default hours only.
+"""
+from datetime import time
+from django.db.models import F, Q
+from django.db.models.functions import ExtractHour, ExtractMinute
+from .models import Appointment, ScheduleDay
+
+# Clinic hours (9 AM to 5 PM) with a lunch break (1 PM - 2 PM)
+CLINIC_OPEN = time(9, 0)
+CLINIC_CLOSE = time(17, 0)
+LUNCH_START = time(13, 0)
+LUNCH_END = time(14, 0)
+SLOT_MINUTES = 30
+
+
+def to_minutes(value):
+    """Convert a time to minutes since midnight."""
+    return value.hour * 60 + value.minute
+
+
+def from_minutes(minutes):
+    """Convert minutes since midnight back to a time."""
+    return time(minutes // 60, minutes % 60)
+
+
+def merge_intervals(intervals):
+    """Sort ``(start, end)`` minute intervals and merge the ones that overlap or touch."""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
+
+
+def booked_intervals(appointments):
+    """Build merged minute intervals from ``(start_time, duration)`` pairs."""
+    return merge_intervals(
+        (to_minutes(start_time), to_minutes(start_time) + duration)
+        for start_time, duration in appointments
+    )
+
+
+def slot_grid(slot_minutes=SLOT_MINUTES):
+    """Return the start minute of every bookable slot in the clinic day."""
+    breaks = [(to_minutes(LUNCH_START), to_minutes(LUNCH_END))]
+    grid = []
+    start = to_minutes(CLINIC_OPEN)
+    close = to_minutes(CLINIC_CLOSE)
+    while start < close:
+        if not any(break_start <= start < break_end for break_start, break_end in breaks):
+            grid.append(start)
+        start += slot_minutes
+    return grid
+
+
+def free_slots(appointments, slot_minutes=SLOT_MINUTES):
+    """
+    Return the start times of default-hours grid slots that don't overlap any
+    appointment. Reference for ``occupancy.free_starts``; not used to serve requests.
+
+    ``appointments`` is an iterable of ``(start_time, duration)`` pairs.
+    """
+    booked = booked_intervals(appointments)
+    available = []
+    index = 0
+    for start in slot_grid(slot_minutes):
+        end = start + slot_minutes
+        # Booked intervals are sorted, so skip the ones that end before this slot
+        while index < len(booked) and booked[index][1] <= start:
+            index += 1
+        if index < len(booked) and booked[index][0] < end:
+            continue
+        available.append(from_minutes(start))
+    return available
+
+
+def end_minute_expression():
+    """SQL expression for an appointment's end as minutes since midnight."""
+    return ExtractHour('start_time') * 60 + ExtractMinute('start_time') + F('duration')
+
+
+def lock_day(date):
+    """
+    Serialize bookings on ``date`` until the current transaction ends.
+
+    Must be called inside ``transaction.atomic()``. The UPDATE takes a row lock
+    on the date's ScheduleDay (and the write lock on SQLite) before anything
+    is read, so concurrent bookings for the same day queue up behind it.
+    """
+    if not ScheduleDay.objects.filter(date=date).update(version=F('version') + 1):
+        ScheduleDay.objects.get_or_create(date=date)
+        ScheduleDay.objects.filter(date=date).update(version=F('version') + 1)
+
+
+def lock_days(dates):
+    """
+    ``lock_day`` for many dates with a fixed number of queries.
+
+    The rows are locked in date order, so two batches that share days can't
+    deadlock on each other.
+    """
+    dates = sorted(set(dates))
+    ScheduleDay.objects.bulk_create([ScheduleDay(date=date) for date in dates], ignore_conflicts=True)
+    locked = ScheduleDay.objects.select_for_update().filter(date__in=dates).order_by('date')
+    ScheduleDay.objects.filter(id__in=list(locked.values_list('id', flat=True))).update(version=F('version') + 1)
+
+
+def find_conflicting_appointment(date, start_time, duration, exclude_id=None, chair=None, provider=None):
+    """
+    Return the earliest scheduled appointment overlapping the given interval, or None.
+    
+    With a ``chair`` or ``provider`` only appointments using the same chair or
+    provider conflict. Without either, the booking is on the single
+    clinic-wide lane and conflicts with other appointments without resources.
+    """
+    start = to_minutes(start_time)
+    end = start + duration
+    
+    appointments = Appointment.objects.filter(
+        date=date,
+        status=Appointment.STATUS_SCHEDULED
+    )
+    if chair is None and provider is None:
+        appointments = appointments.filter(chair__isnull=True, provider__isnull=True)
+    else:
+        shared = Q()
+        if chair is not None:
+            shared |= Q(chair=chair)
+        if provider is not None:
+            shared |= Q(provider=provider)
+        appointments = appointments.filter(shared)
+    if end < 24 * 60:
+        appointments = appointments.filter(start_time__lt=from_minutes(end))
+    if exclude_id is not None:
+        appointments = appointments.exclude(id=exclude_id)
+    
+    return appointments.annotate(
+        end_minute=end_minute_expression()
+    ).filter(
+        end_minute__gt=start
+    ).select_related('patient').order_by('start_time').first()
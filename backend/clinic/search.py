@@ -0,0 +1,191 @@
+"""
+Patient search over name, email, phone and date of birth.
+
+Queries are split into normalized terms and every term must prefix-match a
+token of the patient, so "jan do" finds "Jane Doe" while it is being typed.
+Phone numbers are compared by their digits only.
+
+The backend is chosen with the ``PATIENT_SEARCH_BACKEND`` setting:
+
+* ``SQLiteFTSBackend`` uses an FTS5 table kept current by triggers (see
+  migration 0006) and ranks with bm25, weighting name matches highest.
+* ``TokenSearchBackend`` works on any database: it stores one indexed row per
+  patient token and answers prefixes with index range scans. It is kept
+  current by Patient signals; run ``manage.py rebuild_patient_search_index``
+  after switching to it.
+"""
+import operator
+import re
+import unicodedata
+from functools import reduce
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, Count, IntegerField, Q, Sum, Value, When
+from django.utils.module_loading import import_string
+
+from .models import Patient, PatientSearchToken
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+# Rows for the FTS table, matching what the triggers from migration 0006 insert
+FTS_SOURCE_SQL = (
+    "SELECT id, name, coalesce(email, ''), "
+    "replace(replace(replace(replace(replace(replace(coalesce(phone, ''), "
+    "' ', ''), '-', ''), '(', ''), ')', ''), '+', ''), '.', ''), "
+    "coalesce(date_of_birth, '') FROM clinic_patient"
+)
+
+DATE_RE = re.compile(r'^\d{4}-\d{1,2}-\d{1,2}$')
+PHONE_RE = re.compile(r'^[\d\s\-\(\)\+\.]+$')
+
+
+def normalize(text):
+    """Lowercase and strip accents, so "José" and "jose" compare equal."""
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return ''.join(char for char in decomposed if not unicodedata.combining(char)).lower()
+
+
+def tokenize(text):
+    return re.findall(r'\w+', normalize(text))
+
+
+def phone_digits(phone):
+    return re.sub(r'\D', '', phone or '')
+
+
+def query_terms(query):
+    """
+    Split a search query into prefix terms; phone-like queries collapse to
+    their digits. Repeated terms and terms that prefix another are dropped,
+    since a token matching the longer term matches them too.
+    """
+    query = (query or '').strip()
+    if PHONE_RE.match(query) and not DATE_RE.match(query):
+        digits = phone_digits(query)
+        return [digits] if digits else []
+    terms = tokenize(query)
+    return [
+        term for term in dict.fromkeys(terms)
+        if not any(other != term and other.startswith(term) for other in terms)
+    ]
+
+
+def patient_tokens(patient):
+    """Every token a patient can be found by."""
+    tokens = set(tokenize(patient.name))
+    tokens.update(tokenize(patient.email))
+    tokens.update(tokenize(patient.date_of_birth.isoformat() if patient.date_of_birth else ''))
+    digits = phone_digits(patient.phone)
+    if digits:
+        tokens.add(digits)
+    return {token[:PatientSearchToken.TOKEN_LENGTH] for token in tokens}
+
+
+class SearchBackend:
+    """Interface for patient search backends."""
+
+    def search(self, query, limit=DEFAULT_LIMIT):
+        """Return up to ``limit`` patients matching ``query``, best match first."""
+        raise NotImplementedError
+
+    def index(self, patient):
+        """Called after a patient is saved."""
+    
+    def index_many(self, patients):
+        """Called after patients are created with ``bulk_create``, which sends no signals."""
+        for patient in patients:
+            self.index(patient)
+
+    def rebuild(self):
+        """Re-index every patient."""
+
+
+class TokenSearchBackend(SearchBackend):
+    def search(self, query, limit=DEFAULT_LIMIT):
+        terms = query_terms(query)[:8]
+        if not terms:
+            return []
+
+        # Tag each matching token row with the query term it satisfies; a prefix
+        # match is an index range scan on token. A row gets only the first term it
+        # matches, which is why query_terms drops terms that prefix another
+        ranges = [Q(token__gte=term, token__lt=term + '\uffff') for term in terms]
+        matches = PatientSearchToken.objects.filter(
+            reduce(operator.or_, ranges)
+        ).annotate(
+            term=Case(*[When(condition, then=Value(i)) for i, condition in enumerate(ranges)]),
+            exact=Case(When(token__in=terms, then=Value(1)), default=Value(0), output_field=IntegerField()),
+        ).values('patient_id').annotate(
+            matched=Count('term', distinct=True),
+            score=Sum('exact'),
+        ).filter(matched=len(terms)).order_by('-score', 'patient_id')
+
+        ids = list(matches.values_list('patient_id', flat=True)[:limit])
+        patients = Patient.objects.in_bulk(ids)
+        return [patients[patient_id] for patient_id in ids if patient_id in patients]
+
+    def index(self, patient):
+        with transaction.atomic(savepoint=False):
+            PatientSearchToken.objects.filter(patient_id=patient.pk).delete()
+            PatientSearchToken.objects.bulk_create(
+                PatientSearchToken(patient_id=patient.pk, token=token) for token in patient_tokens(patient)
+            )
+
+    def index_many(self, patients):
+        # New patients have no tokens yet, so there is nothing to delete first
+        PatientSearchToken.objects.bulk_create(
+            PatientSearchToken(patient_id=patient.pk, token=token)
+            for patient in patients for token in patient_tokens(patient)
+        )
+    
+    def rebuild(self):
+        with transaction.atomic():
+            PatientSearchToken.objects.all().delete()
+            batch = []
+            for patient in Patient.objects.iterator(chunk_size=2000):
+                batch.extend(PatientSearchToken(patient_id=patient.pk, token=token) for token in patient_tokens(patient))
+                if len(batch) >= 5000:
+                    PatientSearchToken.objects.bulk_create(batch)
+                    batch = []
+            PatientSearchToken.objects.bulk_create(batch)
+
+
+class SQLiteFTSBackend(SearchBackend):
+    """FTS5 search; the index table and its triggers are created by migration 0006."""
+    table = 'clinic_patient_fts'
+    # bm25 column weights: name, email, phone, date_of_birth
+    weights = (10.0, 2.0, 4.0, 1.0)
+
+    def search(self, query, limit=DEFAULT_LIMIT):
+        terms = query_terms(query)[:8]
+        if not terms:
+            return []
+        # Every term must prefix-match; listing the exact token too ranks whole-word matches first
+        match = ' AND '.join(f'("{term}" OR "{term}"*)' for term in terms)
+        patient_table = Patient._meta.db_table
+        return list(Patient.objects.raw(
+            f'SELECT {patient_table}.* FROM {self.table} '
+            f'JOIN {patient_table} ON {patient_table}.id = {self.table}.rowid '
+            f'WHERE {self.table} MATCH %s '
+            f'ORDER BY bm25({self.table}, {", ".join(map(str, self.weights))}), {patient_table}.id '
+            f'LIMIT %s',
+            [match, limit]
+        ))
+
+    def rebuild(self):
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+            cursor.execute(f'INSERT INTO {self.table}(rowid, name, email, phone, date_of_birth) {FTS_SOURCE_SQL}')
+
+
+_backends = {}
+
+
+def get_backend():
+    """Return the configured search backend instance."""
+    path = getattr(settings, 'PATIENT_SEARCH_BACKEND', 'clinic.search.TokenSearchBackend')
+    if path not in _backends:
+        _backends[path] = import_string(path)()
+    return _backends[path]
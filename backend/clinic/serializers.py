@@ -1,7 +1,13 @@
 # clinic/serializers.py
 from rest_framework import serializers
-from .models import Patient, AppointmentType, Appointment
-from datetime import datetime, timedelta
+from django.db import transaction
+from .models import (
+    Patient, AppointmentType, Appointment, AppointmentSeries, Chair, Provider, WorkingHours, Break, Holiday
+)
+from . import availability, occupancy
+from .occupancy import interval_mask
+from .scheduling import end_minute_expression, find_conflicting_appointment, from_minutes, lock_day, to_minutes
+from functools import lru_cache
 
 class PatientSerializer(serializers.ModelSerializer):
     class Meta:
@@ -13,6 +19,74 @@ class AppointmentTypeSerializer(serializers.ModelSerializer):
         model = AppointmentType
         fields = '__all__'
 
+class ChairSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Chair
+        fields = '__all__'
+
+class ProviderSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Provider
+        fields = '__all__'
+
+class TimeRangeValidationMixin:
+    def validate(self, data):
+        start_time = data.get('start_time', getattr(self.instance, 'start_time', None))
+        end_time = data.get('end_time', getattr(self.instance, 'end_time', None))
+        if start_time is not None and end_time is not None and end_time <= start_time:
+            raise serializers.ValidationError("end_time must be after start_time")
+        return data
+
+class WorkingHoursSerializer(TimeRangeValidationMixin, serializers.ModelSerializer):
+    class Meta:
+        model = WorkingHours
+        fields = '__all__'
+
+class BreakSerializer(TimeRangeValidationMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Break
+        fields = '__all__'
+
+class HolidaySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Holiday
+        fields = '__all__'
+
+class AppointmentSeriesSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = AppointmentSeries
+        fields = '__all__'
+        read_only_fields = ['materialized_until']
+    
+    def validate(self, data):
+        def value(field):
+            return data[field] if field in data else getattr(self.instance, field, None)
+        
+        if value('until') is not None and value('count') is not None:
+            raise serializers.ValidationError("Set until or count, not both")
+        if value('until') is not None and value('until') < value('start_date'):
+            raise serializers.ValidationError("until must not be before start_date")
+        if value('interval') is not None and value('interval') < 1:
+            raise serializers.ValidationError("interval must be at least 1")
+        if value('count') is not None and value('count') < 1:
+            raise serializers.ValidationError("count must be at least 1")
+        if value('duration') is not None and value('duration') <= 0:
+            raise serializers.ValidationError("duration must be positive")
+        return data
+
+@lru_cache(maxsize=4096)
+def format_times(start_time, end_minute):
+    """
+    Return ``(start_time, end_time, time, endTime)`` strings for an appointment.
+    
+    Appointments start on a handful of slot times, so this is nearly always a
+    cache hit instead of four formatting calls per row.
+    """
+    end_time = from_minutes(end_minute % (24 * 60)).replace(
+        second=start_time.second, microsecond=start_time.microsecond
+    )
+    return start_time.isoformat(), end_time.isoformat(), start_time.strftime('%I:%M %p'), end_time.strftime('%I:%M %p')
+
 class AppointmentSerializer(serializers.ModelSerializer):
     patient_name = serializers.CharField(source='patient.name', read_only=True)
     appointment_type_name = serializers.CharField(source='appointment_type.name', read_only=True)
@@ -22,50 +96,133 @@ class AppointmentSerializer(serializers.ModelSerializer):
         model = Appointment
         fields = [
             'id', 'patient', 'patient_name', 'appointment_type', 'appointment_type_name',
-            'date', 'start_time', 'end_time', 'duration', 'notes', 'status',
+            'chair', 'provider', 'series', 'date', 'start_time', 'end_time', 'duration', 'notes', 'status',
             'created_at', 'updated_at'
         ]
     
+    @staticmethod
+    def optimize_queryset(queryset):
+        """Join the related names and compute end times in the query, as to_representation expects."""
+        return queryset.select_related('patient', 'appointment_type').annotate(end_minute=end_minute_expression())
+    
     def to_representation(self, instance):
-        representation = super().to_representation(instance)
-        # Format time strings to match the frontend expected format
-        if 'start_time' in representation:
-            time_obj = datetime.strptime(representation['start_time'], '%H:%M:%S').time()
-            representation['time'] = time_obj.strftime('%I:%M %p')  # e.g., "09:00 AM"
-        if 'end_time' in representation:
-            time_obj = datetime.strptime(representation['end_time'], '%H:%M:%S').time()
-            representation['endTime'] = time_obj.strftime('%I:%M %p')  # e.g., "09:30 AM"
+        # Built by hand rather than field by field; this runs for every row of
+        # the calendar views. Keys and formats match the declared fields.
+        end_minute = getattr(instance, 'end_minute', None)
+        if end_minute is None:
+            end_minute = to_minutes(instance.start_time) + instance.duration
+        start_time, end_time, start_label, end_label = format_times(instance.start_time, end_minute)
+        datetime_field = self.fields['created_at']
+        
+        representation = {
+            'id': instance.id,
+            'patient': instance.patient_id,
+            'patient_name': instance.patient.name,
+            'appointment_type': instance.appointment_type_id,
+        }
+        if instance.appointment_type_id is not None:
+            representation['appointment_type_name'] = instance.appointment_type.name
+        representation.update({
+            'chair': instance.chair_id,
+            'provider': instance.provider_id,
+            'series': instance.series_id,
+            'date': instance.date.isoformat(),
+            'start_time': start_time,
+            'end_time': end_time,
+            'duration': instance.duration,
+            'notes': instance.notes,
+            'status': instance.status,
+            'created_at': datetime_field.to_representation(instance.created_at),
+            'updated_at': datetime_field.to_representation(instance.updated_at),
+            # Format time strings to match the frontend expected format, e.g. "09:00 AM"
+            'time': start_label,
+            'endTime': end_label,
+        })
         return representation
 
 class AppointmentCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Appointment
-        fields = ['patient', 'appointment_type', 'date', 'start_time', 'duration', 'notes']
+        fields = ['patient', 'appointment_type', 'chair', 'provider', 'date', 'start_time', 'duration', 'notes']
     
     def validate(self, data):
         """
-        Validate that the appointment doesn't conflict with existing appointments.
+        Validate that the appointment fits the working hours and its chair and
+        provider, and doesn't conflict with existing appointments.
         """
-        start_datetime = datetime.combine(data['date'], data['start_time'])
-        end_datetime = start_datetime + timedelta(minutes=data['duration'])
-        
-        # Check for overlapping appointments
-        overlapping = Appointment.objects.filter(
-            date=data['date'],
-            status=Appointment.STATUS_SCHEDULED
-        ).exclude(id=self.instance.id if self.instance else None)
-        
-        for appt in overlapping:
-            appt_start = datetime.combine(appt.date, appt.start_time)
-            appt_end = appt_start + timedelta(minutes=appt.duration)
-            
-            # Check if appointments overlap
-            if (start_datetime < appt_end and end_datetime > appt_start):
-                raise serializers.ValidationError(
-                    f"This appointment overlaps with an existing appointment for {appt.patient.name}"
-                )
-        
+        self.check_availability(data)
+        self.check_overlap(data, use_occupancy=True)
         return data
+    
+    def value(self, data, field):
+        """``field`` as the booking will be saved: from ``data``, else from the instance being updated."""
+        return data[field] if field in data else getattr(self.instance, field, None)
+    
+    def check_availability(self, data):
+        """
+        Raise a ValidationError for a booking the availability endpoints would
+        never offer: outside working hours, on a break or holiday, on an
+        inactive chair, or with an inactive or unqualified provider.
+        """
+        date, start_time, duration = (self.value(data, field) for field in ('date', 'start_time', 'duration'))
+        chair, provider = self.value(data, 'chair'), self.value(data, 'provider')
+        appointment_type = self.value(data, 'appointment_type')
+        if chair is not None and not chair.is_active:
+            raise serializers.ValidationError(f"Chair {chair.name} is not in use")
+        if provider is not None:
+            if not provider.is_active:
+                raise serializers.ValidationError(f"{provider.name} is not taking appointments")
+            if appointment_type is not None and not Provider.objects.filter(
+                availability.performs(appointment_type), pk=provider.pk
+            ).exists():
+                raise serializers.ValidationError(f"{provider.name} does not perform {appointment_type.name}")
+            open_bits = availability.WorkingCalendar(date, date, [provider.id]).provider(provider.id, date)
+        else:
+            open_bits = availability.clinic_hours(date)
+        start = to_minutes(start_time)
+        need = interval_mask(start, start + duration)
+        if open_bits & need != need:
+            raise serializers.ValidationError("The clinic or provider is not working at this time")
+    
+    def check_overlap(self, data, use_occupancy=False):
+        """
+        Raise a ValidationError if the booking overlaps a scheduled appointment.
+        
+        With ``use_occupancy`` the cached day bitmap settles the common, free
+        case for bookings on the clinic-wide lane; a possible overlap is still
+        looked up in the database. The re-check under the day lock always
+        reads the database.
+        """
+        date, start_time, duration = (self.value(data, field) for field in ('date', 'start_time', 'duration'))
+        chair, provider = self.value(data, 'chair'), self.value(data, 'provider')
+        # The bitmap only covers the clinic-wide lane
+        if use_occupancy and chair is None and provider is None and occupancy.is_free(date, start_time, duration):
+            return
+        conflict = find_conflicting_appointment(
+            date,
+            start_time,
+            duration,
+            exclude_id=self.instance.id if self.instance else None,
+            chair=chair,
+            provider=provider,
+        )
+        if conflict is not None:
+            raise serializers.ValidationError(
+                f"This appointment overlaps with an existing appointment for {conflict.patient.name}"
+            )
+    
+    def create(self, validated_data):
+        # Re-check under the day lock so concurrent bookings can't both pass validate()
+        with transaction.atomic():
+            lock_day(validated_data['date'])
+            self.check_overlap(validated_data)
+            return super().create(validated_data)
+    
+    def update(self, instance, validated_data):
+        with transaction.atomic():
+            lock_day(validated_data.get('date', instance.date))
+            self.check_overlap(validated_data)
+            return super().update(instance, validated_data)
 
 class AppointmentCountSerializer(serializers.Serializer):
     date = serializers.DateField()
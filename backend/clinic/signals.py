@@ -0,0 +1,50 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from backend.caching import invalidate_model
+from . import autocomplete, availability, occupancy
+from .models import Patient, AppointmentType, Appointment, AppointmentDayCount, WorkingHours, Break, Holiday
+from .search import get_backend
+
+
+@receiver(post_delete, sender=Appointment)
+def decrement_day_count(sender, instance, **kwargs):
+    # Runs for instance deletes, queryset deletes and patient cascades alike
+    AppointmentDayCount.adjust(instance.date, instance.status, -1)
+
+
+@receiver([post_save, post_delete], sender=Appointment)
+def invalidate_occupancy(sender, instance, **kwargs):
+    # Status, time and duration changes all affect the day; a move affects two
+    occupancy.invalidate({instance.date, getattr(instance, '_previous_date', None) or instance.date})
+
+
+@receiver(post_save, sender=Patient)
+def index_patient(sender, instance, **kwargs):
+    # Deletes need no hook: search tokens cascade and the FTS table has a trigger
+    get_backend().index(instance)
+
+
+@receiver(post_save, sender=Patient)
+def autocomplete_patient_saved(sender, instance, **kwargs):
+    # The in-memory index can't roll back, so only apply committed changes
+    patient_id, name, phone = instance.pk, instance.name, instance.phone
+    transaction.on_commit(lambda: autocomplete.patient_saved(patient_id, name, phone))
+
+
+@receiver(post_delete, sender=Patient)
+def autocomplete_patient_deleted(sender, instance, **kwargs):
+    patient_id = instance.pk
+    transaction.on_commit(lambda: autocomplete.patient_deleted(patient_id))
+
+
+@receiver([post_save, post_delete], sender=AppointmentType)
+def invalidate_reference_cache(sender, **kwargs):
+    invalidate_model(sender)
+
+
+@receiver([post_save, post_delete], sender=WorkingHours)
+@receiver([post_save, post_delete], sender=Break)
+@receiver([post_save, post_delete], sender=Holiday)
+def invalidate_clinic_hours(sender, **kwargs):
+    availability.invalidate_hours()
@@ -0,0 +1,137 @@
+"""
+Ranked slot suggestions for booking a patient.
+
+Every opening for the appointment type in the date window is a candidate.
+Openings come from ``clinic.availability`` when the practice has chairs and
+providers, and otherwise from the single lane's bookings within the clinic's
+working hours. Each candidate gets a weighted score in ``[0, 1]``:
+
+* ``preference``: how close the start is to the patient's ``preferred_time``
+  (Morning, Afternoon or Evening). It is 1 inside the window and falls to 0
+  four hours away. Patients without a preference score 0.5 everywhere.
+* ``gaps``: whether the booking leaves unusable fragments of chair time. A
+  side that touches a booking, a break or closing time scores 1. A side that
+  leaves a gap shorter than ``SLOT_MINUTES`` scores 0, and a longer gap 0.5.
+* ``fit``: the duration over the free stretch the slot sits in. A slot that
+  exactly fills a hole scores 1.
+* ``soon``: earlier days score higher, falling linearly across the window.
+
+The features are bit operations on each day's free-unit bitmap, a few
+integer operations per candidate, so a four-week window scores in a few
+milliseconds. Only the best-scoring resource is kept for each start time.
+"""
+from collections import defaultdict
+from datetime import time, timedelta
+
+from .availability import WorkingCalendar, iter_openings
+from .models import Appointment, Chair
+from .occupancy import UNIT_MINUTES, UNITS_PER_DAY, build, interval_mask
+from .scheduling import SLOT_MINUTES, from_minutes, to_minutes
+
+DEFAULT_LIMIT = 5
+MAX_LIMIT = 50
+WEIGHTS = {'preference': 0.4, 'gaps': 0.3, 'fit': 0.15, 'soon': 0.15}
+# Minutes from midnight covered by each Patient.preferred_time choice
+PREFERRED_WINDOWS = {
+    'Morning': (0, to_minutes(time(12))),
+    'Afternoon': (to_minutes(time(12)), to_minutes(time(17))),
+    'Evening': (to_minutes(time(17)), 24 * 60),
+}
+PREFERENCE_FALLOFF_MINUTES = 4 * 60
+ALL_UNITS = (1 << UNITS_PER_DAY) - 1
+
+
+def preference_score(preferred_time, start, end):
+    window = PREFERRED_WINDOWS.get(preferred_time)
+    if window is None:
+        return 0.5
+    distance = max(window[0] - start, end - window[1], 0)
+    return max(0.0, 1 - distance / PREFERENCE_FALLOFF_MINUTES)
+
+
+def free_run(free, first_unit, last_unit):
+    """Free units directly before ``first_unit`` and directly after ``last_unit`` (exclusive)."""
+    busy = ALL_UNITS & ~free
+    below = busy & ((1 << first_unit) - 1)
+    before = first_unit - below.bit_length()
+    above = busy >> last_unit
+    after = (above & -above).bit_length() - 1 if above else UNITS_PER_DAY - last_unit
+    return before, after
+
+
+def side_score(gap_units):
+    if gap_units == 0:
+        return 1.0
+    return 0.0 if gap_units * UNIT_MINUTES < SLOT_MINUTES else 0.5
+
+
+def _single_lane_openings(duration, start_date, end_date, step):
+    """Openings on the clinic-wide lane, with one query for the bookings of the whole window."""
+    hours = WorkingCalendar(start_date, end_date, [])
+    booked = defaultdict(list)
+    appointments = Appointment.objects.filter(
+        date__gte=start_date,
+        date__lte=end_date,
+        status=Appointment.STATUS_SCHEDULED,
+        chair__isnull=True,
+        provider__isnull=True
+    ).values_list('date', 'start_time', 'duration')
+    for day, start_time, appointment_duration in appointments:
+        booked[day].append((start_time, appointment_duration))
+
+    day = start_date
+    while day <= end_date:
+        # Opening hours, breaks and holidays as rebooking and recurring series see them
+        free = hours.clinic(day) & ~build(booked[day])
+        for start in range(0, 24 * 60 - duration + 1, step):
+            need = interval_mask(start, start + duration)
+            if free & need == need:
+                yield day, from_minutes(start), None, None, free
+        day += timedelta(days=1)
+
+
+def suggest_slots(patient, appointment_type, start_date, end_date, limit=DEFAULT_LIMIT, step=SLOT_MINUTES):
+    """
+    Return the ``limit`` best-scoring openings for booking ``patient`` for
+    ``appointment_type`` between the two dates, best first.
+
+    Each suggestion is a dict with ``date``, ``start_time``, ``chair``,
+    ``provider`` (both None on the single lane), ``score`` and the per-feature
+    ``scores``.
+    """
+    duration = appointment_type.default_duration
+    if Chair.objects.filter(is_active=True).exists():
+        openings = iter_openings(appointment_type, start_date, end_date, step=step)
+    else:
+        openings = _single_lane_openings(duration, start_date, end_date, step)
+    window_days = (end_date - start_date).days + 1
+
+    best = {}
+    for day, start_time, chair, provider, free in openings:
+        start = to_minutes(start_time)
+        end = start + duration
+        first_unit = start // UNIT_MINUTES
+        last_unit = -(-end // UNIT_MINUTES)
+        before, after = free_run(free, first_unit, last_unit)
+        scores = {
+            'preference': preference_score(patient.preferred_time, start, end),
+            'gaps': (side_score(before) + side_score(after)) / 2,
+            'fit': (last_unit - first_unit) / (last_unit - first_unit + before + after),
+            'soon': 1 - (day - start_date).days / window_days,
+        }
+        score = sum(WEIGHTS[name] * value for name, value in scores.items())
+        key = (day, start_time)
+        if key not in best or score > best[key]['score']:
+            best[key] = {
+                'date': day,
+                'start_time': start_time,
+                'chair': chair,
+                'provider': provider,
+                'score': score,
+                'scores': scores,
+            }
+
+    ranked = sorted(
+        best.values(), key=lambda suggestion: (-suggestion['score'], suggestion['date'], suggestion['start_time'])
+    )
+    return ranked[:limit]
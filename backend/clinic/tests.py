@@ -1,3 +1,1174 @@
-from django.test import TestCase
+import os
+import random
+import tempfile
+from datetime import date, time, timedelta
+from io import StringIO
+from unittest import skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from accounts.models import User
+from backend.pagination import AppointmentPagination
+from .models import (
+    Patient, AppointmentType, Appointment, AppointmentDayCount, AppointmentSeries, Break, Chair, Provider,
+    WorkingHours, Holiday
+)
+from . import autocomplete, availability, occupancy, recurrence
+from .scheduling import free_slots, merge_intervals
+from .search import get_backend, normalize, tokenize
+from .serializers import AppointmentCreateSerializer, AppointmentSerializer
+from .views import MAX_RANGE_DAYS
+
+
+class AppointmentDayCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='frontdesk', email='desk@example.com', password='x')
+        cls.patient = Patient.objects.create(name='Jane Doe')
+        cls.appointment_type = AppointmentType.objects.create(name='Check-up', default_duration=30)
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+    
+    def book(self, day, hour, **kwargs):
+        return Appointment.objects.create(
+            patient=self.patient, appointment_type=self.appointment_type,
+            date=day, start_time=time(hour), duration=30, **kwargs
+        )
+    
+    def counts(self, **params):
+        response = self.client.get(reverse('appointment-counts'), params)
+        self.assertEqual(response.status_code, 200)
+        return {row['date']: row['count'] for row in response.json()}
+    
+    def test_counts_follow_creates_updates_and_deletes(self):
+        first = self.book(date(2025, 3, 10), 9)
+        self.book(date(2025, 3, 10), 10)
+        self.book(date(2025, 3, 11), 9)
+        self.assertEqual(self.counts(year=2025, month=3), {'2025-03-10': 2, '2025-03-11': 1})
+        
+        first.date = date(2025, 3, 11)
+        first.save()
+        self.assertEqual(self.counts(year=2025, month=3), {'2025-03-10': 1, '2025-03-11': 2})
+        
+        first.status = Appointment.STATUS_CANCELLED
+        first.save()
+        self.assertEqual(self.counts(year=2025, month=3), {'2025-03-10': 1, '2025-03-11': 1})
+        self.assertEqual(
+            AppointmentDayCount.objects.get(date=date(2025, 3, 11), status=Appointment.STATUS_CANCELLED).count, 1
+        )
+        
+        Appointment.objects.filter(date=date(2025, 3, 10)).delete()
+        self.assertEqual(self.counts(year=2025, month=3), {'2025-03-11': 1})
+    
+    def test_counts_over_a_month_range(self):
+        self.book(date(2024, 12, 31), 9)
+        self.book(date(2025, 2, 1), 9)
+        self.book(date(2025, 4, 1), 9)
+        with self.assertNumQueries(1):
+            counts = self.counts(start_month='2024-12', end_month='2025-03')
+        self.assertEqual(counts, {'2024-12-31': 1, '2025-02-01': 1})
+    
+    def test_invalid_month_range(self):
+        response = self.client.get(reverse('appointment-counts'), {'start_month': '2025-03', 'end_month': '2025-01'})
+        self.assertEqual(response.status_code, 400)
+
+
+class PatientSearchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='frontdesk', email='desk@example.com', password='x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        Patient.objects.create(name='José Martinez', email='jose@example.com', phone='(555) 123-4567')
+        Patient.objects.create(name='Jane Doe', email='jane.doe@example.com', phone='555-987-0000',
+                               date_of_birth=date(1990, 1, 15))
+        Patient.objects.create(name='Janet Doering', email='jd@example.com')
+    
+    def search(self, q, **params):
+        response = self.client.get(reverse('patient-search'), {'q': q, **params})
+        self.assertEqual(response.status_code, 200)
+        return [patient['name'] for patient in response.json()]
+    
+    def check_backend(self):
+        self.assertEqual(self.search('jose'), ['José Martinez'])
+        self.assertEqual(set(self.search('jan do')), {'Jane Doe', 'Janet Doering'})
+        self.assertEqual(self.search('jane doe')[0], 'Jane Doe')
+        # Repeated terms and terms that prefix another may match the same token
+        for query in ('jane jane', 'jan jane', 'j jane', 'doe jane d'):
+            self.assertEqual(set(self.search(query)), {'Jane Doe', 'Janet Doering'}, query)
+        self.assertEqual(self.search('jane doe doe')[0], 'Jane Doe')
+        self.assertEqual(self.search('555 123'), ['José Martinez'])
+        self.assertEqual(self.search('1990-01-15'), ['Jane Doe'])
+        self.assertEqual(len(self.search('ja', limit=1)), 1)
+        self.assertEqual(self.search('nobody'), [])
+        self.assertEqual(self.search(''), [])
+        
+        Patient.objects.get(name='Jane Doe').delete()
+        self.assertEqual(self.search('jane doe'), ['Janet Doering'])
+        
+        janet = Patient.objects.get(name='Janet Doering')
+        janet.name = 'Janet Smith'
+        janet.save()
+        self.assertEqual(self.search('smi'), ['Janet Smith'])
+    
+    def test_sqlite_fts_backend(self):
+        self.check_backend()
+    
+    @override_settings(PATIENT_SEARCH_BACKEND='clinic.search.TokenSearchBackend')
+    def test_token_backend(self):
+        get_backend().rebuild()
+        self.check_backend()
+
+
+class PatientAutocompleteTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='frontdesk', email='desk@example.com', password='x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        autocomplete.invalidate()
+        Patient.objects.create(name='José Martinez', phone='555-123-4567')
+        Patient.objects.create(name='Jane Doe', phone='555-987-0000')
+        Patient.objects.create(name='Mary Janeway')
+    
+    def lookup(self, q, **params):
+        response = self.client.get(reverse('patient-autocomplete'), {'q': q, **params})
+        self.assertEqual(response.status_code, 200)
+        return [name for _, name, _ in response.json()]
+    
+    def test_prefix_lookup(self):
+        self.assertEqual(self.lookup('jose'), ['José Martinez'])
+        self.assertEqual(self.lookup('jane'), ['Jane Doe', 'Mary Janeway'])
+        self.assertEqual(self.lookup('mar jan'), ['Mary Janeway'])
+        self.assertEqual(len(self.lookup('ja', limit=1)), 1)
+        self.assertEqual(self.lookup('nobody'), [])
+        self.assertEqual(self.lookup(''), [])
+        
+        row = self.client.get(reverse('patient-autocomplete'), {'q': 'jane d'}).json()[0]
+        self.assertEqual(row[1:], ['Jane Doe', '555-987-0000'])
+    
+    def test_signals_keep_index_current(self):
+        self.assertEqual(self.lookup('jane'), ['Jane Doe', 'Mary Janeway'])
+        with self.captureOnCommitCallbacks(execute=True):
+            Patient.objects.create(name='Janelle Park')
+            jane = Patient.objects.get(name='Jane Doe')
+            jane.name = 'Jane Smith'
+            jane.save()
+            Patient.objects.get(name='Mary Janeway').delete()
+        
+        with self.assertNumQueries(0):
+            self.assertEqual(self.lookup('jane'), ['Jane Smith', 'Janelle Park'])
+        self.assertEqual(self.lookup('doe'), [])
+    
+    def test_short_prefixes_rank_like_a_full_scan(self):
+        rng = random.Random(3)
+        syllables = ['ja', 'jo', 'ma', 'mi', 'an', 'el', 'do', 'ne', 'ri', 'sa']
+        rows = [
+            (patient_id, ' '.join(
+                ''.join(rng.choice(syllables) for _ in range(rng.randrange(1, 4))).title() for _ in range(2)
+            ), None)
+            for patient_id in range(1, 400)
+        ]
+        index = autocomplete.PrefixIndex()
+        index.load(rows[:300])
+        for patient_id, name, phone in rows[300:]:
+            index.add(patient_id, name, phone)
+        for patient_id in range(1, 400, 7):
+            index.remove(patient_id)
+        live = [row for row in rows if row[0] % 7 != 1]
+        
+        def full_scan(query, limit):
+            terms = tokenize(query)
+            phrase = normalize(query).strip()
+            ranked = sorted(
+                (not normalize(name).startswith(phrase), normalize(name), patient_id)
+                for patient_id, name, _ in live
+                if all(any(token.startswith(term) for token in tokenize(name)) for term in terms)
+            )
+            return [patient_id for _, _, patient_id in ranked[:limit]]
+        
+        # Common prefixes take the walk in name order, rare ones rank their candidates
+        for query in ['j', 'm', 'ja', 'ne', 'j d', 'ma j', 'el s', 'jam', 'do ja', 'janema', 'jojoan', 'x']:
+            for limit in (1, 10, 50):
+                self.assertEqual([row[0] for row in index.lookup(query, limit)], full_scan(query, limit), query)
+    
+    def test_writes_swap_in_new_lists(self):
+        index = autocomplete.PrefixIndex()
+        index.load([(1, 'Jane Doe', None)])
+        before = index._contents
+        index.add(2, 'Janet Park', None)
+        index.remove(1)
+        # A lookup still holding the old contents sees them unchanged
+        self.assertEqual(before.names, [('jane doe', 1)])
+        self.assertEqual(before.prefixes['ja'], [('jane doe', 1)])
+        self.assertEqual([name for _, name, _ in index.lookup('ja')], ['Janet Park'])
+
+
+class AppointmentPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='frontdesk', email='desk@example.com', password='x')
+        patient = Patient.objects.create(name='Jane Doe')
+        appointment_type = AppointmentType.objects.create(name='Check-up', default_duration=30)
+        # Several appointments share a date and even a start time, so the cursor
+        # has to fall back on start_time and id
+        for day in (2, 1):
+            for hour in (11, 9, 9, 10):
+                Appointment.objects.create(
+                    patient=patient, appointment_type=appointment_type,
+                    date=date(2025, 3, day), start_time=time(hour, 0), duration=30
+                )
+        cls.expected = list(Appointment.objects.order_by('date', 'start_time', 'id').values_list('id', flat=True))
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+    
+    def test_walk_forward_and_back(self):
+        seen = []
+        url = reverse('appointment-list') + '?page_size=3'
+        pages = []
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                page = self.client.get(url).json()
+            self.assertFalse(any('COUNT(' in query['sql'] for query in queries))
+            self.assertNotIn('count', page)
+            pages.append(page)
+            seen.extend(appointment['id'] for appointment in page['results'])
+            url = page['next']
+        self.assertEqual(seen, self.expected)
+        self.assertEqual([len(page['results']) for page in pages], [3, 3, 2])
+        
+        previous = self.client.get(pages[-1]['previous']).json()
+        self.assertEqual(previous['results'], pages[1]['results'])
+        self.assertIsNotNone(previous['previous'])
+    
+    def test_page_size_is_capped(self):
+        response = self.client.get(reverse('appointment-list'), {'page_size': 10000})
+        self.assertEqual(len(response.json()['results']), len(self.expected))
+        self.assertEqual(AppointmentPagination.max_page_size, 100)
+    
+    def test_export_honours_filters(self):
+        response = self.client.get(reverse('appointment-export', kwargs={'export_format': 'csv'}), {'date': '2025-03-01'})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(len(lines), 5)
+        self.assertTrue(all(',2025-03-01,' in line for line in lines[1:]))
+    
+    def test_list_is_one_query_per_page(self):
+        with CaptureQueriesContext(connection) as queries:
+            page = self.client.get(reverse('appointment-list'), {'page_size': 8}).json()
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(page['results'][0]['patient_name'], 'Jane Doe')
+        self.assertEqual(page['results'][0]['endTime'], '09:30 AM')
+    
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('appointment-list'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+
+class PatientImportTests(TestCase):
+    CSV = (
+        "name,email,phone,date_of_birth,preferred_time\n"
+        "Ana Lima,ana@example.com,(555) 010-0001,1985-04-02,Morning\n"
+        "Ana Again,ANA@example.com,5550100002,,\n"
+        "Bo Chen,bo@example.com,555-010-0001,,\n"
+        "Existing Dupe,jane@EXAMPLE.com,,,\n"
+        ",nobody@example.com,123,2999-01-01,Midnight\n"
+        "Cy Park,,+15550100003,,Evening\n"
+    )
+    
+    def setUp(self):
+        self.user = User.objects.create_user(username='frontdesk', email='desk@example.com', password='x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        Patient.objects.create(name='Jane Doe', email='jane@example.com')
+    
+    def upload(self, content, name='patients.csv', **params):
+        url = reverse('patient-bulk-import')
+        if params:
+            url += '?' + '&'.join(f'{key}={value}' for key, value in params.items())
+        response = self.client.post(url, {'file': SimpleUploadedFile(name, content.encode())}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+    
+    def test_csv_import_reports_rows(self):
+        report = self.upload(self.CSV)
+        self.assertEqual((report['rows'], report['created']), (6, 2))
+        errors = {error['row']: error['errors'] for error in report['errors']}
+        self.assertEqual(set(errors), {2, 3, 4, 5})
+        self.assertIn('email', errors[2])
+        self.assertEqual(set(errors[3]), {'phone'})
+        self.assertIn('email', errors[4])
+        self.assertEqual(set(errors[5]), {'name', 'phone', 'date_of_birth', 'preferred_time'})
+        
+        ana = Patient.objects.get(name='Ana Lima')
+        self.assertEqual((ana.phone, ana.date_of_birth), ('5550100001', date(1985, 4, 2)))
+        # bulk_create skips signals, so the import keeps search and autocomplete current itself
+        self.assertEqual([p.name for p in get_backend().search('cy')], ['Cy Park'])
+        self.assertEqual([row[1] for row in autocomplete.get_index().lookup('ana')], ['Ana Lima'])
+    
+    def test_dry_run_and_ndjson(self):
+        content = '{"name": "Dee Ray", "phone": "5550100009"}\nnot json\n'
+        report = self.upload(content, name='patients.ndjson', dry_run=1)
+        self.assertEqual((report['rows'], report['created']), (2, 1))
+        self.assertEqual(report['errors'], [{'row': 2, 'errors': {'row': 'Expected a JSON object.'}}])
+        self.assertFalse(Patient.objects.filter(name='Dee Ray').exists())
+    
+    def test_phones_match_stored_phones_with_separators(self):
+        Patient.objects.create(name='Dee Formatted', phone='555-123-4567')
+        Patient.objects.create(name='Eve Dotted', phone='(555) 123.4568')
+        report = self.upload(
+            "name,phone\n"
+            "Dee Again,5551234567\n"
+            "Eve Again,555 123 4568\n"
+            "Fay New,555-123-4569\n"
+        )
+        self.assertEqual(report['created'], 1)
+        self.assertEqual(
+            [(error['row'], list(error['errors'])) for error in report['errors']], [(1, ['phone']), (2, ['phone'])]
+        )
+    
+    def test_unreadable_file_reports_rows_already_imported(self):
+        url = reverse('patient-bulk-import')
+        # Large enough that the rows before the bad byte are decoded first
+        rows = ''.join(f"Walk In {number:04},,,,\n" for number in range(1000))
+        content = ("name,email,phone,date_of_birth,preferred_time\n" + rows).encode() + b'Bad \xff Byte,,,,\n'
+        autocomplete.get_index()
+        response = self.client.post(
+            url, {'file': SimpleUploadedFile('patients.csv', content)}, format='multipart'
+        )
+        self.assertEqual(response.status_code, 400)
+        report = response.json()
+        self.assertIn(f"Cannot read the file after row {report['rows']}", report['error'])
+        self.assertGreater(report['created'], 0)
+        self.assertEqual(report['created'], report['rows'])
+        self.assertEqual(Patient.objects.count(), report['created'] + 1)
+        self.assertEqual(autocomplete.get_index().lookup('walk in 0000')[0][1], 'Walk In 0000')
+        
+        response = self.client.post(url, {'file': SimpleUploadedFile('patients.json', b'{"name": ')})
+        self.assertEqual((response.status_code, response.json()['created']), (400, 0))
+    
+    def test_command(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as source:
+            source.write(self.CSV)
+        self.addCleanup(os.remove, source.name)
+        out = StringIO()
+        call_command('import_patients', source.name, stdout=out, stderr=StringIO())
+        self.assertIn('Imported 2 of 6 row(s), 4 rejected', out.getvalue())
+        self.assertEqual(Patient.objects.count(), 3)
+
+
+class AppointmentSerializerTests(TestCase):
+    def test_fast_path_matches_model_fields(self):
+        patient = Patient.objects.create(name='Jane Doe')
+        appointment_type = AppointmentType.objects.create(name='Check-up', default_duration=30)
+        Appointment.objects.create(
+            patient=patient, appointment_type=appointment_type,
+            date=date(2025, 3, 1), start_time=time(13, 15, 30), duration=45
+        )
+        Appointment.objects.create(
+            patient=patient, date=date(2025, 3, 1), start_time=time(23, 30), duration=45, notes='Late'
+        )
+        lazy = AppointmentSerializer(Appointment.objects.order_by('id'), many=True).data
+        joined = AppointmentSerializer(
+            AppointmentSerializer.optimize_queryset(Appointment.objects.order_by('id')), many=True
+        ).data
+        self.assertEqual(lazy, joined)
+        self.assertEqual(
+            [(row['start_time'], row['end_time'], row['time'], row['endTime']) for row in joined],
+            [('13:15:30', '14:00:30', '01:15 PM', '02:00 PM'), ('23:30:00', '00:15:00', '11:30 PM', '12:15 AM')]
+        )
+        self.assertEqual(joined[0]['appointment_type_name'], 'Check-up')
+        self.assertNotIn('appointment_type_name', joined[1])
+
+
+class SlotComputationTests(SimpleTestCase):
+    # The reference sweep in clinic.scheduling that OccupancyTests checks the bitmaps against
+    
+    def test_merge_intervals(self):
+        self.assertEqual(merge_intervals([]), [])
+        # Unsorted input, overlapping, touching, nested and separate intervals
+        self.assertEqual(
+            merge_intervals([(600, 660), (540, 600), (700, 720), (590, 620), (705, 710), (800, 830)]),
+            [(540, 660), (700, 720), (800, 830)]
+        )
+        self.assertEqual(merge_intervals([(540, 570), (571, 600)]), [(540, 570), (571, 600)])
+    
+    def test_free_slots(self):
+        day = [t.strftime('%H:%M') for t in free_slots([])]
+        self.assertEqual(day[0], '09:00')
+        self.assertEqual(day[-1], '16:30')
+        self.assertNotIn('13:00', day)
+        self.assertNotIn('13:30', day)
+        
+        def free(appointments, slot_minutes=30):
+            return [t.strftime('%H:%M') for t in free_slots(appointments, slot_minutes)]
+        
+        # Slots at the edges of the day, and a booking ending as the next slot starts
+        self.assertEqual(free([(time(9), 30), (time(16, 30), 30)]), day[1:-1])
+        self.assertEqual(free([(time(8), 60), (time(17), 60)]), day)
+        self.assertEqual(free([(time(8, 45), 30)])[0], '09:30')
+        self.assertEqual(free([(time(16, 45), 30)])[-1], '16:00')
+        # Overlapping and adjacent bookings block the same slots as their union
+        self.assertEqual(
+            free([(time(10), 45), (time(10, 30), 30), (time(11), 30), (time(14, 10), 5)]),
+            [slot for slot in day if slot not in ('10:00', '10:30', '11:00', '14:00')]
+        )
+        self.assertEqual(free([(time(9), 8 * 60)]), [])
+        self.assertEqual(free([(time(9), 60)], slot_minutes=60), ['10:00', '11:00', '12:00', '14:00', '15:00', '16:00'])
+
+
+class BookingConflictTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='frontdesk', email='desk@example.com', password='x')
+        cls.patient = Patient.objects.create(name='Jane Doe')
+        cls.other = Patient.objects.create(name='John Roe')
+        cls.booked = Appointment.objects.create(
+            patient=cls.patient, date=date(2025, 3, 10), start_time=time(10), duration=60
+        )
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+    
+    def book(self, start_time, duration=30, **fields):
+        return self.client.post(reverse('appointment-list'), {
+            'patient': self.other.id, 'date': '2025-03-10', 'start_time': start_time, 'duration': duration, **fields
+        }, format='json')
+    
+    def test_back_to_back_bookings_are_allowed(self):
+        self.assertEqual(self.book('09:30').status_code, 201)
+        self.assertEqual(self.book('11:00').status_code, 201)
+    
+    def test_overlapping_bookings_are_rejected(self):
+        for start_time, duration in [('09:45', 30), ('10:30', 60), ('10:15', 15), ('09:00', 180)]:
+            response = self.book(start_time, duration)
+            self.assertEqual(response.status_code, 400, start_time)
+            self.assertIn('overlaps with an existing appointment for Jane Doe', str(response.json()))
+        self.assertEqual(Appointment.objects.count(), 1)
+    
+    def test_cancelled_appointments_do_not_block(self):
+        self.booked.status = Appointment.STATUS_CANCELLED
+        self.booked.save()
+        self.assertEqual(self.book('10:00', 60).status_code, 201)
+    
+    def test_update_into_another_appointment_is_rejected(self):
+        moving = Appointment.objects.create(patient=self.other, date=date(2025, 3, 10), start_time=time(14), duration=30)
+        url = reverse('appointment-detail', args=[moving.id])
+        response = self.client.patch(url, {'start_time': '10:30'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        # Moving within its own slot doesn't conflict with itself
+        response = self.client.patch(url, {'start_time': '11:00', 'duration': 60}, format='json')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.patch(url, {'start_time': '11:30'}, format='json')
+        self.assertEqual(response.status_code, 200)
+    
+    def test_booking_made_after_validation_is_caught_under_the_lock(self):
+        data = {'patient': self.other.id, 'date': '2025-03-10', 'start_time': '12:00', 'duration': 30}
+        create = AppointmentCreateSerializer(data=data)
+        self.assertTrue(create.is_valid(), create.errors)
+        moving = Appointment.objects.create(patient=self.other, date=date(2025, 3, 10), start_time=time(14), duration=30)
+        update = AppointmentCreateSerializer(moving, data={'start_time': '12:00'}, partial=True)
+        self.assertTrue(update.is_valid(), update.errors)
+        
+        # A concurrent request books the slot between validate() and save()
+        Appointment.objects.create(patient=self.patient, date=date(2025, 3, 10), start_time=time(12), duration=30)
+        with self.assertRaisesMessage(ValidationError, 'overlaps with an existing appointment for Jane Doe'):
+            create.save()
+        with self.assertRaisesMessage(ValidationError, 'overlaps with an existing appointment for Jane Doe'):
+            update.save()
+        moving.refresh_from_db()
+        self.assertEqual((moving.start_time, Appointment.objects.count()), (time(14), 3))
+
+
+class DateRangeTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='frontdesk', email='desk@example.com', password='x')
+        patient = Patient.objects.create(name='Jane Doe')
+        Appointment.objects.create(patient=patient, date=date(2025, 3, 10), start_time=time(9), duration=60)
+        Appointment.objects.create(
+            patient=patient, date=date(2025, 3, 11), start_time=time(9), duration=60,
+            status=Appointment.STATUS_CANCELLED
+        )
+        Appointment.objects.create(patient=patient, date=date(2025, 3, 13), start_time=time(9), duration=60)
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+    
+    def test_by_date_range_groups_scheduled_appointments(self):
+        response = self.client.get(
+            reverse('appointment-by-date-range'), {'start_date': '2025-03-10', 'end_date': '2025-03-12'}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            {day: [row['time'] for row in rows] for day, rows in response.json().items()},
+            {'2025-03-10': ['09:00 AM'], '2025-03-11': [], '2025-03-12': []}
+        )
+    
+    def test_available_slots_range_skips_booked_time(self):
+        response = self.client.get(
+            reverse('appointment-available-slots-range'), {'start_date': '2025-03-10', 'end_date': '2025-03-11'}
+        )
+        self.assertEqual(response.status_code, 200)
+        slots = response.json()
+        self.assertEqual(list(slots), ['2025-03-10', '2025-03-11'])
+        self.assertEqual(slots['2025-03-10'][0], '10:00 AM')
+        self.assertEqual(slots['2025-03-11'][:2], ['09:00 AM', '09:30 AM'])
+        self.assertEqual(len(slots['2025-03-11']), len(free_slots([])))
+    
+    def test_invalid_ranges_are_rejected(self):
+        last_allowed = (date(2025, 3, 1) + timedelta(days=MAX_RANGE_DAYS - 1)).isoformat()
+        too_far = (date(2025, 3, 1) + timedelta(days=MAX_RANGE_DAYS)).isoformat()
+        for name in ('appointment-by-date-range', 'appointment-available-slots-range'):
+            url = reverse(name)
+            for params in [
+                {'start_date': '2025-03-12', 'end_date': '2025-03-10'},
+                {'start_date': '2025-03-01', 'end_date': too_far},
+                {'start_date': '2025-03-10'},
+                {'end_date': '2025-03-10'},
+                {'start_date': '2025-03-10', 'end_date': '2025-13-01'},
+            ]:
+                response = self.client.get(url, params)
+                self.assertEqual(response.status_code, 400, (name, params))
+                self.assertIn('error', response.json())
+            response = self.client.get(url, {'start_date': '2025-03-01', 'end_date': last_allowed})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.json()), MAX_RANGE_DAYS)
+
+
+@skipUnless(connection.vendor == 'sqlite', "Reads SQLite's EXPLAIN QUERY PLAN output")
+class AppointmentIndexTests(TestCase):
+    def test_day_queries_use_the_scheduled_index(self):
+        patient = Patient.objects.create(name='Jane Doe')
+        for day in range(1, 29):
+            Appointment.objects.create(patient=patient, date=date(2025, 2, day), start_time=time(9), duration=30)
+        scheduled = Appointment.objects.filter(status=Appointment.STATUS_SCHEDULED)
+        # by_date, available_slots_range and the conflict check
+        for queryset in [
+            AppointmentSerializer.optimize_queryset(scheduled.filter(date=date(2025, 2, 3))),
+            scheduled.filter(date__gte=date(2025, 2, 3), date__lte=date(2025, 2, 9)),
+            scheduled.filter(date=date(2025, 2, 3), start_time__lt=time(10)),
+        ]:
+            plan = queryset.explain()
+            self.assertIn('clinic_appt_scheduled_idx', plan)
+            self.assertNotIn('SCAN clinic_appointment', plan)
+        # The default ordering of the full list reads the date/start_time index
+        self.assertIn('clinic_appt_date_start_idx', Appointment.objects.order_by('date', 'start_time').explain())
+
+
+class ReferenceCacheTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='frontdesk', email='desk@example.com', password='x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            AppointmentType.objects.create(name='Check-up', default_duration=30)
+    
+    def test_etag_and_invalidation(self):
+        url = reverse('appointmenttype-list')
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        etag = first['ETag']
+        
+        with self.assertNumQueries(0):
+            cached = self.client.get(url)
+            not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(cached.json(), first.json())
+        self.assertEqual(cached['ETag'], etag)
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified.content, b'')
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            AppointmentType.objects.create(name='Cleaning', default_duration=60)
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], etag)
+        self.assertEqual(len(changed.json()['results']), 2)
+    
+    def test_entries_expire_with_a_process_local_cache(self):
+        # An update without signals stands in for a change made by another worker
+        url = reverse('appointmenttype-list')
+        self.client.get(url)
+        AppointmentType.objects.update(name='Exam')
+        self.assertEqual(self.client.get(url).json()['results'][0]['name'], 'Check-up')
+        with override_settings(PROCESS_LOCAL_CACHE_TIMEOUT=0):
+            self.client.get(url, {'page': 1})
+            AppointmentType.objects.update(name='Cleaning')
+            self.assertEqual(self.client.get(url, {'page': 1}).json()['results'][0]['name'], 'Cleaning')
+        
+        self.assertEqual(len(autocomplete.get_index().lookup('jose')), 0)
+        Patient.objects.create(name='José Martinez')
+        autocomplete.get_index()
+        Patient.objects.update(name='Mary Janeway')
+        self.assertEqual(len(autocomplete.get_index().lookup('mary')), 0)
+        with override_settings(PROCESS_LOCAL_CACHE_TIMEOUT=0):
+            self.assertEqual(len(autocomplete.get_index().lookup('mary')), 1)
+
+
+class AsyncReadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='frontdesk', email='desk@example.com', password='x')
+        patient = Patient.objects.create(name='Jane Doe')
+        appointment_type = AppointmentType.objects.create(name='Check-up', default_duration=30)
+        for hour in (9, 11):
+            Appointment.objects.create(
+                patient=patient, appointment_type=appointment_type,
+                date=date(2025, 3, 10), start_time=time(hour), duration=45
+            )
+        Appointment.objects.create(patient=patient, date=date(2025, 4, 2), start_time=time(10), duration=30)
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.token = str(RefreshToken.for_user(self.user).access_token)
+    
+    async def test_matches_sync_endpoints(self):
+        pairs = [
+            (reverse('appointment-by-date', kwargs={'date': '2025-03-10'}),
+             reverse('async-appointment-by-date', kwargs={'date': '2025-03-10'}), {}),
+            (reverse('appointment-counts'), reverse('async-appointment-counts'), {'start_month': '2025-03', 'end_month': '2025-04'}),
+            (reverse('appointment-available-slots'), reverse('async-appointment-available-slots'), {'date': '2025-03-10'}),
+            (reverse('appointment-available-slots'), reverse('async-appointment-available-slots'), {'date': '2025-3-x'}),
+        ]
+        for sync_url, async_url, params in pairs:
+            expected = await sync_to_async(self.client.get)(sync_url, params)
+            response = await self.async_client.get(async_url, params, headers={'Authorization': f'Bearer {self.token}'})
+            self.assertEqual(response.status_code, expected.status_code)
+            self.assertEqual(response.json(), expected.json())
+    
+    async def test_requires_authentication(self):
+        response = await self.async_client.get(reverse('async-appointment-counts'))
+        self.assertEqual(response.status_code, 401)
+        self.assertIn('Bearer', response['WWW-Authenticate'])
+        response = await self.async_client.post(
+            reverse('async-appointment-counts'), headers={'Authorization': f'Bearer {self.token}'}
+        )
+        self.assertEqual(response.status_code, 405)
+
+
+class OccupancyTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='frontdesk', email='desk@example.com', password='x')
+        cls.patient = Patient.objects.create(name='Jane Doe')
+        cls.hour_long = AppointmentType.objects.create(name='Filling', default_duration=60)
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+    
+    def test_free_starts_match_grid_sweep(self):
+        day = date(2025, 3, 10)
+        open_bits = availability.WorkingCalendar(day, day, []).clinic(day)
+        rng = random.Random(7)
+        for _ in range(200):
+            booked = [
+                (time(rng.randrange(8, 18), rng.randrange(60)), rng.choice([7, 15, 30, 45, 90]))
+                for _ in range(rng.randrange(6))
+            ]
+            self.assertEqual(occupancy.free_starts(occupancy.build(booked), open_bits), free_slots(booked))
+    
+    def test_slot_length_from_appointment_type(self):
+        Appointment.objects.create(
+            patient=self.patient, date=date(2025, 3, 10), start_time=time(10), duration=45
+        )
+        response = self.client.get(
+            reverse('appointment-available-slots'), {'date': '2025-03-10', 'appointment_type': self.hour_long.id}
+        )
+        self.assertEqual(response.status_code, 200)
+        # Hour-long slots can't overlap 10:00-10:45, run into lunch or past closing
+        self.assertEqual(response.json(), [
+            '09:00 AM', '11:00 AM', '11:30 AM', '12:00 PM', '02:00 PM', '02:30 PM', '03:00 PM', '03:30 PM', '04:00 PM'
+        ])
+        for params in ({'duration': '0'}, {'duration': 'x'}, {'appointment_type': '999'}):
+            response = self.client.get(reverse('appointment-available-slots'), {'date': '2025-03-10', **params})
+            self.assertEqual(response.status_code, 400)
+    
+    def test_slots_follow_working_hours_and_the_clinic_wide_lane(self):
+        monday, tuesday = date(2025, 3, 10), date(2025, 3, 11)
+        WorkingHours.objects.create(weekday=0, start_time=time(8), end_time=time(12))
+        Break.objects.create(weekday=0, start_time=time(10), end_time=time(10, 30))
+        Holiday.objects.create(date=tuesday, name='Closed')
+        chair = Chair.objects.create(name='Chair 1')
+        # A chair's booking doesn't use the clinic-wide lane
+        Appointment.objects.create(patient=self.patient, date=monday, start_time=time(8), duration=60, chair=chair)
+        Appointment.objects.create(patient=self.patient, date=monday, start_time=time(11), duration=30)
+        expected = ['08:00 AM', '08:30 AM', '09:00 AM', '09:30 AM', '10:30 AM', '11:30 AM']
+        
+        response = self.client.get(reverse('appointment-available-slots'), {'date': '2025-03-10'})
+        self.assertEqual(response.json(), expected)
+        response = self.client.get(reverse('appointment-available-slots'), {'date': '2025-03-11'})
+        self.assertEqual(response.json(), [])
+        response = self.client.get(
+            reverse('appointment-available-slots-range'), {'start_date': '2025-03-10', 'end_date': '2025-03-12'}
+        )
+        # Only Mondays have working hours now
+        self.assertEqual(response.json(), {'2025-03-10': expected, '2025-03-11': [], '2025-03-12': []})
+    
+    def test_partial_units_fall_back_to_the_database(self):
+        Appointment.objects.create(patient=self.patient, date=date(2025, 3, 10), start_time=time(9), duration=7)
+        url = reverse('appointment-list')
+        booking = {'patient': self.patient.id, 'date': '2025-03-10', 'duration': 30}
+        
+        # 09:07 shares the 09:05 unit with the first booking but doesn't overlap it
+        self.assertEqual(self.client.post(url, {**booking, 'start_time': '09:07'}, format='json').status_code, 201)
+        response = self.client.post(url, {**booking, 'start_time': '09:30'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Jane Doe', str(response.json()))
+
+
+class OccupancyCacheTests(TransactionTestCase):
+    # Outside a test transaction, so bitmaps are cached as they are in production
+    
+    def setUp(self):
+        self.patient = Patient.objects.create(name='Jane Doe')
+    
+    def test_bitmaps_follow_saves_moves_and_deletes(self):
+        monday, tuesday = date(2025, 3, 10), date(2025, 3, 11)
+        self.assertEqual(occupancy.get_bits(monday), 0)
+        with self.assertNumQueries(0):
+            occupancy.get_bits(monday)
+        
+        appointment = Appointment.objects.create(
+            patient=self.patient, date=monday, start_time=time(9), duration=30
+        )
+        self.assertFalse(occupancy.is_free(monday, time(9, 15), 30))
+        self.assertTrue(occupancy.is_free(monday, time(9, 30), 30))
+        
+        appointment.date = tuesday
+        appointment.save()
+        self.assertTrue(occupancy.is_free(monday, time(9), 30))
+        self.assertFalse(occupancy.is_free(tuesday, time(9), 30))
+        
+        appointment.status = Appointment.STATUS_CANCELLED
+        appointment.save()
+        self.assertEqual(occupancy.get_bits(tuesday), 0)
+        
+        appointment.status = Appointment.STATUS_SCHEDULED
+        appointment.save()
+        appointment.delete()
+        self.assertEqual(occupancy.get_bits(tuesday), 0)
+    
+    def test_clinic_hours_follow_holidays_and_hours(self):
+        monday = date(2025, 3, 17)
+        self.assertEqual(occupancy.free_starts(0, availability.clinic_hours(monday))[0], time(9))
+        with self.assertNumQueries(0):
+            availability.clinic_hours(monday)
+        holiday = Holiday.objects.create(date=monday, name='Closed')
+        self.assertEqual(availability.clinic_hours(monday), 0)
+        holiday.delete()
+        WorkingHours.objects.create(weekday=0, start_time=time(7), end_time=time(9))
+        self.assertEqual(
+            occupancy.free_starts(0, availability.clinic_hours(monday)), [time(7), time(7, 30), time(8), time(8, 30)]
+        )
+    
+    def test_bitmaps_expire_with_a_process_local_cache(self):
+        monday, tuesday = date(2025, 4, 7), date(2025, 4, 8)
+        # Updates without signals stand in for changes made by another worker
+        appointment = Appointment.objects.create(patient=self.patient, date=monday, start_time=time(9), duration=30)
+        self.assertFalse(occupancy.is_free(monday, time(9), 30))
+        Appointment.objects.filter(pk=appointment.pk).update(start_time=time(10))
+        self.assertFalse(occupancy.is_free(monday, time(9), 30))
+        
+        with override_settings(PROCESS_LOCAL_CACHE_TIMEOUT=0):
+            appointment = Appointment.objects.create(
+                patient=self.patient, date=tuesday, start_time=time(9), duration=30
+            )
+            self.assertFalse(occupancy.is_free(tuesday, time(9), 30))
+            Appointment.objects.filter(pk=appointment.pk).update(start_time=time(10))
+            self.assertTrue(occupancy.is_free(tuesday, time(9), 30))
+
+
+class ResourceSchedulingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='frontdesk', email='desk@example.com', password='x')
+        cls.patient = Patient.objects.create(name='Jane Doe')
+        cls.filling = AppointmentType.objects.create(name='Filling', default_duration=60)
+        cls.cleaning = AppointmentType.objects.create(name='Cleaning', default_duration=30)
+        cls.chairs = [Chair.objects.create(name='Chair 1'), Chair.objects.create(name='Chair 2')]
+        cls.dentist = Provider.objects.create(name='Dr. Adams')
+        cls.hygienist = Provider.objects.create(name='Sam Lee')
+        cls.hygienist.appointment_types.add(cls.cleaning)
+        # Open Monday mornings only; the hygienist starts at ten
+        WorkingHours.objects.create(weekday=0, start_time=time(9), end_time=time(12))
+        WorkingHours.objects.create(provider=cls.hygienist, weekday=0, start_time=time(10), end_time=time(12))
+        Appointment.objects.create(
+            patient=cls.patient, date=date(2025, 3, 10), start_time=time(9), duration=60,
+            chair=cls.chairs[0], provider=cls.dentist
+        )
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+    
+    def openings(self, appointment_type, start, end, limit=10):
+        return [
+            (day.isoformat(), start_time.strftime('%H:%M'), chair.name, provider.name)
+            for day, start_time, chair, provider in availability.find_openings(
+                appointment_type, start, end, limit=limit
+            )
+        ]
+    
+    def test_openings_respect_hours_qualifications_and_bookings(self):
+        monday, tuesday = date(2025, 3, 10), date(2025, 3, 11)
+        self.assertEqual(self.openings(self.filling, monday, tuesday), [
+            ('2025-03-10', '10:00', 'Chair 1', 'Dr. Adams'),
+            ('2025-03-10', '10:30', 'Chair 1', 'Dr. Adams'),
+            ('2025-03-10', '11:00', 'Chair 1', 'Dr. Adams'),
+        ])
+        self.assertEqual(self.openings(self.cleaning, monday, tuesday, limit=3), [
+            ('2025-03-10', '10:00', 'Chair 1', 'Dr. Adams'),
+            ('2025-03-10', '10:00', 'Chair 2', 'Sam Lee'),
+            ('2025-03-10', '10:30', 'Chair 1', 'Dr. Adams'),
+        ])
+        
+        Holiday.objects.create(date=date(2025, 3, 17), provider=self.dentist)
+        self.assertEqual(self.openings(self.filling, date(2025, 3, 17), date(2025, 3, 17)), [])
+        self.assertEqual(len(self.openings(self.cleaning, date(2025, 3, 17), date(2025, 3, 17))), 4)
+        Holiday.objects.create(date=date(2025, 3, 17), name='Closed')
+        self.assertEqual(self.openings(self.cleaning, date(2025, 3, 17), date(2025, 3, 17)), [])
+    
+    def test_query_count_does_not_grow_with_resources(self):
+        for number in range(3, 9):
+            Chair.objects.create(name=f'Chair {number}')
+            Provider.objects.create(name=f'Provider {number}')
+        with self.assertNumQueries(6):
+            self.openings(self.cleaning, date(2025, 3, 1), date(2025, 3, 31), limit=100)
+    
+    def test_default_hours_without_configuration(self):
+        WorkingHours.objects.all().delete()
+        starts = [start for _, start, _, _ in self.openings(self.filling, date(2025, 3, 11), date(2025, 3, 11), limit=100)]
+        open_bits = availability.WorkingCalendar(date(2025, 3, 11), date(2025, 3, 11), []).clinic(date(2025, 3, 11))
+        self.assertEqual(starts, [t.strftime('%H:%M') for t in occupancy.free_starts(0, open_bits, 60)])
+    
+    def test_openings_endpoint_and_per_resource_conflicts(self):
+        response = self.client.get(reverse('appointment-openings'), {
+            'appointment_type': self.cleaning.id, 'start_date': '2025-03-10', 'end_date': '2025-03-10',
+            'provider': self.hygienist.id, 'limit': 2,
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(row['time'], row['chair_name'], row['provider_name']) for row in response.json()],
+            [('10:00 AM', 'Chair 1', 'Sam Lee'), ('10:30 AM', 'Chair 1', 'Sam Lee')]
+        )
+        response = self.client.get(reverse('appointment-openings'), {'start_date': '2025-03-10', 'end_date': '2025-03-10'})
+        self.assertEqual(response.status_code, 400)
+        
+        url = reverse('appointment-list')
+        booking = {'patient': self.patient.id, 'date': '2025-03-10', 'start_time': '09:30', 'duration': 30}
+        # Another chair and provider can work alongside the 9:00 booking
+        colleague = Provider.objects.create(name='Dr. Baker')
+        response = self.client.post(url, {**booking, 'chair': self.chairs[1].id, 'provider': colleague.id}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['chair'], self.chairs[1].id)
+        response = self.client.post(url, {**booking, 'chair': self.chairs[1].id}, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(url, {**booking, 'provider': self.dentist.id}, format='json')
+        self.assertEqual(response.status_code, 400)
+    
+    def test_bookings_must_fit_hours_and_resources(self):
+        url = reverse('appointment-list')
+        booking = {'patient': self.patient.id, 'date': '2025-03-10', 'start_time': '10:00', 'duration': 30}
+        Break.objects.create(weekday=0, start_time=time(11), end_time=time(11, 30))
+        Holiday.objects.create(date=date(2025, 3, 17), name='Closed')
+        Holiday.objects.create(date=date(2025, 3, 24), provider=self.hygienist)
+        retired = Chair.objects.create(name='Chair 3', is_active=False)
+        away = Provider.objects.create(name='Dr. Gone', is_active=False)
+        
+        def rejected(message, **changes):
+            response = self.client.post(url, {**booking, **changes}, format='json')
+            self.assertEqual(response.status_code, 400, changes)
+            self.assertIn(message, str(response.json()))
+        
+        closed = 'not working at this time'
+        rejected(closed, date='2025-03-11')
+        rejected(closed, start_time='11:45')
+        rejected(closed, start_time='08:30')
+        rejected(closed, start_time='10:45')
+        rejected(closed, date='2025-03-17')
+        rejected(closed, provider=self.hygienist.id, start_time='09:30')
+        rejected(closed, provider=self.hygienist.id, date='2025-03-24')
+        rejected('Chair 3 is not in use', chair=retired.id)
+        rejected('Dr. Gone is not taking appointments', provider=away.id)
+        rejected('Sam Lee does not perform Filling', provider=self.hygienist.id, appointment_type=self.filling.id)
+        self.assertEqual(Appointment.objects.count(), 1)
+        
+        response = self.client.post(url, {
+            **booking, 'chair': self.chairs[1].id, 'provider': self.hygienist.id, 'appointment_type': self.cleaning.id
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        # The dentist lists no types, so performs any
+        response = self.client.post(url, {
+            **booking, 'start_time': '11:30', 'provider': self.dentist.id, 'appointment_type': self.filling.id
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        # Moving a booking onto a break is rejected too
+        moved = Appointment.objects.get(start_time=time(11, 30))
+        response = self.client.patch(reverse('appointment-detail', args=[moved.id]), {'start_time': '11:00'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class SlotSuggestionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='frontdesk', email='desk@example.com', password='x')
+        cls.patient = Patient.objects.create(name='Jane Doe', preferred_time='Afternoon')
+        cls.check_up = AppointmentType.objects.create(name='Check-up', default_duration=30)
+        other = Patient.objects.create(name='John Roe')
+        Appointment.objects.create(patient=other, date=date(2025, 3, 10), start_time=time(14), duration=30)
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+    
+    def suggest(self, **params):
+        response = self.client.get(reverse('appointment-suggest'), {
+            'patient': self.patient.id, 'appointment_type': self.check_up.id,
+            'start_date': '2025-03-10', 'end_date': '2025-03-10', **params,
+        })
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+    
+    def test_ranks_preferred_time_and_tight_fits_first(self):
+        suggestions = self.suggest(limit=3)
+        # Afternoon slots that close a gap against a booking, lunch or closing time
+        self.assertEqual([row['time'] for row in suggestions], ['02:30 PM', '04:30 PM', '12:30 PM'])
+        self.assertEqual(suggestions[0]['scores']['preference'], 1.0)
+        self.assertEqual(suggestions[0]['scores']['gaps'], 0.75)
+        self.assertGreater(suggestions[0]['score'], suggestions[2]['score'])
+        
+        self.patient.preferred_time = 'Morning'
+        self.patient.save()
+        self.assertEqual([row['time'] for row in self.suggest(limit=2)], ['09:00 AM', '09:30 AM'])
+    
+    def test_leaves_no_unusable_fragments(self):
+        # A 20-minute booking at 9:00 leaves 9:20-9:30 free; starting at 9:30 keeps it stranded
+        Appointment.objects.create(patient=self.patient, date=date(2025, 3, 11), start_time=time(9), duration=20)
+        suggestions = self.suggest(start_date='2025-03-11', end_date='2025-03-11', limit=50)
+        nine_thirty = next(row for row in suggestions if row['time'] == '09:30 AM')
+        self.assertEqual(nine_thirty['scores']['gaps'], 0.25)
+    
+    def test_respects_holidays_and_working_hours(self):
+        Holiday.objects.create(date=date(2025, 3, 10), name='Closed')
+        self.assertEqual(self.suggest(), [])
+        
+        # Tuesdays open 10 to 12 only
+        WorkingHours.objects.create(weekday=1, start_time=time(10), end_time=time(12))
+        suggestions = self.suggest(start_date='2025-03-10', end_date='2025-03-11', limit=50)
+        self.assertEqual({row['date'] for row in suggestions}, {'2025-03-11'})
+        self.assertEqual(
+            sorted(row['time'] for row in suggestions), ['10:00 AM', '10:30 AM', '11:00 AM', '11:30 AM']
+        )
+    
+    def test_uses_chairs_and_providers_when_configured(self):
+        Chair.objects.create(name='Chair 1')
+        provider = Provider.objects.create(name='Dr. Adams')
+        suggestions = self.suggest(limit=1)
+        self.assertEqual(suggestions[0]['provider'], provider.id)
+        # The 2 PM booking has no chair, so it doesn't hold up Chair 1 and the slot after lunch fits best
+        self.assertEqual(suggestions[0]['time'], '02:00 PM')
+    
+    def test_invalid_parameters(self):
+        response = self.client.get(reverse('appointment-suggest'), {'appointment_type': self.check_up.id})
+        self.assertEqual(response.status_code, 400)
+
+
+class RebookingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='frontdesk', email='desk@example.com', password='x')
+        cls.patient = Patient.objects.create(name='Jane Doe')
+        cls.closed = date(2025, 3, 10)
+        cls.moving = [
+            Appointment.objects.create(patient=cls.patient, date=cls.closed, start_time=start, duration=duration)
+            for start, duration in [(time(9), 60), (time(10), 30), (time(14), 30), (time(16, 30), 30)]
+        ]
+        Appointment.objects.create(patient=cls.patient, date=date(2025, 3, 11), start_time=time(9), duration=90)
+        Appointment.objects.create(patient=cls.patient, date=date(2025, 3, 11), start_time=time(14), duration=30)
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+    
+    def rebook(self, body, end_date='2025-03-12', commit=False):
+        url = reverse('appointment-rebook') + f'?start_date=2025-03-11&end_date={end_date}'
+        if commit:
+            url += '&commit=1'
+        return self.client.post(url, body, format='json')
+    
+    def test_preview_then_commit(self):
+        response = self.rebook({'date': '2025-03-10'})
+        self.assertEqual(response.status_code, 200)
+        # Longest first, each at the free start nearest its old time on the first day with room
+        expected = [('2025-03-11', '10:30 AM'), ('2025-03-11', '11:30 AM'), ('2025-03-11', '02:30 PM'),
+                    ('2025-03-11', '04:30 PM')]
+        self.assertEqual([(row['date'], row['time']) for row in response.data['moved']], expected)
+        self.assertFalse(response.data['committed'])
+        self.assertEqual(Appointment.objects.filter(date=self.closed).count(), 4)
+        
+        occupancy.get_bits(date(2025, 3, 11))
+        response = self.rebook({'appointments': [appointment.id for appointment in self.moving]}, commit=True)
+        self.assertTrue(response.data['committed'])
+        self.assertEqual([(row['date'], row['time']) for row in response.data['moved']], expected)
+        self.assertEqual(
+            list(Appointment.objects.filter(id=self.moving[0].id).values_list('date', 'start_time')),
+            [(date(2025, 3, 11), time(10, 30))]
+        )
+        self.assertFalse(Appointment.objects.filter(date=self.closed).exists())
+        counts = dict(AppointmentDayCount.objects.filter(status='scheduled').values_list('date', 'count'))
+        self.assertEqual((counts[self.closed], counts[date(2025, 3, 11)]), (0, 6))
+        self.assertFalse(occupancy.is_free(date(2025, 3, 11), time(10, 30), 60))
+    
+    def test_holidays_and_full_windows(self):
+        Holiday.objects.create(date=date(2025, 3, 11), name='Flooding')
+        response = self.rebook({'date': '2025-03-10'}, end_date='2025-03-11', commit=True)
+        self.assertEqual(len(response.data['unplaced']), 4)
+        self.assertEqual(response.data['moved'], [])
+        
+        response = self.rebook({'date': '2025-03-10'}, commit=True)
+        self.assertEqual(
+            [(row['date'], row['from_time'], row['time']) for row in response.data['moved']],
+            [('2025-03-12', '09:00 AM', '09:00 AM'), ('2025-03-12', '10:00 AM', '10:00 AM'),
+             ('2025-03-12', '02:00 PM', '02:00 PM'), ('2025-03-12', '04:30 PM', '04:30 PM')]
+        )
+    
+    def test_keeps_provider_and_avoids_their_bookings(self):
+        dentist = Provider.objects.create(name='Dr. Adams')
+        chair = Chair.objects.create(name='Chair 1')
+        Appointment.objects.create(
+            patient=self.patient, date=date(2025, 3, 11), start_time=time(11), duration=60, chair=chair, provider=dentist
+        )
+        appointment = Appointment.objects.create(
+            patient=self.patient, date=self.closed, start_time=time(11), duration=30, provider=dentist
+        )
+        response = self.rebook({'appointments': [appointment.id]}, commit=True)
+        # The clinic-wide lane's booking at 9:00 doesn't hold up the dentist
+        self.assertEqual([(row['time'], row['provider']) for row in response.data['moved']], [('10:30 AM', dentist.id)])
+    
+    def test_one_request_with_a_bounded_number_of_queries(self):
+        Appointment.objects.bulk_create([
+            Appointment(patient=self.patient, date=date(2025, 3, 1), start_time=time(9), duration=30)
+            for _ in range(40)
+        ])
+        AppointmentDayCount.adjust(date(2025, 3, 1), 'scheduled', 40)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.rebook({'date': '2025-03-01'}, commit=True)
+        self.assertEqual(len(response.data['moved']), 24)
+        self.assertEqual(len(response.data['unplaced']), 16)
+        # Per target day, not per appointment
+        self.assertLessEqual(len(queries), 20)
+    
+    def test_invalid_requests(self):
+        self.assertEqual(self.rebook({'appointments': []}).status_code, 400)
+        self.assertEqual(self.rebook({'date': '10/03/2025'}).status_code, 400)
+        response = self.client.post(reverse('appointment-rebook'), {'date': '2025-03-10'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class AppointmentSeriesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='frontdesk', email='desk@example.com', password='x')
+        cls.patient = Patient.objects.create(name='Jane Doe')
+        cls.other = Patient.objects.create(name='John Roe')
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+    
+    def create(self, query='', **fields):
+        body = {'patient': self.patient.id, 'start_date': '2030-01-07', 'start_time': '09:00', 'duration': 30, **fields}
+        return self.client.post(reverse('appointmentseries-list') + query, body, format='json')
+    
+    def test_occurrences_follow_rrule(self):
+        monthly = AppointmentSeries(frequency='monthly', interval=1, start_date=date(2030, 1, 31), count=4)
+        # Months without a 31st are skipped and don't count
+        self.assertEqual(
+            list(recurrence.occurrences(monthly)),
+            [date(2030, 1, 31), date(2030, 3, 31), date(2030, 5, 31), date(2030, 7, 31)]
+        )
+        fortnightly = AppointmentSeries(
+            frequency='weekly', interval=2, start_date=date(2030, 1, 7), until=date(2030, 2, 4)
+        )
+        self.assertEqual(
+            list(recurrence.occurrences(fortnightly)), [date(2030, 1, 7), date(2030, 1, 21), date(2030, 2, 4)]
+        )
+        with self.assertRaises(ValueError):
+            list(recurrence.occurrences(AppointmentSeries(frequency='weekly', interval=1, start_date=date(2030, 1, 7))))
+    
+    def test_year_long_series_in_one_request(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.create(until='2030-12-31')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 52)
+        self.assertEqual(response.data['materialized_until'], '2030-12-31')
+        self.assertLessEqual(len(queries), 20)
+        
+        appointments = Appointment.objects.filter(series=response.data['id'])
+        self.assertEqual(appointments.count(), 52)
+        self.assertEqual(appointments.last().date, date(2030, 12, 30))
+        counts = AppointmentDayCount.objects.filter(status='scheduled', count=1)
+        self.assertEqual(counts.count(), 52)
+        self.assertFalse(occupancy.is_free(date(2030, 12, 30), time(9), 30))
+        self.assertEqual(
+            self.client.get(reverse('appointment-detail', args=[appointments.first().id])).data['series'],
+            response.data['id']
+        )
+    
+    def test_conflicts_are_checked_for_every_occurrence(self):
+        Appointment.objects.create(patient=self.other, date=date(2030, 1, 21), start_time=time(9, 15), duration=30)
+        Holiday.objects.create(date=date(2030, 1, 28), name='Training')
+        response = self.create(count=4)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            [conflict['date'] for conflict in response.data['conflicts']], [date(2030, 1, 21), date(2030, 1, 28)]
+        )
+        self.assertIn('John Roe', response.data['conflicts'][0]['reason'])
+        self.assertFalse(AppointmentSeries.objects.exists())
+        
+        response = self.create('?skip_conflicts=1', count=4)
+        self.assertEqual((response.data['created'], len(response.data['skipped'])), (2, 2))
+        self.assertEqual(
+            list(Appointment.objects.filter(series=response.data['id']).values_list('date', flat=True)),
+            [date(2030, 1, 7), date(2030, 1, 14)]
+        )
+    
+    def test_open_ended_series_are_materialized_lazily(self):
+        response = self.create('?weeks=4')
+        self.assertEqual((response.data['created'], response.data['materialized_until']), (4, '2030-02-03'))
+        series_id = response.data['id']
+        
+        response = self.client.post(reverse('appointmentseries-materialize', args=[series_id]) + '?weeks=6')
+        self.assertEqual(response.data['created'], 2)
+        Appointment.objects.create(patient=self.other, date=date(2030, 2, 25), start_time=time(9), duration=30)
+        
+        out, err = StringIO(), StringIO()
+        call_command('materialize_series', '--weeks', '10', '--date', '2030-01-07', stdout=out, stderr=err)
+        self.assertIn('Created 3 appointment(s) and skipped 1 conflict(s)', out.getvalue())
+        self.assertIn('2030-02-25', err.getvalue())
+        self.assertEqual(Appointment.objects.filter(series=series_id).count(), 9)
+        # Nothing more until the horizon moves
+        call_command('materialize_series', '--weeks', '10', '--date', '2030-01-07', stdout=out, stderr=err)
+        self.assertEqual(Appointment.objects.filter(series=series_id).count(), 9)
+    
+    def test_invalid_series(self):
+        self.assertEqual(self.create(until='2030-03-01', count=3).status_code, 400)
+        self.assertEqual(self.create(until='2029-12-01').status_code, 400)
+        self.assertEqual(self.create(interval=0, count=3).status_code, 400)
+        self.assertEqual(self.create('?weeks=0').status_code, 400)
+        self.assertEqual(self.create('?weeks=200').status_code, 400)
@@ -1,13 +1,33 @@
 # clinic/urls.py
-from django.urls import path, include
+from django.urls import path, re_path, include
 from rest_framework.routers import DefaultRouter
-from .views import PatientViewSet, AppointmentTypeViewSet, AppointmentViewSet
+from .views import (
+    PatientViewSet, AppointmentTypeViewSet, AppointmentViewSet, AppointmentSeriesViewSet,
+    ChairViewSet, ProviderViewSet, WorkingHoursViewSet, BreakViewSet, HolidayViewSet
+)
+from . import async_views
 
 router = DefaultRouter()
 router.register(r'patients', PatientViewSet)
 router.register(r'appointment-types', AppointmentTypeViewSet)
 router.register(r'appointments', AppointmentViewSet)
+router.register(r'appointment-series', AppointmentSeriesViewSet)
+router.register(r'chairs', ChairViewSet)
+router.register(r'providers', ProviderViewSet)
+router.register(r'working-hours', WorkingHoursViewSet)
+router.register(r'breaks', BreakViewSet)
+router.register(r'holidays', HolidayViewSet)
 
 urlpatterns = [
     path('api/', include(router.urls)),
+    # Async mirrors of the busiest calendar reads, for ASGI deployments
+    re_path(
+        r'^api/async/appointments/date/(?P<date>\d{4}-\d{2}-\d{2})/$',
+        async_views.by_date, name='async-appointment-by-date'
+    ),
+    path('api/async/appointments/counts/', async_views.counts, name='async-appointment-counts'),
+    path(
+        'api/async/appointments/available_slots/',
+        async_views.available_slots, name='async-appointment-available-slots'
+    ),
 ]
\ No newline at end of file
@@ -1,18 +1,131 @@
 # clinic/views.py
+from django.db import transaction
+from django.utils import timezone
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.parsers import JSONParser, MultiPartParser
 from rest_framework.response import Response
-from .models import Patient, AppointmentType, Appointment
+from backend.caching import CachedReadMixin
+from backend.export import stream_export
+from backend.pagination import AppointmentPagination
+from .models import (
+    Patient, AppointmentType, Appointment, AppointmentDayCount, AppointmentSeries, Chair, Provider, WorkingHours,
+    Break, Holiday
+)
 from .serializers import (
     PatientSerializer, 
     AppointmentTypeSerializer, 
     AppointmentSerializer,
     AppointmentCreateSerializer,
-    AppointmentCountSerializer
+    AppointmentCountSerializer,
+    AppointmentSeriesSerializer,
+    ChairSerializer,
+    ProviderSerializer,
+    WorkingHoursSerializer,
+    BreakSerializer,
+    HolidaySerializer
 )
+from .scheduling import CLINIC_CLOSE, CLINIC_OPEN, SLOT_MINUTES, to_minutes
+from . import availability, occupancy, rebooking, recurrence, suggestions
+from .search import get_backend, DEFAULT_LIMIT, MAX_LIMIT
+from . import autocomplete
+from .importer import FORMATS, detect_format, import_patients, read_rows, text_stream
+from collections import defaultdict
 from datetime import datetime, timedelta
-from django.db.models import Count
-from django.db.models.functions import TruncDate
+
+# Longest range the multi-day endpoints will serve in one response
+MAX_RANGE_DAYS = 62
+MAX_COUNT_MONTHS = 36
+# Default window for slot suggestions
+SUGGEST_DAYS = 28
+
+
+def parse_date_range(request):
+    """
+    Read ``start_date``/``end_date`` query parameters as an inclusive date range.
+
+    Raises ValueError if either date is missing or malformed, or the range is
+    reversed or longer than MAX_RANGE_DAYS.
+    """
+    start_date = datetime.strptime(request.query_params.get('start_date', ''), '%Y-%m-%d').date()
+    end_date = datetime.strptime(request.query_params.get('end_date', ''), '%Y-%m-%d').date()
+    if end_date < start_date or (end_date - start_date).days >= MAX_RANGE_DAYS:
+        raise ValueError("Invalid date range")
+    return start_date, end_date
+
+
+def parse_month_range(params):
+    """
+    Read ``year``/``month``, or ``start_month``/``end_month`` (YYYY-MM), as the
+    first and last day of an inclusive range of months.
+    
+    Defaults to the current month. Raises ValueError for malformed values or a
+    range of more than MAX_COUNT_MONTHS months.
+    """
+    if 'start_month' in params or 'end_month' in params:
+        first_day = datetime.strptime(params.get('start_month', ''), '%Y-%m').date()
+        end_month = datetime.strptime(params.get('end_month', ''), '%Y-%m').date()
+        months = (end_month.year - first_day.year) * 12 + end_month.month - first_day.month + 1
+        if not 1 <= months <= MAX_COUNT_MONTHS:
+            raise ValueError("Invalid month range")
+    else:
+        year = int(params.get('year', datetime.now().year))
+        month = int(params.get('month', datetime.now().month))
+        first_day = end_month = datetime(year, month, 1).date()
+    
+    # Get the last day of the final month
+    if end_month.month == 12:
+        last_day = datetime(end_month.year + 1, 1, 1).date() - timedelta(days=1)
+    else:
+        last_day = datetime(end_month.year, end_month.month + 1, 1).date() - timedelta(days=1)
+    return first_day, last_day
+
+
+def parse_slot_minutes(params):
+    """
+    Read the slot length for the availability endpoints: ``duration`` in
+    minutes, or the default duration of ``appointment_type``, else SLOT_MINUTES.
+    
+    Raises ValueError for a malformed value, an unknown appointment type or a
+    length that can't fit in a clinic day.
+    """
+    if params.get('duration'):
+        minutes = int(params['duration'])
+    elif params.get('appointment_type'):
+        try:
+            minutes = AppointmentType.objects.values_list('default_duration', flat=True).get(
+                pk=int(params['appointment_type'])
+            )
+        except AppointmentType.DoesNotExist:
+            raise ValueError("Unknown appointment type")
+    else:
+        minutes = SLOT_MINUTES
+    if not 0 < minutes <= to_minutes(CLINIC_CLOSE) - to_minutes(CLINIC_OPEN):
+        raise ValueError("Invalid duration")
+    return minutes
+
+
+def parse_weeks(params):
+    """
+    Read the optional ``weeks`` parameter for materializing series; None if absent.
+    
+    Raises ValueError unless it is a whole number from 1 to recurrence.MAX_WEEKS.
+    """
+    if not params.get('weeks'):
+        return None
+    weeks = int(params['weeks'])
+    if not 1 <= weeks <= recurrence.MAX_WEEKS:
+        raise ValueError("Invalid weeks")
+    return weeks
+
+
+def days_in_range(start_date, end_date):
+    """Yield every date from start_date to end_date inclusive."""
+    day = start_date
+    while day <= end_date:
+        yield day
+        day += timedelta(days=1)
+
 
 class PatientViewSet(viewsets.ModelViewSet):
     queryset = Patient.objects.all()
@@ -20,34 +133,124 @@ class PatientViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'])
     def search(self, request):
+        """Ranked prefix search over name, email, phone and date of birth (``q``, ``limit``)."""
         query = request.query_params.get('q', '')
+        try:
+            limit = min(int(request.query_params.get('limit', DEFAULT_LIMIT)), MAX_LIMIT)
+        except ValueError:
+            limit = DEFAULT_LIMIT
         if query:
-            patients = Patient.objects.filter(name__icontains=query)
+            patients = get_backend().search(query, limit=max(limit, 1))
             serializer = self.get_serializer(patients, many=True)
             return Response(serializer.data)
         return Response([])
+    
+    @action(detail=False, methods=['get'])
+    def autocomplete(self, request):
+        """Type-ahead name lookup (``q``, ``limit``) returning ``[id, name, phone]`` rows from memory."""
+        query = request.query_params.get('q', '')
+        try:
+            limit = min(int(request.query_params.get('limit', autocomplete.DEFAULT_LIMIT)), autocomplete.MAX_LIMIT)
+        except ValueError:
+            limit = autocomplete.DEFAULT_LIMIT
+        if query:
+            return Response(autocomplete.get_index().lookup(query, limit=max(limit, 1)))
+        return Response([])
+    
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser, JSONParser])
+    def bulk_import(self, request):
+        """
+        Import patients from an uploaded CSV/JSON/NDJSON ``file`` or a JSON array body.
+        
+        Pass ``dry_run=1`` to only validate. Returns counts and the per-row error
+        report, with a 400 and an ``error`` if the file can't be read to the end.
+        """
+        dry_run = request.query_params.get('dry_run') in ('1', 'true')
+        upload = request.FILES.get('file')
+        if upload is not None:
+            file_format = request.data.get('format') or detect_format(upload.name)
+            if file_format not in FORMATS:
+                return Response(
+                    {"error": f"Unsupported format. Use one of {', '.join(FORMATS)}"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            rows = read_rows(text_stream(upload.file), file_format)
+        elif isinstance(request.data, list):
+            rows = request.data
+        else:
+            return Response(
+                {"error": "Upload a file as 'file' or send a JSON array of patients"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        report = import_patients(rows, dry_run=dry_run)
+        # An unreadable file still reports the rows imported before the problem
+        if 'error' in report:
+            return Response(report, status=status.HTTP_400_BAD_REQUEST)
+        return Response(report)
 
-class AppointmentTypeViewSet(viewsets.ModelViewSet):
-    queryset = AppointmentType.objects.all()
+class AppointmentTypeViewSet(CachedReadMixin, viewsets.ModelViewSet):
+    # A fixed order keeps cached pages and their ETags stable
+    queryset = AppointmentType.objects.order_by('id')
     serializer_class = AppointmentTypeSerializer
 
+class ChairViewSet(viewsets.ModelViewSet):
+    queryset = Chair.objects.order_by('id')
+    serializer_class = ChairSerializer
+
+class ProviderViewSet(viewsets.ModelViewSet):
+    queryset = Provider.objects.prefetch_related('appointment_types').order_by('id')
+    serializer_class = ProviderSerializer
+
+class WorkingHoursViewSet(viewsets.ModelViewSet):
+    queryset = WorkingHours.objects.order_by('provider', 'weekday', 'start_time', 'id')
+    serializer_class = WorkingHoursSerializer
+    filterset_fields = ['provider', 'weekday']
+
+class BreakViewSet(viewsets.ModelViewSet):
+    queryset = Break.objects.order_by('provider', 'weekday', 'start_time', 'id')
+    serializer_class = BreakSerializer
+    filterset_fields = ['provider', 'weekday']
+
+class HolidayViewSet(viewsets.ModelViewSet):
+    queryset = Holiday.objects.order_by('date', 'id')
+    serializer_class = HolidaySerializer
+    filterset_fields = ['provider', 'date']
+
 class AppointmentViewSet(viewsets.ModelViewSet):
     queryset = Appointment.objects.all()
+    pagination_class = AppointmentPagination
+    filterset_fields = ['date', 'status', 'patient', 'appointment_type']
+    export_fields = [
+        'id', 'date', 'start_time', 'duration', 'status', 'patient_id', 'patient__name',
+        'appointment_type__name', 'notes',
+    ]
     
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']:
             return AppointmentCreateSerializer
         return AppointmentSerializer
     
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ['list', 'retrieve']:
+            queryset = AppointmentSerializer.optimize_queryset(queryset)
+        return queryset
+    
+    @action(detail=False, methods=['get'], url_path=r'export\.(?P<export_format>csv|ndjson)')
+    def export(self, request, export_format):
+        """Stream every appointment matching the list filters as CSV or NDJSON."""
+        return stream_export(self.filter_queryset(self.get_queryset()), self.export_fields, export_format, 'appointments')
+    
     @action(detail=False, methods=['get'], url_path='date/(?P<date>\d{4}-\d{2}-\d{2})')
     def by_date(self, request, date=None):
         """Get appointments for a specific date."""
         try:
             date_obj = datetime.strptime(date, '%Y-%m-%d').date()
-            appointments = Appointment.objects.filter(
+            appointments = AppointmentSerializer.optimize_queryset(Appointment.objects.filter(
                 date=date_obj, 
                 status=Appointment.STATUS_SCHEDULED
-            )
+            ))
             serializer = AppointmentSerializer(appointments, many=True)
             return Response(serializer.data)
         except ValueError:
@@ -58,43 +261,40 @@ class AppointmentViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'])
     def counts(self, request):
-        """Get appointment counts by date for a month."""
+        """
+        Get scheduled appointment counts by date for a month (``year``/``month``),
+        or for every month from ``start_month`` to ``end_month`` (YYYY-MM, inclusive).
+        """
         try:
-            year = int(request.query_params.get('year', datetime.now().year))
-            month = int(request.query_params.get('month', datetime.now().month))
-            
-            # Get the first and last day of the month
-            first_day = datetime(year, month, 1).date()
-            if month == 12:
-                last_day = datetime(year + 1, 1, 1).date() - timedelta(days=1)
-            else:
-                last_day = datetime(year, month + 1, 1).date() - timedelta(days=1)
+            first_day, last_day = parse_month_range(request.query_params)
             
-            # Query appointment counts for each day in the month
-            appointments = Appointment.objects.filter(
+            # Read the per-day summary rather than counting appointments
+            day_counts = AppointmentDayCount.objects.filter(
                 date__gte=first_day,
                 date__lte=last_day,
-                status=Appointment.STATUS_SCHEDULED
-            ).values('date').annotate(count=Count('id'))
+                status=Appointment.STATUS_SCHEDULED,
+                count__gt=0
+            ).order_by('date').values_list('date', 'count')
             
-            # Format the response
-            result = []
-            for app in appointments:
-                result.append({
-                    'date': app['date'].strftime('%Y-%m-%d'),
-                    'count': app['count']
-                })
-            
-            return Response(result)
+            return Response([
+                {'date': day.strftime('%Y-%m-%d'), 'count': count}
+                for day, count in day_counts
+            ])
         except ValueError:
             return Response(
-                {"error": "Invalid year or month parameters"},
+                {"error": f"Invalid year/month, or a start_month/end_month range longer than {MAX_COUNT_MONTHS} months"},
                 status=status.HTTP_400_BAD_REQUEST
             )
     
     @action(detail=False, methods=['get'])
     def available_slots(self, request):
-        """Get available time slots for a specific date."""
+        """
+        Get available time slots for a specific date on the clinic-wide lane,
+        within the clinic's working hours, breaks and holidays.
+        
+        Slots are 30 minutes long unless ``duration`` (minutes) or
+        ``appointment_type`` (its default duration) says otherwise.
+        """
         try:
             date_str = request.query_params.get('date')
             if not date_str:
@@ -104,51 +304,283 @@ class AppointmentViewSet(viewsets.ModelViewSet):
                 )
             
             date_obj = datetime.strptime(date_str, '%Y-%m-%d').date()
-            
-            # Get all booked slots for the day
-            appointments = Appointment.objects.filter(
-                date=date_obj,
-                status=Appointment.STATUS_SCHEDULED
-            )
-            
-            # Define clinic hours (9 AM to 5 PM) with 30-minute intervals
-            start_hour = 9
-            end_hour = 17
-            slot_minutes = 30
-            
-            # Generate all possible slots
-            all_slots = []
-            slot_time = datetime.combine(date_obj, datetime.min.time().replace(hour=start_hour))
-            end_time = datetime.combine(date_obj, datetime.min.time().replace(hour=end_hour))
-            
-            while slot_time < end_time:
-                # Skip lunch hour (1 PM - 2 PM)
-                if slot_time.hour != 13:
-                    all_slots.append(slot_time.time())
-                slot_time += timedelta(minutes=slot_minutes)
-            
-            # Remove booked slots
-            booked_slots = set()
-            for appt in appointments:
-                # Mark all slots that overlap with this appointment as booked
-                appt_start = datetime.combine(date_obj, appt.start_time)
-                appt_end = appt_start + timedelta(minutes=appt.duration)
-                
-                check_time = datetime.combine(date_obj, datetime.min.time().replace(hour=start_hour))
-                while check_time < end_time:
-                    check_end = check_time + timedelta(minutes=slot_minutes)
-                    if check_time.time() in all_slots and (check_time < appt_end and check_end > appt_start):
-                        booked_slots.add(check_time.time())
-                    check_time += timedelta(minutes=slot_minutes)
-            
-            available_slots = [t for t in all_slots if t not in booked_slots]
-            
-            # Format for frontend
-            formatted_slots = [t.strftime('%I:%M %p') for t in available_slots]
-            
-            return Response(formatted_slots)
         except ValueError:
             return Response(
                 {"error": "Invalid date format. Use YYYY-MM-DD"},
                 status=status.HTTP_400_BAD_REQUEST
-            )
\ No newline at end of file
+            )
+        try:
+            slot_minutes = parse_slot_minutes(request.query_params)
+        except ValueError:
+            return Response(
+                {"error": "Invalid duration or appointment_type"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # The day's cached occupancy bitmap and opening hours; each built with queries on a miss
+        available_slots = occupancy.free_starts(
+            occupancy.get_bits(date_obj), availability.clinic_hours(date_obj), slot_minutes
+        )
+        
+        # Format for frontend
+        formatted_slots = [t.strftime('%I:%M %p') for t in available_slots]
+        
+        return Response(formatted_slots)
+    
+    @action(detail=False, methods=['get'])
+    def by_date_range(self, request):
+        """Get scheduled appointments for every day in a date range, grouped by date."""
+        try:
+            start_date, end_date = parse_date_range(request)
+        except ValueError:
+            return Response(
+                {"error": f"Provide start_date and end_date as YYYY-MM-DD, at most {MAX_RANGE_DAYS} days apart"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        appointments = AppointmentSerializer.optimize_queryset(Appointment.objects.filter(
+            date__gte=start_date,
+            date__lte=end_date,
+            status=Appointment.STATUS_SCHEDULED
+        ))
+        
+        result = {day.strftime('%Y-%m-%d'): [] for day in days_in_range(start_date, end_date)}
+        for appointment in AppointmentSerializer(appointments, many=True).data:
+            result[appointment['date']].append(appointment)
+        
+        return Response(result)
+    
+    @action(detail=False, methods=['get'])
+    def available_slots_range(self, request):
+        """Get available time slots for every day in a date range (``duration`` as for ``available_slots``)."""
+        try:
+            start_date, end_date = parse_date_range(request)
+        except ValueError:
+            return Response(
+                {"error": f"Provide start_date and end_date as YYYY-MM-DD, at most {MAX_RANGE_DAYS} days apart"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            slot_minutes = parse_slot_minutes(request.query_params)
+        except ValueError:
+            return Response(
+                {"error": "Invalid duration or appointment_type"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # Load the clinic-wide lane's bookings and the opening hours for the whole range at once
+        hours = availability.WorkingCalendar(start_date, end_date, [])
+        booked = defaultdict(list)
+        appointments = Appointment.objects.filter(
+            date__gte=start_date,
+            date__lte=end_date,
+            status=Appointment.STATUS_SCHEDULED,
+            chair__isnull=True,
+            provider__isnull=True
+        ).values_list('date', 'start_time', 'duration')
+        for date_obj, start_time, duration in appointments:
+            booked[date_obj].append((start_time, duration))
+        
+        result = {}
+        for day in days_in_range(start_date, end_date):
+            result[day.strftime('%Y-%m-%d')] = [
+                t.strftime('%I:%M %p')
+                for t in occupancy.free_starts(occupancy.build(booked[day]), hours.clinic(day), slot_minutes)
+            ]
+        
+        return Response(result)
+    
+    @action(detail=False, methods=['get'])
+    def openings(self, request):
+        """
+        First ``limit`` bookable (chair, provider, start) openings for an
+        ``appointment_type`` between ``start_date`` and ``end_date``.
+        
+        ``chair`` and ``provider`` restrict the search to one resource; ``step``
+        sets the minutes between candidate starts (default 30).
+        """
+        try:
+            start_date, end_date = parse_date_range(request)
+        except ValueError:
+            return Response(
+                {"error": f"Provide start_date and end_date as YYYY-MM-DD, at most {MAX_RANGE_DAYS} days apart"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            appointment_type = AppointmentType.objects.get(pk=int(request.query_params.get('appointment_type', '')))
+            limit = min(int(request.query_params.get('limit', availability.DEFAULT_LIMIT)), availability.MAX_LIMIT)
+            step = int(request.query_params.get('step', SLOT_MINUTES))
+            if limit < 1 or step < occupancy.UNIT_MINUTES or step % occupancy.UNIT_MINUTES:
+                raise ValueError("Invalid limit or step")
+            chairs = providers = None
+            if request.query_params.get('chair'):
+                chairs = list(Chair.objects.filter(pk=int(request.query_params['chair']), is_active=True))
+            if request.query_params.get('provider'):
+                providers = [
+                    provider for provider in availability.qualified_providers(appointment_type)
+                    if provider.id == int(request.query_params['provider'])
+                ]
+        except (ValueError, AppointmentType.DoesNotExist):
+            return Response(
+                {"error": "Provide a valid appointment_type, a limit of at least 1 and a step in multiples of 5 minutes"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        openings = availability.find_openings(
+            appointment_type, start_date, end_date, limit=limit, chairs=chairs, providers=providers, step=step
+        )
+        return Response([
+            {
+                'date': day.strftime('%Y-%m-%d'),
+                'start_time': start_time.isoformat(),
+                'time': start_time.strftime('%I:%M %p'),
+                'duration': appointment_type.default_duration,
+                'chair': chair.id,
+                'chair_name': chair.name,
+                'provider': provider.id,
+                'provider_name': provider.name,
+            }
+            for day, start_time, chair, provider in openings
+        ])
+    
+    @action(detail=False, methods=['get'])
+    def suggest(self, request):
+        """
+        Best ``limit`` slots to book ``patient`` for ``appointment_type``, ranked by
+        the patient's preferred time, leftover gaps, fit and how soon they are.
+        
+        Searches ``start_date`` to ``end_date``, or the four weeks from today.
+        """
+        try:
+            if 'start_date' in request.query_params or 'end_date' in request.query_params:
+                start_date, end_date = parse_date_range(request)
+            else:
+                start_date = timezone.localdate()
+                end_date = start_date + timedelta(days=SUGGEST_DAYS - 1)
+        except ValueError:
+            return Response(
+                {"error": f"Provide start_date and end_date as YYYY-MM-DD, at most {MAX_RANGE_DAYS} days apart"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            patient = Patient.objects.get(pk=int(request.query_params.get('patient', '')))
+            appointment_type = AppointmentType.objects.get(pk=int(request.query_params.get('appointment_type', '')))
+            limit = min(int(request.query_params.get('limit', suggestions.DEFAULT_LIMIT)), suggestions.MAX_LIMIT)
+            if limit < 1:
+                raise ValueError("Invalid limit")
+        except (ValueError, Patient.DoesNotExist, AppointmentType.DoesNotExist):
+            return Response(
+                {"error": "Provide a valid patient, appointment_type and a limit of at least 1"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        return Response([
+            {
+                'date': suggestion['date'].strftime('%Y-%m-%d'),
+                'start_time': suggestion['start_time'].isoformat(),
+                'time': suggestion['start_time'].strftime('%I:%M %p'),
+                'duration': appointment_type.default_duration,
+                'chair': suggestion['chair'].id if suggestion['chair'] else None,
+                'provider': suggestion['provider'].id if suggestion['provider'] else None,
+                'provider_name': suggestion['provider'].name if suggestion['provider'] else None,
+                'score': round(suggestion['score'], 4),
+                'scores': {name: round(value, 4) for name, value in suggestion['scores'].items()},
+            }
+            for suggestion in suggestions.suggest_slots(patient, appointment_type, start_date, end_date, limit=limit)
+        ])
+    
+    @action(detail=False, methods=['post'])
+    def rebook(self, request):
+        """
+        Move a batch of scheduled appointments into the free time between the
+        ``start_date`` and ``end_date`` query parameters.
+        
+        The body names the appointments, as ``{"appointments": [ids]}`` or as
+        ``{"date": "YYYY-MM-DD"}`` for everything scheduled that day. Returns
+        the proposed moves; pass ``commit=1`` to apply them.
+        """
+        try:
+            start_date, end_date = parse_date_range(request)
+        except ValueError:
+            return Response(
+                {"error": f"Provide start_date and end_date as YYYY-MM-DD, at most {MAX_RANGE_DAYS} days apart"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            if 'date' in request.data:
+                appointments = Appointment.objects.filter(
+                    date=datetime.strptime(str(request.data['date']), '%Y-%m-%d').date()
+                )
+            else:
+                ids = [int(pk) for pk in request.data['appointments']]
+                if not ids:
+                    raise ValueError("No appointments")
+                appointments = Appointment.objects.filter(id__in=ids)
+        except (KeyError, TypeError, ValueError):
+            return Response(
+                {"error": "Send a non-empty list of appointment ids as 'appointments', or a 'date' as YYYY-MM-DD"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if appointments.filter(status=Appointment.STATUS_SCHEDULED).count() > rebooking.MAX_APPOINTMENTS:
+            return Response(
+                {"error": f"Rebook at most {rebooking.MAX_APPOINTMENTS} appointments at a time"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        commit = request.query_params.get('commit') in ('1', 'true')
+        return Response(rebooking.rebook(appointments, start_date, end_date, commit=commit))
+
+class AppointmentSeriesViewSet(viewsets.ModelViewSet):
+    """
+    Recurring appointments. Creating a series also creates its appointments;
+    changing or deleting one only affects occurrences not yet materialized.
+    """
+    queryset = AppointmentSeries.objects.order_by('id')
+    serializer_class = AppointmentSeriesSerializer
+    filterset_fields = ['patient']
+    
+    def materialize_response(self, request, save, response_status=status.HTTP_200_OK):
+        """Run ``save`` and materialize the series it returns, in one transaction."""
+        try:
+            weeks = parse_weeks(request.query_params)
+        except ValueError:
+            return Response(
+                {"error": f"weeks must be a whole number from 1 to {recurrence.MAX_WEEKS}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        skip_conflicts = request.query_params.get('skip_conflicts') in ('1', 'true')
+        try:
+            with transaction.atomic():
+                series = save()
+                through = recurrence.horizon(series, weeks, timezone.localdate())
+                report = recurrence.materialize(series, through, skip_conflicts=skip_conflicts)
+        except recurrence.ConflictError as exc:
+            return Response(
+                {"error": "Some occurrences conflict; pass skip_conflicts=1 to leave them out",
+                 "conflicts": exc.conflicts},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        data = self.get_serializer(series).data
+        return Response({**data, 'created': report['created'], 'skipped': report['skipped']}, status=response_status)
+    
+    def create(self, request, *args, **kwargs):
+        """
+        Create a series and its appointments in one request.
+        
+        A series with ``until`` or ``count`` is expanded in full, and an
+        open-ended one 12 weeks ahead, unless ``weeks`` says how far to go.
+        Conflicting occurrences fail the request; ``skip_conflicts=1`` leaves
+        them out instead.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return self.materialize_response(request, serializer.save, response_status=status.HTTP_201_CREATED)
+    
+    @action(detail=True, methods=['post'])
+    def materialize(self, request, pk=None):
+        """Create the series' appointments through the next ``weeks`` weeks, as ``create`` does."""
+        series = self.get_object()
+        return self.materialize_response(request, lambda: series)
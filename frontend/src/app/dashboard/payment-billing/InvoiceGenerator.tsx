@@ -94,34 +94,23 @@ const InvoiceGenerator = () => {
     setLoading(true);
     
     try {
-      // Create the invoice
+      // Create the invoice together with its items in one request
       const invoiceResponse = await fetch('/api/invoices/', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({
           ...invoice,
           status: status,
-          subtotal: calculateSubtotal(),
-          total: calculateTotal()
-        })
-      });
-      
-      const newInvoice = await invoiceResponse.json();
-      
-      // Create invoice items
-      for (const item of invoice.items) {
-        await fetch('/api/invoice-items/', {
-          method: 'POST',
-          headers: { 'Content-Type': 'application/json' },
-          body: JSON.stringify({
-            invoice: newInvoice.id,
+          items: invoice.items.map(item => ({
             service: item.service,
             description: item.description,
             quantity: item.quantity,
             unit_price: item.unit_price
-          })
-        });
-      }
+          }))
+        })
+      });
+      
+      const newInvoice = await invoiceResponse.json();
       
       // Redirect to the invoice details page
       window.location.href = `/dashboard/invoices/${newInvoice.id}`;